@@ -0,0 +1,11 @@
+"""Performance benchmarks for the shipments backend.
+
+Run from the ``shipment_project`` directory, e.g. ``python -m benchmarks.metrics_overhead``.
+"""
+import os
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shipment_project.settings')
+    import django
+    django.setup()
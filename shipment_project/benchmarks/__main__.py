@@ -0,0 +1,145 @@
+"""End-to-end API benchmarks.
+
+    python -m benchmarks run [profile ...] [--rows 20000] [--server thread|gunicorn]
+    python -m benchmarks run --target http://127.0.0.1:8000 tracking_poll_storm
+    python -m benchmarks compare results/base.json results/new.json [--threshold 0.1]
+    python -m benchmarks list
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+from . import setup_django
+from .profiles import PROFILES
+
+
+def _context(seed):
+    from shipments.authentication import ClaimsRefreshToken
+
+    from .fixtures import BENCH_USERNAME, sample_lr_nos
+    from django.contrib.auth import get_user_model
+
+    lr_nos = sample_lr_nos(5000, seed)
+    if not lr_nos:
+        raise SystemExit('No bookings to benchmark against; drop --target or seed the database first.')
+    user = get_user_model().objects.filter(username=BENCH_USERNAME).first()
+    headers = {'Authorization': f'Bearer {ClaimsRefreshToken.for_user(user).access_token}'} if user else {}
+    return {'lr_nos': lr_nos, 'auth_headers': headers}
+
+
+def _run_profiles(url, names, context, seed, scale):
+    from .loadgen import run_load
+    from .results import summarize
+
+    results = []
+    for name in names:
+        profile = PROFILES[name]
+        samples, wall = asyncio.run(run_load(url, profile.request_streams(context, seed=seed, scale=scale)))
+        summary = summarize(profile, samples, wall)
+        lat = summary['latency']
+        print(f"{name:24s} {summary['requests']:7d} req  {summary['throughput_rps']:9.1f} rps  "
+              f"p50 {lat['p50_ms']:8.2f}  p95 {lat['p95_ms']:8.2f}  p99 {lat['p99_ms']:8.2f} ms  errors {summary['errors']}  "
+              f"rejected {summary['rejected']}  4xx {summary['client_errors']}")
+        results.append(summary)
+    return results
+
+
+def cmd_run(args):
+    from . import results as results_mod
+    from .server import GunicornServer, ThreadServer, prepare_database
+
+    names = args.profiles or list(PROFILES)
+    unknown = [n for n in names if n not in PROFILES]
+    if unknown:
+        raise SystemExit(f"Unknown profile(s): {', '.join(unknown)}")
+
+    if not args.target:
+        # Every virtual user shares one client IP, so with throttling on the profiles would measure
+        # the 429s; benchmarks.throttle_flood is the benchmark for the throttle itself
+        os.environ['THROTTLE_ENABLED'] = 'False'
+    setup_django()
+    if args.target:
+        server = None
+        url = args.target.rstrip('/')
+        database = None
+    else:
+        database = prepare_database(keepdb=not args.fresh)
+        from .fixtures import seed_bookings
+        seed_bookings(args.rows, seed=args.seed)
+        server = GunicornServer(database, workers=args.workers) if args.server == 'gunicorn' else ThreadServer()
+
+    context = _context(args.seed)
+    if server is None:
+        profiles = _run_profiles(url, names, context, args.seed, args.scale)
+    else:
+        with server:
+            profiles = _run_profiles(server.url, names, context, args.seed, args.scale)
+
+    run = {
+        'server': 'external' if args.target else args.server,
+        'workers': args.workers if args.server == 'gunicorn' and not args.target else None,
+        'database': database,
+        'rows': args.rows,
+        'seed': args.seed,
+        'scale': args.scale,
+        'profiles': profiles,
+    }
+    path = results_mod.save(run, args.output)
+    print(f'results written to {path}')
+
+    if args.compare:
+        lines, regressions = results_mod.compare(results_mod.load(args.compare), run, args.threshold)
+        print('\n'.join(lines))
+        return 1 if regressions else 0
+    return 0
+
+
+def cmd_compare(args):
+    from .results import compare, load
+
+    lines, regressions = compare(load(args.base), load(args.new), args.threshold)
+    print('\n'.join(lines))
+    return 1 if regressions else 0
+
+
+def cmd_list(args):
+    for profile in PROFILES.values():
+        print(f'{profile.name:24s} {profile.concurrency:3d} users x {profile.requests_per_user:4d}  {profile.description}')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='boot the app and run load profiles')
+    run.add_argument('profiles', nargs='*', help='profiles to run (default: all)')
+    run.add_argument('--rows', type=int, default=20000, help='bookings in the benchmark database')
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--scale', type=float, default=1.0, help='multiply requests per virtual user')
+    run.add_argument('--server', choices=['thread', 'gunicorn'], default='thread')
+    run.add_argument('--workers', type=int, default=4, help='gunicorn workers')
+    run.add_argument('--target', help='benchmark an already running server instead of booting one')
+    run.add_argument('--fresh', action='store_true', help='recreate the benchmark database')
+    run.add_argument('--output', help='result file (default: benchmarks/results/<timestamp>.json)')
+    run.add_argument('--compare', help='baseline result file to compare against')
+    run.add_argument('--threshold', type=float, default=0.10, help='relative change flagged as regression')
+    run.set_defaults(func=cmd_run)
+
+    cmp_ = sub.add_parser('compare', help='compare two result files')
+    cmp_.add_argument('base')
+    cmp_.add_argument('new')
+    cmp_.add_argument('--threshold', type=float, default=0.10)
+    cmp_.set_defaults(func=cmd_compare)
+
+    lst = sub.add_parser('list', help='show available profiles')
+    lst.set_defaults(func=cmd_list)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""Archive, look up and restore old delivered bookings.
+
+    python -m benchmarks.archive_roundtrip [--rows 200000] [--older-than 180]
+
+Seeds --rows bookings into the benchmark database (once), archives delivered
+bookings older than --older-than days into a temporary ARCHIVE_DIR, times
+archived-LR lookups through the sorted index, then restores everything so the
+database is left as it was.
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import timedelta
+
+from . import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--older-than', type=int, default=180)
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from .server import prepare_database
+    prepare_database()
+
+    from django.conf import settings
+    from django.utils import timezone
+    from .fixtures import seed_bookings
+    from shipments.archive import archive_bookings, archived_lookup, read_manifest, restore_bookings
+    from shipments.models import Booking
+
+    seed_bookings(args.rows)
+    before = timezone.localdate() - timedelta(days=args.older_than)
+    with tempfile.TemporaryDirectory() as root:
+        settings.ARCHIVE_DIR = root
+        total = Booking.objects.count()
+        start = time.perf_counter()
+        archived = archive_bookings(before)
+        elapsed = time.perf_counter() - start
+        parts = read_manifest()['parts']
+        size = sum(p['bytes'] for p in parts)
+        print(f"archive: {archived} of {total} bookings in {elapsed:.1f}s ({archived / elapsed:,.0f}/s), "
+              f"{len(parts)} parts, {size / 1e6:.1f} MB ({size / max(archived, 1):.0f} B/booking)")
+
+        rng = random.Random(40)
+        lr_nos = [rng.randint(1, total) for _ in range(args.lookups)]
+        archived_lookup.find('warm-up')
+        start = time.perf_counter()
+        found = sum(archived_lookup.find(str(lr)) is not None for lr in lr_nos)
+        elapsed = time.perf_counter() - start
+        print(f"lookup: {args.lookups} random LRs ({found} archived) in {elapsed * 1000:.0f}ms "
+              f"({elapsed / args.lookups * 1e6:.0f}us each)")
+
+        start = time.perf_counter()
+        restored, _ = restore_bookings()
+        elapsed = time.perf_counter() - start
+        print(f"restore: {restored} bookings in {elapsed:.1f}s; table back to {Booking.objects.count()} rows")
+
+
+if __name__ == '__main__':
+    main()
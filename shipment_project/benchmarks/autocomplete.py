@@ -0,0 +1,98 @@
+"""Autocomplete index build and lookup times.
+
+    python -m benchmarks.autocomplete [--rows 200000] [--vocabulary 200000]
+
+Seeds --rows bookings into the benchmark database (once) and times a full
+load, an incremental top-up after 1000 new bookings, and lookups against the
+loaded index. Seeded bookings use a few dozen cities and parties, so lookups
+are also timed on a synthetic --vocabulary of distinct consignee names, and
+compared with the ILIKE + GROUP BY query the index replaces.
+"""
+import argparse
+import random
+import time
+
+from . import setup_django
+
+
+def _best(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _lookups(index, prefixes, repeat):
+    # Best of ``repeat`` per prefix, then the median and worst over prefixes
+    times = sorted(_best(lambda: index.search(prefix, 10), repeat) for prefix in prefixes)
+    return times[len(times) // 2] * 1e6, times[-1] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--vocabulary', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from .server import prepare_database
+    prepare_database()
+
+    from collections import Counter
+
+    from django.conf import settings
+    from django.db import connection
+
+    from .fixtures import seed_bookings
+    from shipments.autocomplete import PrefixIndex, autocomplete_index
+    from shipments.models import Booking
+
+    seed_bookings(args.rows)
+    total = Booking.objects.count()
+    start = time.perf_counter()
+    autocomplete_index.refresh(full=True)
+    print(f"full load, {total} bookings: {(time.perf_counter() - start) * 1000:8.1f}ms "
+          f"({', '.join(f'{f} {len(i)}' for f, i in autocomplete_index.indexes.items())} values)")
+
+    source = list(Booking.objects.order_by('-id')[:1000])
+    for booking in source:
+        booking.pk = None
+        booking.lr_no = f'AC{booking.lr_no}'
+    Booking.objects.bulk_create(source)
+    start = time.perf_counter()
+    autocomplete_index.refresh()
+    print(f"top-up, 1000 new bookings:   {(time.perf_counter() - start) * 1000:8.1f}ms")
+    Booking.objects.filter(id__in=[b.id for b in source]).delete()
+
+    prefixes = ['h', 'hy', 'hyd', 'che', 'b', 'mum', 'del', 'k', 'pu', 'zzz']
+    median, worst = _lookups(autocomplete_index.indexes['location'], prefixes, args.repeat)
+    print(f"lookup, seeded locations:     median {median:6.1f}us  worst {worst:6.1f}us")
+
+    rng = random.Random(47)
+    first = ['Rahul', 'Priya', 'Sri', 'Lakshmi', 'Venkata', 'Anil', 'Sunita', 'Mohammed', 'Ravi', 'Kavya']
+    last = ['Sharma', 'Reddy', 'Traders', 'Enterprises', 'Textiles', 'Agencies', 'Rao', 'Pharma', 'Steels', 'Exports']
+    spellings = {}
+    while len(spellings) < args.vocabulary:
+        name = f"{rng.choice(first)} {''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(3, 9))).title()} {rng.choice(last)}"
+        spellings[name.casefold()] = Counter({name: int(rng.paretovariate(1.2))})
+    start = time.perf_counter()
+    index = PrefixIndex(spellings, settings.AUTOCOMPLETE_MAX_RESULTS, settings.AUTOCOMPLETE_RANGE_CUTOFF)
+    print(f"build, {len(index)} names ({len(index.keys)} keys, {len(index.top)} precomputed prefixes): "
+          f"{(time.perf_counter() - start) * 1000:8.1f}ms")
+    prefixes = ['r', 'ra', 'rah', 'sh', 'tra', 'ent', 'pri', 'sri l', 'x', 'ab', 'ven', 'qz']
+    median, worst = _lookups(index, prefixes, args.repeat)
+    print(f"lookup, synthetic names:      median {median:6.1f}us  worst {worst:6.1f}us")
+
+    with connection.cursor() as cursor:
+        query = lambda: cursor.execute(
+            "SELECT to_location, COUNT(*) FROM shipments_booking WHERE to_location ILIKE %s "
+            "GROUP BY to_location ORDER BY 2 DESC LIMIT 10", ['hy%'],
+        ) or cursor.fetchall()
+        print(f"ILIKE + GROUP BY, one column: {_best(query, 5) * 1000:8.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Lane revenue from the columnar extract versus the all-shipments CSV export.
+
+    python -m benchmarks.columnar_extract [--rows 200000]
+
+Seeds --rows bookings into the benchmark database (once), writes a full
+columnar extract to a temporary directory and times an append of 1000 new
+bookings. Then computes bookings and freight per lane both ways: parsing the
+CSV that export_all_customer_shipments_csv returns (the export itself is
+timed separately), and reading three memory-mapped columns of the extract.
+"""
+import argparse
+import csv
+import io
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from decimal import Decimal
+from pathlib import Path
+
+from . import setup_django
+
+
+def _best(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from .server import prepare_database
+    prepare_database()
+
+    import numpy as np
+    from django.contrib.auth import get_user_model
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    from .fixtures import seed_bookings
+    from shipments.columnar import ColumnarExtract, extract_columnar
+    from shipments.models import Booking
+    from shipments.views import export_all_customer_shipments_csv
+
+    seed_bookings(args.rows)
+    root = Path(tempfile.mkdtemp(prefix='columnar-'))
+    start = time.perf_counter()
+    _, written = extract_columnar(full=True, root=root)
+    size = sum(p.stat().st_size for p in root.rglob('*.npy'))
+    print(f"full extract, {written} bookings: {time.perf_counter() - start:6.2f}s, {size / 2**20:.0f} MiB")
+
+    source = list(Booking.objects.order_by('-id')[:1000])
+    for booking in source:
+        booking.pk = None
+        booking.lr_no = f'CX{booking.lr_no}'
+    Booking.objects.bulk_create(source)
+    start = time.perf_counter()
+    _, written = extract_columnar(root=root)
+    print(f"append, {written} new bookings:      {(time.perf_counter() - start) * 1000:6.0f}ms")
+    Booking.objects.filter(id__in=[b.id for b in source]).delete()
+    extract_columnar(full=True, root=root)
+
+    request = APIRequestFactory().get('/api/export-all-customer-shipments-csv/')
+    force_authenticate(request, get_user_model().objects.filter(is_superuser=True).first())
+    start = time.perf_counter()
+    body = export_all_customer_shipments_csv(request).content.decode()
+    print(f"CSV export:  {time.perf_counter() - start:6.2f}s, {len(body) / 2**20:.0f} MiB")
+
+    def lanes_from_csv():
+        lanes = defaultdict(lambda: [0, Decimal(0)])
+        for row in csv.DictReader(io.StringIO(body)):
+            lane = lanes[row['from_location'], row['to_location']]
+            lane[0] += 1
+            lane[1] += Decimal(row['freight'] or 0)
+        return lanes
+
+    def lanes_from_columns():
+        extract = ColumnarExtract(root)
+        width = len(extract.dictionary('from_location'))
+        lane = extract.column('from_location').astype(np.int64) * width + extract.column('to_location')
+        counts = np.bincount(lane, minlength=width * width)
+        freight = np.bincount(lane, weights=extract.column('freight_paise'), minlength=width * width)
+        names = extract.dictionary('from_location')
+        return {(names[i // width], names[i % width]): [int(counts[i]), Decimal(int(freight[i])) / 100]
+                for i in np.flatnonzero(counts)}
+
+    assert lanes_from_csv() == lanes_from_columns()
+    print(f"lane totals from CSV:     {_best(lanes_from_csv, args.repeat) * 1000:8.1f}ms")
+    print(f"lane totals from columns: {_best(lanes_from_columns, args.repeat) * 1000:8.1f}ms")
+    shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Batch consignment note rendering.
+
+    python -m benchmarks.consignment_notes [--rows 200000] [--notes 10000]
+
+Seeds --rows bookings into the benchmark database (once), then renders the
+latest --notes bookings (one copy each) as one document: per note with
+render_to_string, as the single-receipt view does; chunked with the template
+compiled once; and chunked in process pools of increasing size.
+"""
+import argparse
+import os
+import time
+
+from . import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--notes', type=int, default=10000)
+    parser.add_argument('--workers', type=int, nargs='*', default=[2, 4])
+    args = parser.parse_args()
+
+    setup_django()
+    from .server import prepare_database
+    prepare_database()
+
+    from .fixtures import seed_bookings
+    from django.template.loader import render_to_string
+    from shipments.consignment_notes import PAGES_TEMPLATE, NOTE_FIELDS, note_queryset, stream_consignment_notes
+    from shipments.models import Booking
+
+    seed_bookings(args.rows)
+    first_id = Booking.objects.order_by('-id').values_list('id', flat=True)[args.notes - 1]
+    queryset = note_queryset().filter(id__gte=first_id)
+    copies = ['Consignor copy']
+    print(f"{args.notes} notes, {os.cpu_count()} CPUs")
+
+    start = time.perf_counter()
+    size = 0
+    for row in queryset.values(*NOTE_FIELDS).iterator(chunk_size=2000):
+        size += len(render_to_string(PAGES_TEMPLATE, {'notes': [row], 'copies': copies, 'company': 'x'}))
+    baseline = time.perf_counter() - start
+    print(f"{'per note':>10}: {baseline:6.2f}s  {args.notes / baseline:7.0f} notes/s")
+
+    for workers in [1] + args.workers:
+        start = time.perf_counter()
+        first = None
+        size = 0
+        for piece in stream_consignment_notes(queryset, copies, workers=workers):
+            size += len(piece)
+            if first is None:
+                first = time.perf_counter() - start
+        spent = time.perf_counter() - start
+        label = 'chunked' if workers == 1 else f'{workers} procs'
+        print(f"{label:>10}: {spent:6.2f}s  {args.notes / spent:7.0f} notes/s  {size / 1e6:.1f} MB  "
+              f"first byte {first * 1000:.0f}ms  ({baseline / spent:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
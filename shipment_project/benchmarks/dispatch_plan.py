@@ -0,0 +1,85 @@
+"""Pickup run planning at dispatcher scale.
+
+    python -m benchmarks.dispatch_plan [--pickups 5000] [--vehicles 100] [--zips 600]
+
+Creates --zips synthetic pincodes around Hyderabad and --pickups bookings on a
+fixed far-future pickup date in the benchmark database (once), then times
+plan_day end to end and the pure planning step on its own.
+"""
+import argparse
+import random
+import time
+from datetime import date
+
+from . import setup_django
+
+PICKUP_DAY = date(2031, 1, 6)
+WINDOWS = ['09:00-12:00', '12:00-15:00', '15:00-18:00']
+
+
+def _prepare(pickups, zips):
+    from shipments.models import Booking, Pincode
+
+    rng = random.Random(37)
+    codes = [f'5{i:05d}' for i in range(zips)]
+    Pincode.objects.bulk_create(
+        [Pincode(pincode=code, latitude=17.385 + rng.uniform(-0.3, 0.3), longitude=78.486 + rng.uniform(-0.35, 0.35))
+         for code in codes],
+        update_conflicts=True, unique_fields=['pincode'], update_fields=['latitude', 'longitude'],
+    )
+    existing = Booking.objects.filter(pickup_date=PICKUP_DAY).count()
+    if existing >= pickups:
+        return
+    last = Booking.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    Booking.objects.bulk_create([
+        Booking(
+            lr_no=f'DSP{last + i}', from_location='Hyderabad', to_location='Chennai',
+            branch_from_phone='9000000001', branch_to_phone='9000000002',
+            pickup_date=PICKUP_DAY, pickup_time_window=rng.choice(WINDOWS), weight=round(rng.uniform(1, 40), 1),
+            pickup_address={'city': 'Hyderabad', 'zip': rng.choice(codes)}, status='pending',
+        )
+        for i in range(pickups - existing)
+    ], batch_size=2000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pickups', type=int, default=5000)
+    parser.add_argument('--vehicles', type=int, default=100)
+    parser.add_argument('--zips', type=int, default=600)
+    parser.add_argument('--capacity', type=float, default=1500)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from .server import prepare_database
+    prepare_database()
+
+    from shipments.dispatch import Vehicle, load_pickups, plan_day, plan_routes
+
+    _prepare(args.pickups, args.zips)
+
+    def fleet():
+        return [Vehicle(f'V{i:03d}', capacity_kg=args.capacity, start=(17.44, 78.50)) for i in range(args.vehicles)]
+
+    best_total = best_plan = float('inf')
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = plan_day(PICKUP_DAY, fleet())
+        best_total = min(best_total, time.perf_counter() - start)
+
+        pickups, _ = load_pickups(PICKUP_DAY)
+        start = time.perf_counter()
+        routes, unassigned = plan_routes(pickups, fleet())
+        best_plan = min(best_plan, time.perf_counter() - start)
+
+    distance = sum(route['distance_km'] for route in result['routes'])
+    stops = [len(route['stops']) for route in result['routes']]
+    print(f"{result['pickups']} pickups, {args.vehicles} vehicles: plan_day {best_total:.2f}s "
+          f"(planning alone {best_plan:.2f}s)")
+    print(f"  {sum(stops)} routed, {len(result['unassigned'])} unassigned, stops/vehicle {min(stops)}-{max(stops)}, "
+          f"total {distance:,.0f} km")
+
+
+if __name__ == '__main__':
+    main()
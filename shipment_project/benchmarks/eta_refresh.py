@@ -0,0 +1,60 @@
+"""Transit-time stats refresh and per-row ETA cost.
+
+    python -m benchmarks.eta_refresh [--rows 200000]
+
+Seeds --rows bookings into the benchmark database (once), backfills
+delivered_at from their status updates, then times a full and an incremental
+refresh and serializing 1000 bookings with and without the ETA fields.
+"""
+import argparse
+import time
+
+from . import setup_django
+
+
+def _best(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from .server import prepare_database
+    prepare_database()
+
+    from .fixtures import seed_bookings
+    from shipments.eta import backfill_delivered_at, eta_table, refresh_transit_stats
+    from shipments.models import Booking
+    from shipments.serializers import BookingSerializer
+
+    seed_bookings(args.rows)
+    start = time.perf_counter()
+    filled = backfill_delivered_at()
+    print(f"backfill: {filled} booking(s) in {time.perf_counter() - start:.2f}s")
+
+    lanes = refresh_transit_stats(full=True, wait=True)
+    print(f"full refresh ({lanes} lanes): {_best(lambda: refresh_transit_stats(full=True, wait=True), args.repeat):.2f}s")
+    print(f"incremental refresh: {_best(lambda: refresh_transit_stats(wait=True), args.repeat):.3f}s")
+
+    bookings = list(Booking.objects.order_by('-id')[:1000])
+    eta_table.sync(force=True)
+    with_eta = _best(lambda: BookingSerializer(bookings, many=True).data, args.repeat)
+    start = time.perf_counter()
+    for booking in bookings:
+        eta_table.estimate(booking)
+    lookups = time.perf_counter() - start
+    print(f"serialize 1000 bookings: {with_eta * 1000:.0f}ms, of which ETA lookups ~{2 * lookups * 1000:.1f}ms "
+          f"({lookups / len(bookings) * 1e6:.1f}us per estimate, {len(eta_table.stats)} stats rows in memory)")
+
+
+if __name__ == '__main__':
+    main()
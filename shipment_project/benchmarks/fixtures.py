@@ -0,0 +1,27 @@
+"""Deterministic benchmark data, loaded with the seed_bookings command."""
+from django.core.management import call_command
+
+from shipments.management.commands.seed_bookings import SEED_USER_PREFIX
+
+# A mid-popularity seeded customer: enough bookings for user_bookings to do real work
+BENCH_USERNAME = f'{SEED_USER_PREFIX}{9:07d}'
+
+
+def seed_bookings(rows, seed=0):
+    from shipments.models import Booking
+
+    missing = rows - Booking.objects.count()
+    if missing > 0:
+        call_command('seed_bookings', rows=missing, users=max(20, rows // 200), seed=seed, days=365, verbosity=0)
+
+
+def sample_lr_nos(count, seed=0):
+    """``count`` LR numbers picked by ``seed`` from the booking ids, sorted; the same on every run."""
+    import numpy as np
+
+    from shipments.models import Booking
+
+    ids = np.fromiter(Booking.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=20000),
+                      dtype=np.int64)
+    picked = np.random.default_rng(seed).choice(ids, size=min(count, len(ids)), replace=False)
+    return sorted(Booking.objects.filter(id__in=picked.tolist()).values_list('lr_no', flat=True))
@@ -0,0 +1,73 @@
+"""JSON rendering/parsing and response compression for a 1000-booking page.
+
+    python -m benchmarks.json_render [--rows 200000] [--page 1000]
+
+Seeds --rows bookings into the benchmark database (once), serializes the
+latest --page bookings, then times DRF's JSONRenderer/JSONParser against the
+project renderer/parser and the compression middleware's codecs on the
+rendered page.
+"""
+import argparse
+import gzip
+import io
+import time
+
+from . import setup_django
+
+
+def _best(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--page', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from .server import prepare_database
+    prepare_database()
+
+    from .fixtures import seed_bookings
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from shipments import fastjson
+    from shipments.fastjson import FastJSONParser, FastJSONRenderer
+    from shipments.middleware import brotli
+    from shipments.models import Booking
+    from shipments.serializers import BookingSerializer
+
+    seed_bookings(args.rows)
+    data = BookingSerializer(Booking.objects.order_by('-id')[:args.page], many=True).data
+    print(f"backend: {'orjson' if fastjson.orjson else 'stdlib json'}, page of {len(data)} bookings")
+
+    rendered = {}
+    for name, renderer in (('drf', JSONRenderer()), ('fast', FastJSONRenderer())):
+        rendered[name] = renderer.render(data)
+        render = _best(lambda: renderer.render(data), args.repeat)
+        print(f"render {name:5}: {render * 1000:7.2f}ms  {len(rendered[name]):>9} bytes")
+    for name, json_parser in (('drf', JSONParser()), ('fast', FastJSONParser())):
+        body = rendered['drf']
+        parse = _best(lambda: json_parser.parse(io.BytesIO(body)), args.repeat)
+        print(f"parse  {name:5}: {parse * 1000:7.2f}ms")
+
+    body = rendered['fast']
+    codecs = [('gzip-1', lambda b: gzip.compress(b, compresslevel=1, mtime=0)),
+              ('gzip-6', lambda b: gzip.compress(b, compresslevel=6, mtime=0))]
+    if brotli is not None:
+        codecs += [('br-5', lambda b: brotli.compress(b, quality=5))]
+    for name, compress in codecs:
+        size = len(compress(body))
+        spent = _best(lambda: compress(body), args.repeat)
+        print(f"{name:12}: {spent * 1000:7.2f}ms  {size:>9} bytes ({size / len(body):.1%} of {len(body)})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Line-haul load planning at hub scale.
+
+    python -m benchmarks.load_plan [--bookings 20000] [--lanes 4]
+
+Creates --bookings bookings (1-4 pieces each, a mix of carton sizes and some
+unreadable dimensions) spread over --lanes lanes on a fixed far-future
+booking date in the benchmark database (once), then times plan_loads with
+first-fit decreasing alone and with the local search.
+"""
+import argparse
+import random
+import time
+from collections import Counter
+from datetime import date
+
+from . import setup_django
+
+PLAN_DAY = date(2031, 2, 3)
+SIZES = ['40x30x20', '60x40x40', '120x80x100', '30x30x30', '100x50x50', '0.5 x 0.5 x 0.5 m', 'n/a']
+DESTINATIONS = ['Chennai', 'Bengaluru', 'Mumbai', 'Pune', 'Delhi', 'Kolkata']
+
+
+def _prepare(bookings, lanes):
+    from shipments.models import Booking
+
+    rng = random.Random(38)
+    queryset = Booking.objects.filter(booking_date=PLAN_DAY)
+    if queryset.count() >= bookings:
+        return
+    last = Booking.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    created = Booking.objects.bulk_create([
+        Booking(
+            lr_no=f'LDP{last + i}', from_location='Hyderabad', to_location=DESTINATIONS[i % lanes],
+            branch_from_phone='9000000001', branch_to_phone='9000000002',
+            dimensions=rng.choice(SIZES), noofpkgs=str(rng.randint(1, 4)),
+            weight=round(rng.uniform(2, 120), 1), chargeable_weight=round(rng.uniform(2, 150), 2), status='pending',
+        )
+        for i in range(bookings - queryset.count())
+    ], batch_size=2000)
+    # booking_date is auto_now_add
+    Booking.objects.filter(pk__in=[b.pk for b in created]).update(booking_date=PLAN_DAY)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bookings', type=int, default=20000)
+    parser.add_argument('--lanes', type=int, default=4)
+    parser.add_argument('--time-budget', type=float, default=0.5)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from .server import prepare_database
+    prepare_database()
+
+    from django.conf import settings
+    from shipments.loadplan import VehicleType, plan_loads
+
+    _prepare(args.bookings, min(args.lanes, len(DESTINATIONS)))
+    fleet = [VehicleType(**v) for v in settings.LOADPLAN_VEHICLE_TYPES]
+
+    for local_search in (False, True):
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            lanes = plan_loads(PLAN_DAY, fleet, local_search=local_search, time_budget=args.time_budget)
+            best = min(best, time.perf_counter() - start)
+        vehicles = [v for lane in lanes for v in lane['vehicles']]
+        fill = [max(v['weight_utilisation'], v['volume_utilisation']) for v in vehicles]
+        print(f"local_search={local_search}: {sum(l['bookings'] for l in lanes)} bookings, "
+              f"{sum(l['pieces'] for l in lanes)} pieces, {len(lanes)} lanes in {best:.2f}s")
+        print(f"  {len(vehicles)} vehicles {dict(Counter(v['type'] for v in vehicles))}, "
+              f"mean fill {sum(fill) / len(fill):.3f}, unassigned {sum(len(l['unassigned']) for l in lanes)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Minimal asyncio HTTP/1.1 load generator.
+
+Keeps one keep-alive connection per virtual user so the numbers reflect the
+server, not connection setup. Only what the API needs is implemented:
+Content-Length and chunked bodies, no TLS.
+"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+
+@dataclass
+class Request:
+    name: str
+    method: str
+    path: str
+    body: object = None
+    headers: dict = field(default_factory=dict)
+
+
+@dataclass
+class Sample:
+    name: str
+    status: int
+    latency: float
+    size: int
+
+
+class Connection:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.writer = None
+
+    async def send(self, request):
+        if self.writer is None:
+            await self._connect()
+        body = b''
+        headers = {'Host': f'{self.host}:{self.port}', 'Connection': 'keep-alive', **request.headers}
+        if request.body is not None:
+            body = request.body if isinstance(request.body, bytes) else json.dumps(request.body).encode()
+            headers.setdefault('Content-Type', 'application/json')
+        headers['Content-Length'] = str(len(body))
+        head = f'{request.method} {request.path} HTTP/1.1\r\n' + ''.join(f'{k}: {v}\r\n' for k, v in headers.items())
+        self.writer.write(head.encode('latin-1') + b'\r\n' + body)
+        await self.writer.drain()
+        return await self._read_response()
+
+    async def _read_response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('server closed the connection')
+        status = int(status_line.split()[1])
+        length = None
+        chunked = False
+        close = False
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            value = value.strip()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'transfer-encoding' and 'chunked' in value.lower():
+                chunked = True
+            elif name == 'connection' and value.lower() == 'close':
+                close = True
+
+        size = 0
+        if chunked:
+            while True:
+                chunk_len = int((await self.reader.readline()).split(b';')[0], 16)
+                if chunk_len == 0:
+                    await self.reader.readline()
+                    break
+                size += len(await self.reader.readexactly(chunk_len))
+                await self.reader.readline()
+        elif length is not None:
+            size = len(await self.reader.readexactly(length))
+        else:
+            size = len(await self.reader.read())
+            close = True
+        if close:
+            await self.close()
+        return status, size
+
+
+async def _virtual_user(base_url, requests, samples):
+    parts = urlsplit(base_url)
+    conn = Connection(parts.hostname, parts.port or 80)
+    try:
+        for request in requests:
+            start = time.perf_counter()
+            try:
+                status, size = await conn.send(request)
+            except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError):
+                await conn.close()
+                status, size = 0, 0
+            samples.append(Sample(request.name, status, time.perf_counter() - start, size))
+    finally:
+        await conn.close()
+
+
+async def run_load(base_url, request_streams):
+    """Run one virtual user per request stream; returns (samples, wall seconds)."""
+    samples = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_virtual_user(base_url, stream, samples) for stream in request_streams))
+    return samples, time.perf_counter() - start
@@ -0,0 +1,125 @@
+"""Cost of logging on the request thread: synchronous handler vs the queue pipeline.
+
+    python -m benchmarks.logging_pipeline [--threads 8] [--records 20000] [--requests 2000]
+
+Both variants write the same JSON lines to --output (a temp file by default).
+``emit`` times bare logger calls from several threads; ``tracking`` times the
+track_shipment view through the test client with every debug line kept
+(LOG_DEBUG_SAMPLE_RATE=1), which is the worst case for the old print() calls.
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+from . import setup_django
+
+
+def _sync_handler(stream):
+    from shipments.log import JsonFormatter
+
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def _queue_handler(stream):
+    from shipments.log import QueueingHandler
+
+    return QueueingHandler(stream=stream, maxsize=1000000)
+
+
+def _run_threads(threads, work):
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def _with_handler(factory, path, logger_name, level, body):
+    from shipments.log import DebugSamplingFilter, RequestContextFilter
+
+    stream = open(path, 'a', buffering=1)
+    handler = factory(stream)
+    handler.addFilter(DebugSamplingFilter(rate=1.0, per_second=10**9))
+    handler.addFilter(RequestContextFilter())
+    logger = logging.getLogger(logger_name)
+    saved = logger.handlers[:], logger.level, logger.propagate
+    logger.handlers = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    try:
+        elapsed = body()
+    finally:
+        start = time.perf_counter()
+        handler.close()
+        drain = time.perf_counter() - start
+        logger.handlers, _, logger.propagate = saved
+        logger.setLevel(saved[1])
+        stream.close()
+    return elapsed, drain
+
+
+def bench_emit(path, threads, records):
+    logger = logging.getLogger('benchmarks.logging')
+
+    def work(i):
+        for n in range(records):
+            logger.info('Booking saved with LR No: %s, From: %s, To: %s', n, 'Hyderabad', 'Chennai')
+
+    for label, factory in [('sync StreamHandler', _sync_handler), ('QueueingHandler', _queue_handler)]:
+        elapsed, drain = _with_handler(factory, path, 'benchmarks.logging', logging.INFO,
+                                       lambda: _run_threads(threads, work))
+        total = threads * records
+        print(f'emit      {label:20s} {total / elapsed:10.0f} records/s on callers  '
+              f'{elapsed / total * 1e6:6.2f} us each  (drain {drain:.2f}s)')
+
+
+def bench_tracking(path, threads, requests, lr_nos):
+    from django.test import Client
+
+    def work(i):
+        client = Client(HTTP_HOST='localhost')
+        rng = random.Random(i)
+        for _ in range(requests // threads):
+            client.post('/api/track_shipment/', {'lr_no': rng.choice(lr_nos)}, content_type='application/json')
+
+    for label, factory in [('sync StreamHandler', _sync_handler), ('QueueingHandler', _queue_handler)]:
+        elapsed, _ = _with_handler(factory, path, 'shipments', logging.DEBUG, lambda: _run_threads(threads, work))
+        print(f'tracking  {label:20s} {requests / elapsed:10.0f} requests/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--records', type=int, default=20000, help='log calls per thread for the emit benchmark')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--output', help='log file (default: a temp file)')
+    args = parser.parse_args()
+
+    os.environ['THROTTLE_ENABLED'] = 'False'
+    setup_django()
+    from shipments.models import Booking
+
+    from .fixtures import seed_bookings
+    from .server import prepare_database
+
+    prepare_database()
+    seed_bookings(args.rows)
+    lr_nos = list(Booking.objects.values_list('lr_no', flat=True)[:2000])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.output or os.path.join(tmp, 'bench.log')
+        bench_emit(path, args.threads, args.records)
+        bench_tracking(path, args.threads, args.requests, lr_nos)
+
+
+if __name__ == '__main__':
+    main()
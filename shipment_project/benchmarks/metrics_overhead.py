@@ -0,0 +1,62 @@
+"""Per-request cost of MetricsMiddleware (budget: < 50us).
+
+    python -m benchmarks.metrics_overhead [--requests 50000]
+"""
+import argparse
+import time
+
+from . import setup_django
+
+
+def _time_per_call(func, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=3, help="simulated SQL statements per request")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+    from django.urls import resolve
+
+    from shipments.metrics import registry
+    from shipments.middleware import MetricsMiddleware
+
+    request = RequestFactory().get('/api/user-bookings/')
+    request.resolver_match = resolve('/api/user-bookings/')
+    body = b'{"results": []}' * 20
+
+    def fake_execute(sql, params, many, context):
+        return None
+
+    def view(req):
+        # Run simulated statements through the active execute wrappers, no real DB needed
+        for _ in range(args.queries):
+            execute = fake_execute
+            for wrapper in reversed(connection.execute_wrappers):
+                execute = (lambda w, e: lambda *a: w(e, *a))(wrapper, execute)
+            execute('SELECT 1', None, False, {})
+        return HttpResponse(body)
+
+    wrapped = MetricsMiddleware(view)
+    bare = _time_per_call(lambda: view(request), args.requests)
+    instrumented = _time_per_call(lambda: wrapped(request), args.requests)
+    registry.reset()
+
+    overhead_us = (instrumented - bare) * 1e6
+    print(f"bare view:         {bare * 1e6:8.2f} us/request")
+    print(f"with metrics:      {instrumented * 1e6:8.2f} us/request")
+    print(f"overhead:          {overhead_us:8.2f} us/request (budget 50 us)")
+    raise SystemExit(0 if overhead_us < 50 else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Load profiles.
+
+Every profile builds its request sequence up front from a seeded RNG, so two
+runs against the same data send exactly the same requests in the same order.
+"""
+import random
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from .loadgen import Request
+
+CITIES = ['Hyderabad', 'Chennai', 'Bengaluru', 'Mumbai', 'Pune', 'Delhi', 'Kolkata', 'Vijayawada']
+
+
+@dataclass
+class Profile:
+    name: str
+    description: str
+    concurrency: int
+    requests_per_user: int
+    build: object  # (rng, context) -> Request
+
+    def request_streams(self, context, seed=0, scale=1.0):
+        per_user = max(1, int(self.requests_per_user * scale))
+        streams = []
+        for user in range(self.concurrency):
+            rng = random.Random(f'{self.name}:{seed}:{user}')
+            streams.append([self.build(rng, context) for _ in range(per_user)])
+        return streams
+
+
+def _tracking(rng, ctx):
+    # Mostly real LRs, some misses, some lower-case input like the tracking page sends
+    roll = rng.random()
+    if roll < 0.85:
+        lr_no = rng.choice(ctx['lr_nos'])
+    elif roll < 0.95:
+        lr_no = rng.choice(ctx['lr_nos']).lower()
+    else:
+        lr_no = f'NX{rng.randrange(10**8)}'
+    return Request('track_shipment', 'POST', '/api/track_shipment/', {'lr_no': lr_no})
+
+
+def _address(rng, city):
+    return {
+        'name': f'Customer {rng.randrange(10000)}',
+        'address': f'{rng.randrange(1, 999)} Main Road',
+        'city': city,
+        'zip': str(500000 + rng.randrange(1000)),
+        'country': 'India',
+        'phone': f'9{rng.randrange(10**9):09d}',
+        'email': '',
+    }
+
+
+def _booking(rng, ctx):
+    origin, destination = rng.sample(CITIES, 2)
+    return Request('create_booking', 'POST', '/api/bookings/', {
+        'pickup_address': _address(rng, origin),
+        'delivery_address': _address(rng, destination),
+        'service_type': rng.choice(['standard', 'express']),
+        'package_type': rng.choice(['box', 'envelope', 'pallet']),
+        'weight': round(rng.uniform(0.5, 80), 1),
+        'dimensions': f'{rng.randrange(10, 120)}x{rng.randrange(10, 80)}x{rng.randrange(5, 60)}',
+        'description': '',
+        'pickup_date': (date.today() + timedelta(days=rng.randrange(3))).isoformat(),
+        'pickup_time_window': rng.choice(['09:00-12:00', '12:00-15:00', '15:00-18:00']),
+        'payment_method': rng.choice(['cash', 'upi', 'card']),
+        'phone': f'9{rng.randrange(10**9):09d}',
+    })
+
+
+def _dashboard(rng, ctx):
+    roll = rng.random()
+    if roll < 0.4:
+        return Request('user_bookings', 'GET', '/api/user-bookings/', headers=ctx['auth_headers'])
+    if roll < 0.7:
+        page = rng.randrange(1, 6)
+        return Request('customer_shipments', 'GET', f'/api/customer-shipments/?page={page}&ordering=-booking_date')
+    if roll < 0.9:
+        city = rng.choice(CITIES)
+        return Request('customer_shipments_search', 'GET', f'/api/customer-shipments/?search={city}&page=1')
+    end = date.today()
+    start = end - timedelta(days=rng.choice([7, 30, 90]))
+    return Request('customer_shipments_range', 'GET', f'/api/customer-shipments/?start_date={start}&end_date={end}')
+
+
+def _export(rng, ctx):
+    return rng.choice([
+        Request('export_customer_shipments_csv', 'GET', '/api/export-customer-shipments-csv/'),
+        Request('export_all_customer_shipments_csv', 'GET', '/api/export-all-customer-shipments-csv/'),
+        Request('export_shipments', 'GET', '/api/export-shipments/'),
+    ])
+
+
+PROFILES = {
+    profile.name: profile
+    for profile in [
+        Profile('tracking_poll_storm', 'Many clients polling track_shipment', 64, 200, _tracking),
+        Profile('booking_burst', 'Burst of create_booking submissions', 16, 50, _booking),
+        Profile('dashboard_browse', 'Customer dashboard list/search and user_bookings', 24, 60, _dashboard),
+        Profile('full_export', 'CSV/XLSX exports of the whole booking table', 2, 3, _export),
+    ]
+}
@@ -0,0 +1,95 @@
+"""Bulk tariff re-rating against a per-booking save() loop.
+
+    python -m benchmarks.rerate_bookings [--rows 200000] [--sample 2000]
+
+Seeds --rows bookings into the benchmark database (once) and a tariff with a
+rate per service type plus a few lane rates, then times rerate_bookings() as
+a dry run, as a real run, and again once every charge already matches (the
+cost of a scan that writes nothing). The baseline re-rates --sample open,
+unbilled bookings one at a time with Booking.save(), inside a transaction
+that is rolled back, and is scaled up to the number of bookings scanned.
+
+Seeded bookings use the freight-trade payment terms, so the unbilled ones
+here are 'to-pay' and 'tbb' rather than the form's 'cash_on_delivery'; all
+three are in TARIFF_UNBILLED_PAYMENT_METHODS and select the same way.
+"""
+import argparse
+import time
+from datetime import date
+
+from . import setup_django
+
+
+class _Rollback(Exception):
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--sample', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=None)
+    args = parser.parse_args()
+
+    setup_django()
+    from .server import prepare_database
+    prepare_database()
+
+    from decimal import Decimal
+
+    from django.conf import settings
+    from django.db import transaction
+
+    from .fixtures import seed_bookings
+    from shipments.models import Booking, RerateRun, TariffRate, TariffVersion
+    from shipments.sla import OPEN_STATUSES
+    from shipments.tariffs import RateCard, rerate_bookings
+
+    seed_bookings(args.rows)
+    RerateRun.objects.filter(tariff__name__startswith='bench-').delete()
+    TariffVersion.objects.filter(name__startswith='bench-').delete()
+    tariff = TariffVersion.objects.create(name=f'bench-{time.time():.0f}', effective_from=date(2024, 4, 1),
+                                          sgst_bp=900, cgst_bp=900)
+    rates = [TariffRate(tariff=tariff, base_paise=2000, per_kg_paise=1100, min_paise=15000)]
+    rates += [TariffRate(tariff=tariff, service_type=service, base_paise=base, per_kg_paise=per_kg, min_paise=15000)
+              for service, base, per_kg in (('express', 5000, 2300), ('standard', 3000, 1500), ('economy', 0, 900))]
+    lanes = (Booking.objects.values_list('from_location', 'to_location').order_by().distinct()[:20])
+    rates += [TariffRate(tariff=tariff, from_location=origin, to_location=destination, base_paise=4000,
+                         per_kg_paise=1800, min_paise=20000) for origin, destination in lanes]
+    TariffRate.objects.bulk_create(rates)
+
+    unbilled = [m.lower() for m in settings.TARIFF_UNBILLED_PAYMENT_METHODS]
+    eligible = Booking.objects.filter(status__in=OPEN_STATUSES, payment_method__in=unbilled)
+    print(f"{Booking.objects.count()} bookings, {eligible.count()} open and unbilled, {len(rates)} rates")
+
+    for label, kwargs in (('dry run', {'dry_run': True}), ('real run', {}), ('repeat (no changes)', {})):
+        start = time.perf_counter()
+        run = rerate_bookings(tariff, batch_size=args.batch_size, **kwargs)
+        elapsed = time.perf_counter() - start
+        print(f"{label:20s} {elapsed:7.2f}s  scanned {run.scanned}, changed {run.changed}, unrated {run.unrated}")
+    scanned = run.scanned
+
+    card = RateCard(tariff)
+    sample = list(eligible.order_by('id')[:args.sample])
+    start = time.perf_counter()
+    try:
+        with transaction.atomic():
+            for booking in sample:
+                base, per_kg, minimum = card.lookup(booking.from_location, booking.to_location, booking.service_type)
+                weight = int(((booking.chargeable_weight or Decimal(booking.weight or 0)) * 100).to_integral_value())
+                freight = max(minimum, base + (per_kg * weight + 50) // 100)
+                booking.freight = Decimal(freight).scaleb(-2)
+                booking.sgst = Decimal((freight * tariff.sgst_bp + 5000) // 10000).scaleb(-2)
+                booking.cgst = Decimal((freight * tariff.cgst_bp + 5000) // 10000).scaleb(-2)
+                booking.version += 1
+                booking.save()
+            raise _Rollback
+    except _Rollback:
+        pass
+    elapsed = time.perf_counter() - start
+    print(f"per-booking save()   {elapsed:7.2f}s for {len(sample)}, ~{elapsed / len(sample) * scanned:.0f}s "
+          f"for {scanned}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Summaries, JSON result files and run-to-run comparison."""
+import json
+import subprocess
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+REJECTED_STATUSES = (429, 503)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _latency_summary(latencies):
+    values = sorted(latencies)
+    return {
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p95_ms': round(percentile(values, 95) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        'max_ms': round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+def summarize(profile, samples, wall_seconds):
+    by_endpoint = defaultdict(list)
+    for sample in samples:
+        by_endpoint[sample.name].append(sample.latency)
+    # Throttled (429) and shed (503) requests never reached the endpoint; they are counted apart
+    # from failures so a run that mostly measured the throttle cannot pass for a clean one
+    rejected = sum(1 for s in samples if s.status in REJECTED_STATUSES)
+    errors = sum(1 for s in samples if s.status not in REJECTED_STATUSES and (s.status == 0 or s.status >= 500))
+    client_errors = sum(1 for s in samples if s.status not in REJECTED_STATUSES and 400 <= s.status < 500)
+    return {
+        'profile': profile.name,
+        'concurrency': profile.concurrency,
+        'requests': len(samples),
+        'errors': errors,
+        'rejected': rejected,
+        'client_errors': client_errors,
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_rps': round(len(samples) / wall_seconds, 2) if wall_seconds else 0.0,
+        'bytes_received': sum(s.size for s in samples),
+        'status_counts': {str(k): v for k, v in sorted(Counter(s.status for s in samples).items())},
+        'latency': _latency_summary([s.latency for s in samples]),
+        'endpoints': {name: {'requests': len(lat), **_latency_summary(lat)} for name, lat in sorted(by_endpoint.items())},
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(run, path=None):
+    run.setdefault('created_at', datetime.now(timezone.utc).isoformat(timespec='seconds'))
+    run.setdefault('git_commit', _git_commit())
+    if path is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        path = RESULTS_DIR / f'{stamp}.json'
+    path = Path(path)
+    path.write_text(json.dumps(run, indent=2))
+    return path
+
+
+def load(path):
+    return json.loads(Path(path).read_text())
+
+
+def compare(base, new, threshold=0.10):
+    """Return (lines, regressions) comparing p95 latency and throughput per profile."""
+    lines = []
+    regressions = []
+    base_profiles = {p['profile']: p for p in base['profiles']}
+    for result in new['profiles']:
+        old = base_profiles.get(result['profile'])
+        if old is None:
+            lines.append(f"{result['profile']}: no baseline")
+            continue
+        p95_change = _change(old['latency']['p95_ms'], result['latency']['p95_ms'])
+        rps_change = _change(old['throughput_rps'], result['throughput_rps'])
+        # Result files written before 'rejected' existed count as none rejected
+        old_rejected, rejected = old.get('rejected', 0), result.get('rejected', 0)
+        flagged = (p95_change > threshold or rps_change < -threshold or result['errors'] > old['errors']
+                   or rejected > old_rejected)
+        lines.append(
+            f"{result['profile']}: p95 {old['latency']['p95_ms']:.1f} -> {result['latency']['p95_ms']:.1f} ms ({p95_change:+.1%}), "
+            f"throughput {old['throughput_rps']:.1f} -> {result['throughput_rps']:.1f} rps ({rps_change:+.1%}), "
+            f"errors {old['errors']} -> {result['errors']}, rejected {old_rejected} -> {rejected}"
+            + ('  REGRESSION' if flagged else '')
+        )
+        if flagged:
+            regressions.append(result['profile'])
+    return lines, regressions
+
+
+def _change(old, new):
+    return (new - old) / old if old else 0.0
@@ -0,0 +1,86 @@
+"""Boot the app for a benchmark run.
+
+``thread`` serves the WSGI app from a background thread of this process (quick,
+but shares the GIL with the load generator); ``gunicorn`` starts a real
+multi-worker server against the same benchmark database.
+"""
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def prepare_database(keepdb=True):
+    """Create (or reuse) ``<DB_NAME>_bench`` and point this process at it."""
+    from django.db import connection
+
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    test_settings['NAME'] = f"{connection.settings_dict['NAME']}_bench"
+    return connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class ThreadServer:
+    def __init__(self):
+        from django.core.handlers.wsgi import WSGIHandler
+        from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler, allow_reuse_address=False)
+        self.httpd.set_app(WSGIHandler())
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class GunicornServer:
+    def __init__(self, database, workers=4):
+        self.port = _free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.database = database
+        self.workers = workers
+        self.process = None
+
+    def __enter__(self):
+        env = {**os.environ, 'DB_NAME': self.database, 'DJANGO_DEBUG': 'False'}
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'shipment_project.wsgi:application',
+             '--bind', f'127.0.0.1:{self.port}', '--workers', str(self.workers), '--log-level', 'warning'],
+            cwd=PROJECT_DIR, env=env,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=0.5).close()
+                return self
+            except OSError:
+                if self.process.poll() is not None:
+                    raise RuntimeError('gunicorn exited during startup')
+                time.sleep(0.2)
+        self.__exit__()
+        raise RuntimeError('gunicorn did not start listening within 30s')
+
+    def __exit__(self, *exc):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(timeout=30)
@@ -0,0 +1,82 @@
+"""SLA breach detection cost against table size.
+
+    python -m benchmarks.sla_detector [--rows 200000] [--hours 24]
+
+Seeds --rows bookings into the benchmark database (once), backfills
+delivery deadlines for open bookings and spreads them over the 60 days
+around now, then times at_risk_shipments() with the partial (status,
+delivery_deadline) index and with index scans disabled, and a full
+detect_sla_breaches() run (first, then repeated with every alert existing).
+"""
+import argparse
+import time
+
+from . import setup_django
+
+
+def _best(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from .server import prepare_database
+    prepare_database()
+
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    from .fixtures import seed_bookings
+    from shipments.models import Booking, SlaAlert
+    from shipments.sla import OPEN_STATUSES, at_risk_shipments, backfill_delivery_deadlines, detect_sla_breaches
+
+    seed_bookings(args.rows)
+    start = time.perf_counter()
+    filled = backfill_delivery_deadlines()
+    print(f"backfill: {filled} booking(s) in {time.perf_counter() - start:.2f}s")
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        # Seeded booking dates are spread over years; put the open ones' deadlines around now
+        cursor.execute(
+            f"UPDATE {Booking._meta.db_table} SET delivery_deadline = %s + (hashtext(lr_no) %% 720) * interval '1 hour' "
+            f"WHERE status IN %s", [now, OPEN_STATUSES],
+        )
+        cursor.execute(f'ANALYZE {Booking._meta.db_table}')
+    SlaAlert.objects.all().delete()
+
+    total = Booking.objects.count()
+    open_count = Booking.objects.filter(status__in=OPEN_STATUSES).count()
+    _, shipments = at_risk_shipments(args.hours, now)
+    print(f"{total} bookings, {open_count} open, {len(shipments)} at risk within {args.hours:g}h")
+
+    indexed = _best(lambda: at_risk_shipments(args.hours, now), args.repeat)
+
+    def without_index():
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_indexscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+            at_risk_shipments(args.hours, now)
+
+    print(f"at_risk_shipments, index:    {indexed * 1000:8.1f}ms")
+    print(f"at_risk_shipments, seq scan: {_best(without_index, args.repeat) * 1000:8.1f}ms")
+
+    start = time.perf_counter()
+    report = detect_sla_breaches(args.hours, now)
+    print(f"detect, first run:  {(time.perf_counter() - start) * 1000:8.1f}ms ({report['new_alerts']} new alerts)")
+    repeat = _best(lambda: detect_sla_breaches(args.hours, now), args.repeat)
+    print(f"detect, repeat run: {repeat * 1000:8.1f}ms (0 new alerts)")
+
+
+if __name__ == '__main__':
+    main()
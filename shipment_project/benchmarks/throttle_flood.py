@@ -0,0 +1,121 @@
+"""Tracking latency for well-behaved clients while one client floods the API.
+
+    python -m benchmarks.throttle_flood [--seconds 10] [--rows 20000] [--server thread|gunicorn]
+
+Three phases against the benchmark database:
+
+* baseline   - only the paced tracking clients (each from its own IP)
+* throttled  - the same clients plus a flood of tracking and export requests
+               from one IP, with shipments.throttling enabled
+* unthrottled - the same flood with throttling switched off
+
+Client IPs are sent in X-Forwarded-For with THROTTLE_TRUSTED_PROXIES=1, as if
+nginx were in front.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from . import setup_django
+from .loadgen import Connection, Request
+from .results import percentile
+
+
+async def _client(url, requests, stop_at, pause, samples):
+    parts = urlsplit(url)
+    conn = Connection(parts.hostname, parts.port or 80)
+    try:
+        i = 0
+        while time.perf_counter() < stop_at:
+            request = requests[i % len(requests)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                status, _ = await conn.send(request)
+            except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError):
+                await conn.close()
+                status = 0
+            samples.append((status, time.perf_counter() - start))
+            if pause:
+                await asyncio.sleep(pause)
+    finally:
+        await conn.close()
+
+
+async def _phase(url, lr_nos, seconds, clients, flooders):
+    rng = random.Random(0)
+    stop_at = time.perf_counter() + seconds
+    legit, flood = [], []
+    tasks = []
+    for c in range(clients):
+        headers = {'X-Forwarded-For': f'10.1.{c // 250}.{c % 250 + 1}'}
+        requests = [Request('track_shipment', 'POST', '/api/track_shipment/', {'lr_no': rng.choice(lr_nos)}, headers)
+                    for _ in range(50)]
+        # ~2 lookups a second per client, well inside the anonymous rate
+        tasks.append(_client(url, requests, stop_at, 0.5, legit))
+    for _ in range(flooders):
+        headers = {'X-Forwarded-For': '10.66.6.6'}
+        requests = [
+            Request('export_customer_shipments_csv', 'GET', '/api/export-customer-shipments-csv/', headers=headers)
+            if rng.random() < 0.2 else
+            Request('track_shipment', 'POST', '/api/track_shipment/', {'lr_no': f'NX{rng.randrange(10**8)}'}, headers)
+            for _ in range(50)
+        ]
+        tasks.append(_client(url, requests, stop_at, 0, flood))
+    await asyncio.gather(*tasks)
+    return legit, flood
+
+
+def _report(label, legit, flood):
+    ok = sorted(latency for status, latency in legit if status == 200)
+    failed = sum(1 for status, _ in legit if status != 200)
+    line = f'{label:12s} legit {len(legit):6d} req'
+    if ok:
+        line += (f'  p50 {percentile(ok, 50) * 1e3:8.2f}  p95 {percentile(ok, 95) * 1e3:8.2f}'
+                 f'  p99 {percentile(ok, 99) * 1e3:8.2f} ms')
+    line += f'  non-200 {failed}'
+    if flood:
+        statuses = Counter(status for status, _ in flood)
+        line += '   flood ' + ' '.join(f'{status}:{count}' for status, count in sorted(statuses.items()))
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--flooders', type=int, default=32)
+    parser.add_argument('--server', choices=['thread', 'gunicorn'], default='thread')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    os.environ['THROTTLE_TRUSTED_PROXIES'] = '1'
+    setup_django()
+    from django.conf import settings
+    from django.core.cache import cache
+
+    from .fixtures import sample_lr_nos, seed_bookings
+    from .server import GunicornServer, ThreadServer, prepare_database
+
+    database = prepare_database()
+    seed_bookings(args.rows)
+    lr_nos = sample_lr_nos(2000)
+
+    for label, flooders, enabled in [('baseline', 0, True), ('throttled', args.flooders, True),
+                                     ('unthrottled', args.flooders, False)]:
+        os.environ['THROTTLE_ENABLED'] = str(enabled)
+        settings.THROTTLE['ENABLED'] = enabled
+        cache.clear()
+        server = ThreadServer() if args.server == 'thread' else GunicornServer(database, args.workers)
+        with server:
+            legit, flood = asyncio.run(_phase(server.url, lr_nos, args.seconds, args.clients, flooders))
+        _report(label, legit, flood)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+# Picked up automatically by gunicorn from the working directory.
+import glob
+import os
+
+
+def on_starting(server):
+    # Per-worker metric dumps from a previous master would be double counted
+    directory = os.environ.get('METRICS_DIR')
+    if directory:
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            os.remove(path)
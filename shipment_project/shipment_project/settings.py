@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from pathlib import Path
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -49,11 +50,18 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # Must be first
+    'shipments.middleware.RequestContextMiddleware',
+    'shipments.middleware.MetricsMiddleware',
+    # Inside MetricsMiddleware so response sizes are recorded as sent
+    'shipments.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'shipments.throttling.ThrottleMiddleware',
+    # Drops out of the stack at startup unless PROFILING['ENABLED']
+    'shipments.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -140,6 +148,8 @@ AUTH_USER_MODEL = 'shipments.CustomUser'
 # Configure CORS allowed origins
 CORS_ALLOWED_ORIGINS = os.environ.get('DJANGO_CORS_ALLOWED_ORIGINS', 'http://localhost:5173,http://127.0.0.1:5173,http://localhost,http://13.200.120.112,http://chaitanyalogistics.com,https://chaitanyalogistics.com').split(',')
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key', 'x-request-id')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed', 'Retry-After', 'X-Request-ID']
 
 CSRF_TRUSTED_ORIGINS = [
     "http://localhost:5173",
@@ -156,11 +166,22 @@ LOGIN_URL = 'http://localhost:5173/login'
 # REST Framework: Enable JWT authentication and allow any permissions by default
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Builds request.user from token claims; the CustomUser row is loaded only on demand
+        'shipments.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
     ),
+    # orjson when installed; same output as DRF's JSONRenderer/JSONParser otherwise
+    'DEFAULT_RENDERER_CLASSES': (
+        'shipments.fastjson.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'shipments.fastjson.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 # Session timeout: 30 minutes (1800 seconds)
@@ -179,4 +200,214 @@ SIMPLE_JWT = {
     # Optional: Sliding tokens for true inactivity timeout
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=30),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=7),
-}
\ No newline at end of file
+}
+
+# Per-process cache for ClaimsUser fallbacks (tokens without claims, views needing the full row)
+JWT_USER_CACHE_TTL = int(os.environ.get('JWT_USER_CACHE_TTL', '60'))
+JWT_USER_CACHE_SIZE = 1024
+
+# Refresh-token revocation (shipments.revocation). Other workers' revocations are picked
+# up within REVOCATION_SYNC_INTERVAL seconds; rotation itself is always replay-safe.
+REVOCATION_SYNC_INTERVAL = float(os.environ.get('REVOCATION_SYNC_INTERVAL', '1.0'))
+REVOCATION_SYNC_LOOKBACK = 30
+REVOCATION_REBUILD_INTERVAL = 3600
+REVOCATION_BLOOM_CAPACITY = 100000
+REVOCATION_BLOOM_ERROR_RATE = 0.01
+
+# Prometheus metrics (/metrics). With several gunicorn workers set METRICS_DIR to a
+# shared writable directory; each worker dumps its counters there and the scrape sums them.
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '5'))
+METRICS_AUTH_TOKEN = os.environ.get('METRICS_AUTH_TOKEN', '')
+
+# Shared cache. Point REDIS_URL at a Redis instance in production so throttling budgets
+# are shared by every gunicorn worker; without it each worker keeps its own.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Per-process LRU of rendered booking list responses (shipments.response_cache). The data
+# version counters live in CACHES, so with several workers set REDIS_URL: with LocMemCache
+# a write only invalidates the worker that handled it.
+RESPONSE_CACHE = {
+    'ENABLED': os.environ.get('RESPONSE_CACHE_ENABLED', 'True') == 'True',
+    'MAX_ENTRIES': 2000,
+    'MAX_BYTES': 64 * 1024 * 1024,
+}
+
+# Response compression; brotli is used only when the brotli package is installed
+COMPRESSION = {
+    'ENABLED': os.environ.get('COMPRESSION_ENABLED', 'True') == 'True',
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_LEVEL': 5,
+    'CONTENT_TYPES': ('application/json', 'text/', 'application/javascript', 'image/svg+xml'),
+}
+
+# How long an Idempotency-Key response is replayed (prune_idempotency_keys removes the rest)
+IDEMPOTENCY_KEY_TTL = 24 * 3600
+
+# Largest fleet accepted by POST /api/dispatch/plan/
+DISPATCH_MAX_VEHICLES = 500
+
+# Delivery ETAs (shipments.eta). refresh_transit_times rebuilds lanes with new deliveries;
+# run it with --full now and then so lanes without new deliveries age out of the window.
+ETA_HISTORY_DAYS = 180
+ETA_MAX_DAYS = 30         # histogram buckets are whole days; the last one is "30 or more"
+ETA_MIN_SAMPLES = 20      # fewer deliveries than this and a lane falls back to its origin hub, then global
+ETA_DEFAULT_DAYS = 3      # before any stats exist
+ETA_SYNC_INTERVAL = float(os.environ.get('ETA_SYNC_INTERVAL', '60'))
+ETA_REFRESH_LOOKBACK = 3600
+
+# Cold storage for old delivered bookings (archive_bookings / restore_bookings).
+# track_shipment falls back to the archive's LR index for numbers no longer in the table.
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', str(BASE_DIR / 'archive'))
+ARCHIVE_BLOCK_ROWS = 256  # rows per gzip member; a lookup decompresses one member
+
+# Columnar extract for analysis (extract_columnar): one .npy per column, appended in parts of
+# up to COLUMNAR_PART_ROWS bookings; a --full rewrite keeps the last COLUMNAR_KEEP_VERSIONS versions.
+COLUMNAR_DIR = os.environ.get('COLUMNAR_DIR', str(BASE_DIR / 'columnar'))
+COLUMNAR_PART_ROWS = 1_000_000
+COLUMNAR_KEEP_VERSIONS = 2
+
+# Tariff re-rating (rerate_bookings): open bookings with these payment methods have not been
+# billed yet, so their charges follow tariff changes. Bookings are read and written a batch at a time.
+# The booking form stores 'credit' (card, paid when booking) or 'cash_on_delivery' (collected at
+# delivery, so still unbilled); 'to-pay' and 'tbb' (to be billed) are the same two cases in the
+# freight-trade terms that older and seeded bookings use. Matched case-insensitively.
+TARIFF_UNBILLED_PAYMENT_METHODS = ['cash_on_delivery', 'to-pay', 'tbb']
+TARIFF_RERATE_BATCH_SIZE = 5000
+
+# Line-haul fleet for POST /api/loadplan/ when the request does not list vehicles.
+# Types are opened in this order; count None means as many as needed.
+LOADPLAN_VEHICLE_TYPES = [
+    {'name': '32ft MXL', 'max_weight_kg': 7000, 'volume_m3': 60, 'count': None},
+    {'name': '20ft', 'max_weight_kg': 3000, 'volume_m3': 30, 'count': None},
+    {'name': 'Tata Ace', 'max_weight_kg': 750, 'volume_m3': 5, 'count': None},
+]
+
+# Dirty weeks a GET /api/reports/routes/ folds into the route summary before answering; the
+# rest wait for the refresh_route_summary command (run it after bulk loads and backfills)
+ROUTE_SUMMARY_REQUEST_WEEKS = 4
+
+# Max LR numbers per POST /api/track_shipment/batch/
+TRACKING_BATCH_LIMIT = 200
+# update_shipment_status re-reads and retries this many times when another write wins the race
+BOOKING_UPDATE_RETRIES = 5
+# Scans per POST to /api/update-shipment-status/bulk/ (one UPDATE statement)
+STATUS_BULK_LIMIT = 2000
+
+# Delivery SLAs (shipments.sla). New bookings are due SLA_PROMISE_DAYS after booking, by
+# service type; detect_sla_breaches looks SLA_HORIZON_HOURS ahead and SLA_BREACH_LOOKBACK_HOURS back.
+SLA_PROMISE_DAYS = {'express': 2, 'standard': 4, 'economy': 7}
+SLA_DEFAULT_PROMISE_DAYS = 5
+SLA_PRIORITY = ['express', 'standard', 'economy']   # most urgent first; other services rank last
+SLA_BUCKET_HOURS = [6, 12, 24]
+SLA_HORIZON_HOURS = 24
+SLA_BREACH_LOOKBACK_HOURS = 72
+
+# Booking form autocomplete (shipments.autocomplete). Each process picks up new bookings
+# every SYNC_INTERVAL seconds in the background and reloads everything every REBUILD_INTERVAL.
+AUTOCOMPLETE_SYNC_INTERVAL = float(os.environ.get('AUTOCOMPLETE_SYNC_INTERVAL', '60'))
+AUTOCOMPLETE_REBUILD_INTERVAL = 3600
+AUTOCOMPLETE_MAX_RESULTS = 20
+AUTOCOMPLETE_RANGE_CUTOFF = 2000   # prefixes matching more entries than this have precomputed results
+
+# Request profiling (shipments.profiling): staff send 'X-Profile: 1', or a random
+# SAMPLE_RATE of requests is profiled. MODE 'cprofile' traces every call; 'sample'
+# records the stack every SAMPLE_INTERVAL seconds. The newest KEEP profiles are kept.
+PROFILING = {
+    'ENABLED': os.environ.get('PROFILING_ENABLED', 'False') == 'True',
+    'SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', '0')),
+    'MODE': os.environ.get('PROFILING_MODE', 'cprofile'),
+    'SAMPLE_INTERVAL': 0.005,
+    'DIR': os.environ.get('PROFILE_DIR', str(BASE_DIR / 'profiles')),
+    'KEEP': 50,
+    'MAX_QUERIES': 2000,
+}
+
+# Printable consignment notes (shipments.consignment_notes)
+CONSIGNMENT_NOTE_COMPANY = 'Chaitanya Logistics'
+CONSIGNMENT_NOTE_COPIES = ['Consignor copy', 'Consignee copy', 'Driver copy']
+CONSIGNMENT_NOTE_CHUNK_SIZE = 500   # bookings fetched and rendered per task
+CONSIGNMENT_NOTE_WORKERS = int(os.environ.get('CONSIGNMENT_NOTE_WORKERS', str(min(4, os.cpu_count() or 1))))
+CONSIGNMENT_NOTE_POOL_MIN = 2000    # smaller batches render inline; starting the pool costs ~0.5s
+CONSIGNMENT_NOTE_MAX = 20000        # per API request; the command has no limit
+
+# Rate limiting and load shedding (shipments.throttling). Costs are tokens per request
+# by URL name; anonymous clients refill ANON_RATE tokens/s per IP, signed-in users
+# USER_RATE per user. CONCURRENCY caps in-flight requests per view across workers.
+THROTTLE = {
+    'ENABLED': os.environ.get('THROTTLE_ENABLED', 'True') == 'True',
+    'ANON_RATE': 5.0,
+    'ANON_BURST': 40,
+    'USER_RATE': 10.0,
+    'USER_BURST': 80,
+    'TRUSTED_PROXIES': int(os.environ.get('THROTTLE_TRUSTED_PROXIES', '0')),
+    'COSTS': {
+        'track_shipment': 1,
+        'track_shipment_batch': 20,
+        'customer_shipments': 2,
+        'update_shipment_status': 2,
+        'update_shipment_status_bulk': 20,
+        'create_booking': 5,
+        'api_login': 5,
+        'register_user': 5,
+        'contact_us_api': 5,
+        'export_customer_shipments_csv': 40,
+        'export_all_customer_shipments_csv': 40,
+        'export_shipments': 40,
+        'load_plan': 20,
+        'consignment_notes': 40,
+        'autocomplete': 1,
+        'sla_at_risk': 5,
+    },
+    'CONCURRENCY': {
+        'export_customer_shipments_csv': 2,
+        'export_all_customer_shipments_csv': 2,
+        'export_shipments': 2,
+        'consignment_notes': 2,
+    },
+}
+
+# Logging: JSON lines to stdout, written by a background thread (shipments.log).
+# DEBUG records are kept for LOG_DEBUG_SAMPLE_RATE of requests, at most
+# LOG_DEBUG_PER_SECOND per process.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '0.01'))
+LOG_DEBUG_PER_SECOND = 50
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_context': {'()': 'shipments.log.RequestContextFilter'},
+        'debug_sampling': {
+            '()': 'shipments.log.DebugSamplingFilter',
+            'rate': LOG_DEBUG_SAMPLE_RATE,
+            'per_second': LOG_DEBUG_PER_SECOND,
+        },
+    },
+    'handlers': {
+        'queue': {
+            '()': 'shipments.log.QueueingHandler',
+            'stream': 'ext://sys.stdout',
+            'filters': ['debug_sampling', 'request_context'],
+        },
+    },
+    'root': {'handlers': ['queue'], 'level': 'WARNING'},
+    'loggers': {
+        'django': {'handlers': ['queue'], 'level': 'INFO', 'propagate': False},
+        'shipments': {'handlers': ['queue'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
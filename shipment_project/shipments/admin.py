@@ -1,14 +1,168 @@
-from django.contrib import admin
+import json
+from datetime import date
+
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
-from .models import Shipment, CustomUser
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Max, Min, QuerySet
+from django.db.models.functions import Coalesce, Now
+from django.utils.functional import cached_property
+from .models import Shipment, CustomUser, Booking, TariffRate, TariffVersion
+from .response_cache import bump_booking_version
+
+BOOKING_STATUSES = [
+    ('pending', 'Pending'),
+    ('in-transit', 'In transit'),
+    ('delivered', 'Delivered'),
+    ('delayed', 'Delayed'),
+]
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that avoids COUNT(*) over large result sets.
+
+    Unfiltered querysets use pg_class.reltuples; filtered ones use the planner's
+    row estimate when that is above ``threshold`` and an exact count otherwise,
+    so small result sets still paginate exactly.
+    """
+
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet):
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                estimate = self._estimate(queryset, connection)
+                if estimate is not None and estimate >= self.threshold:
+                    return estimate
+        return super().count
+
+    def _estimate(self, queryset, connection):
+        with connection.cursor() as cursor:
+            if not queryset.query.where:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+                # -1 until the table has been vacuumed/analyzed once
+                return row[0] if row and row[0] >= 0 else None
+            sql, params = queryset.order_by().values('pk').query.sql_with_params()
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            return int(plan[0]['Plan']['Plan Rows'])
+
+
+class DateProbeQuerySet(QuerySet):
+    """dates() for the admin date_hierarchy without a DISTINCT over the whole table.
+
+    Year and month choices are found by probing each period between MIN and MAX
+    with an indexed EXISTS, which stays cheap however many rows there are.
+    """
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in ('year', 'month'):
+            return super().dates(field_name, kind, order)
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds['first'] is None:
+            return []
+        periods = []
+        year, month = bounds['first'].year, bounds['first'].month if kind == 'month' else 1
+        while date(year, month, 1) <= bounds['last']:
+            start = date(year, month, 1)
+            if kind == 'year':
+                year, end = year + 1, date(year + 1, 1, 1)
+            else:
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+                end = date(year, month, 1)
+            if self.filter(**{f'{field_name}__gte': start, f'{field_name}__lt': end}).exists():
+                periods.append(start)
+        return periods if order == 'ASC' else periods[::-1]
+
+
+class BookingStatusFilter(admin.SimpleListFilter):
+    # Fixed choices: the default filter would SELECT DISTINCT status over the table
+    title = 'status'
+    parameter_name = 'status'
+
+    def lookups(self, request, model_admin):
+        return BOOKING_STATUSES
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(status=self.value())
+        return queryset
+
 
 @admin.register(Shipment)
 class ShipmentAdmin(admin.ModelAdmin):
     list_display = ('id', 'customer_name', 'status', 'origin', 'destination', 'priority')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Booking)
+class BookingAdmin(admin.ModelAdmin):
+    list_display = ('lr_no', 'booking_date', 'from_location', 'to_location', 'status', 'user')
+    list_select_related = ('user',)
+    list_filter = (BookingStatusFilter,)
+    search_fields = ('=lr_no',)  # exact, case-insensitive: served by booking_lr_no_upper_idx
+    date_hierarchy = 'booking_date'
+    ordering = ('-id',)
+    autocomplete_fields = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    actions = ['mark_pending', 'mark_in_transit', 'mark_delivered', 'mark_delayed']
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return DateProbeQuerySet(model=queryset.model, query=queryset.query, using=queryset._db)
+
+    def _set_status(self, request, queryset, status):
+        # One UPDATE for the whole selection instead of a save() per booking
+        fields = {'status': status, 'version': F('version') + 1}
+        if status == 'delivered':
+            # Same stamp Booking.save() applies; the ETA stats learn from it
+            fields['delivered_at'] = Coalesce(F('delivered_at'), Now())
+        user_ids = set(queryset.order_by().values_list('user_id', flat=True).distinct())
+        updated = queryset.order_by().update(**fields)
+        bump_booking_version(user_ids)
+        self.message_user(request, f'{updated} booking(s) marked {status}.', messages.SUCCESS)
+
+    @admin.action(description='Mark selected bookings as pending')
+    def mark_pending(self, request, queryset):
+        self._set_status(request, queryset, 'pending')
+
+    @admin.action(description='Mark selected bookings as in transit')
+    def mark_in_transit(self, request, queryset):
+        self._set_status(request, queryset, 'in-transit')
+
+    @admin.action(description='Mark selected bookings as delivered')
+    def mark_delivered(self, request, queryset):
+        self._set_status(request, queryset, 'delivered')
+
+    @admin.action(description='Mark selected bookings as delayed')
+    def mark_delayed(self, request, queryset):
+        self._set_status(request, queryset, 'delayed')
+
+
+class TariffRateInline(admin.TabularInline):
+    model = TariffRate
+    extra = 1
+
+
+@admin.register(TariffVersion)
+class TariffVersionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'effective_from', 'sgst_bp', 'cgst_bp', 'created_at')
+    ordering = ('-effective_from',)
+    inlines = [TariffRateInline]
+
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff', 'user_type')
     fieldsets = UserAdmin.fieldsets + (
         ("Additional Info", {'fields': ('user_type',)}),
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,423 @@
+"""Cold storage for old delivered bookings.
+
+Bookings are written to ARCHIVE_DIR as gzip JSONL, one part file per booking
+month per run (``YYYY-MM/part-<run>.jsonl.gz``). Each part is a chain of
+gzip members of ARCHIVE_BLOCK_ROWS rows, so it still reads as an ordinary
+.gz file while a single block can be decompressed on its own. ``manifest.json``
+lists the parts with row counts and SHA-256 checksums. ``lr_keys.npy`` holds
+the sorted UPPER(lr_no)s and ``lr_locations.npy`` the matching (part, block
+offset, block length); track_shipment binary-searches the memory-mapped keys
+when an LR is no longer in the database.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import date, datetime, timezone as dt_timezone
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from .models import Booking, SlaAlert
+from .reports import mark_weeks_dirty
+from .response_cache import bump_booking_version
+
+MANIFEST = 'manifest.json'
+LR_KEYS = 'lr_keys.npy'
+LR_LOCATIONS = 'lr_locations.npy'
+KEY_DTYPE = np.dtype('S20')  # Booking.lr_no max_length
+LOCATION_DTYPE = np.dtype([('part', '<u4'), ('offset', '<u8'), ('length', '<u4')])
+_LR_FIELD = re.compile(rb'"lr_no":\s*("(?:[^"\\]|\\.)*"|null)')
+
+
+def archive_dir():
+    return Path(settings.ARCHIVE_DIR)
+
+
+def read_manifest(root=None):
+    path = (root or archive_dir()) / MANIFEST
+    if not path.exists():
+        return {'parts': [], 'next_part': 1}
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def write_atomic(path, write):
+    """Write ``path`` through ``write(handle)`` on a temporary file, synced and then renamed over it."""
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as handle:
+        write(handle)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp, path)
+
+
+def _write_manifest(root, manifest):
+    write_atomic(root / MANIFEST, lambda h: h.write(json.dumps(manifest, indent=2).encode()))
+
+
+def _read_index(root):
+    if not (root / LR_KEYS).exists():
+        return np.zeros(0, dtype=KEY_DTYPE), np.zeros(0, dtype=LOCATION_DTYPE)
+    return np.load(root / LR_KEYS), np.load(root / LR_LOCATIONS)
+
+
+def _write_index(root, keys, locations):
+    # Stable sort after concatenating old + new: for a repeated LR the newest part wins
+    order = np.argsort(keys, kind='stable')
+    keys, locations = keys[order], locations[order]
+    if len(keys):
+        last = np.ones(len(keys), dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1]
+        keys, locations = keys[last], locations[last]
+    # Keys go in separately so lookups can search a contiguous memory-mapped array
+    write_atomic(root / LR_LOCATIONS, lambda h: np.save(h, locations))
+    write_atomic(root / LR_KEYS, lambda h: np.save(h, keys))
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _PartWriter:
+    """Writes one part file block by block, collecting index entries as it goes."""
+
+    def __init__(self, root, month, part_id, run):
+        self.relative = f'{month}/part-{run}-{part_id}.jsonl.gz'
+        self.path = root / self.relative
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.handle = open(self.path, 'wb')
+        self.month, self.part_id = month, part_id
+        self.block, self.block_lrs = [], []
+        self.entries = []
+        self.rows = 0
+        self.first_id = self.last_id = None
+
+    def add(self, row):
+        self.block.append(json.dumps(row, cls=DjangoJSONEncoder, separators=(',', ':')))
+        self.block_lrs.append((row['lr_no'] or '').upper().encode()[:20])
+        self.rows += 1
+        self.first_id = row['id'] if self.first_id is None else min(self.first_id, row['id'])
+        self.last_id = row['id'] if self.last_id is None else max(self.last_id, row['id'])
+        if len(self.block) >= settings.ARCHIVE_BLOCK_ROWS:
+            self.flush()
+
+    def flush(self):
+        if not self.block:
+            return
+        data = gzip.compress(('\n'.join(self.block) + '\n').encode(), compresslevel=6)
+        offset = self.handle.tell()
+        self.handle.write(data)
+        self.entries.extend((lr, (self.part_id, offset, len(data))) for lr in self.block_lrs if lr)
+        self.block, self.block_lrs = [], []
+
+    def close(self):
+        self.flush()
+        self.handle.flush()
+        os.fsync(self.handle.fileno())
+        self.handle.close()
+        return {
+            'id': self.part_id,
+            'path': self.relative,
+            'month': self.month,
+            'rows': self.rows,
+            'first_id': self.first_id,
+            'last_id': self.last_id,
+            'bytes': self.path.stat().st_size,
+            'sha256': _sha256(self.path),
+            'created_at': datetime.now(dt_timezone.utc).isoformat(),
+        }
+
+
+def archive_bookings(before, batch_size=5000, dry_run=False):
+    """Move delivered bookings booked before ``before`` into the archive.
+
+    Files, manifest and index are made durable before any row is deleted; the
+    delete then runs in ``batch_size`` id batches and only removes rows still
+    delivered at the version written out. Rows changed in between stay in the
+    table and are dropped again from their parts and the index. Returns the
+    number archived.
+    """
+    queryset = Booking.objects.filter(status='delivered', booking_date__lt=before)
+    if dry_run:
+        return queryset.count()
+
+    root = archive_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(root)
+    run = datetime.now(dt_timezone.utc).strftime('%Y%m%dT%H%M%S')
+    writers = {}
+    versions = {}
+    months = {}
+    dates = set()
+    user_ids = set()
+    last_id = 0
+    while True:
+        # Keyset pagination on id keeps every batch an index range scan
+        rows = list(queryset.filter(id__gt=last_id).order_by('id').values()[:batch_size])
+        if not rows:
+            break
+        for row in rows:
+            month = row['booking_date'].strftime('%Y-%m')
+            if month not in writers:
+                writers[month] = _PartWriter(root, month, manifest['next_part'], run)
+                manifest['next_part'] += 1
+            writers[month].add(row)
+            versions[row['id']] = row['version']
+            months[row['id']] = month
+            dates.add(row['booking_date'])
+            user_ids.add(row['user_id'])
+        last_id = rows[-1]['id']
+    if not versions:
+        return 0
+
+    entries = []
+    for writer in writers.values():
+        manifest['parts'].append(writer.close())
+        entries.extend(writer.entries)
+    keys, locations = _read_index(root)
+    _write_index(
+        root,
+        np.concatenate([keys, np.array([e[0] for e in entries], dtype=KEY_DTYPE)]),
+        np.concatenate([locations, np.array([e[1] for e in entries], dtype=LOCATION_DTYPE)]),
+    )
+    _write_manifest(root, manifest)
+
+    ids = list(versions)
+    deleted = set()
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        values = ', '.join(['(%s, %s)'] * len(batch))
+        # Plain DELETE: the post_delete signal would mark the same weeks dirty one row at a time
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {Booking._meta.db_table} AS b USING (VALUES {values}) AS v(id, version) '
+                f"WHERE b.id = v.id AND b.version = v.version AND b.status = 'delivered' RETURNING b.id",
+                [value for pk in batch for value in (pk, versions[pk])],
+            )
+            gone = [row[0] for row in cursor.fetchall()]
+            cursor.execute(f'DELETE FROM {SlaAlert._meta.db_table} WHERE booking_id = ANY(%s)', [gone])
+        deleted.update(gone)
+    changed = set(ids) - deleted
+    if changed:
+        _drop_rows(root, manifest, {writers[months[pk]].part_id for pk in changed}, changed, run)
+    # The route summary is rebuilt from the table, so those weeks change
+    mark_weeks_dirty(dates)
+    bump_booking_version(user_ids)
+    return len(deleted)
+
+
+def _drop_rows(root, manifest, part_ids, ids, run):
+    """Rewrite the given parts without the rows in ``ids`` and update the manifest and index to match."""
+    parts = [p for p in manifest['parts'] if p['id'] in part_ids]
+    rewritten, entries = [], []
+    for part in parts:
+        writer = _PartWriter(root, part['month'], manifest['next_part'], run)
+        manifest['next_part'] += 1
+        with gzip.open(root / part['path'], 'rt') as handle:
+            for line in handle:
+                row = json.loads(line)
+                if row['id'] not in ids:
+                    writer.add(row)
+        if writer.rows:
+            rewritten.append(writer.close())
+            entries.extend(writer.entries)
+        else:
+            writer.close()
+            writer.path.unlink()
+    keys, locations = _read_index(root)
+    keep = ~np.isin(locations['part'], list(part_ids))
+    _write_index(
+        root,
+        np.concatenate([keys[keep], np.array([e[0] for e in entries], dtype=KEY_DTYPE)]),
+        np.concatenate([locations[keep], np.array([e[1] for e in entries], dtype=LOCATION_DTYPE)]),
+    )
+    manifest['parts'] = [p for p in manifest['parts'] if p['id'] not in part_ids] + rewritten
+    _write_manifest(root, manifest)
+    for part in parts:
+        (root / part['path']).unlink()
+
+
+def verify_archive(root=None):
+    """Part paths whose checksum no longer matches the manifest (or that are missing)."""
+    root = root or archive_dir()
+    return [
+        part['path'] for part in read_manifest(root)['parts']
+        if not (root / part['path']).exists() or _sha256(root / part['path']) != part['sha256']
+    ]
+
+
+def booking_from_row(row):
+    """An unsaved Booking built from an archived row, for read-only use."""
+    return Booking(**{f.attname: f.to_python(row[f.attname]) for f in Booking._meta.concrete_fields if f.attname in row})
+
+
+def _insert_rows(rows):
+    """INSERT archived rows as they are (ids and auto_now_add dates included); returns the ids inserted.
+
+    Postgres unpacks the JSON itself, which is far cheaper than building
+    model instances, and ON CONFLICT skips bookings whose id or LR number is
+    back in use.
+    """
+    table = Booking._meta.db_table
+    fields = Booking._meta.concrete_fields
+    columns = ', '.join(connection.ops.quote_name(f.column) for f in fields)
+    # Parts written before Booking.version existed have no version key
+    values = ', '.join('COALESCE(version, 1)' if f.name == 'version' else connection.ops.quote_name(f.column)
+                       for f in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) SELECT {values} '
+            f'FROM jsonb_populate_recordset(NULL::{table}, %s::jsonb) ON CONFLICT DO NOTHING RETURNING id',
+            [json.dumps(rows, cls=DjangoJSONEncoder)],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def restore_bookings(months=None, batch_size=5000):
+    """Load archived parts (all, or only the given 'YYYY-MM' months) back into the database.
+
+    Restored parts are dropped from the manifest and index, then deleted.
+    Bookings that cannot go back because their id or LR number is in use
+    again stay archived, moved to a new part of the same month. Returns
+    (bookings inserted, LR numbers left in the archive).
+    """
+    root = archive_dir()
+    manifest = read_manifest(root)
+    parts = [p for p in manifest['parts'] if months is None or p['month'] in months]
+    if not parts:
+        return 0, []
+    corrupt = set(verify_archive(root)) & {p['path'] for p in parts}
+    if corrupt:
+        raise ValueError(f"Checksum mismatch for {', '.join(sorted(corrupt))}")
+
+    user_ids = set(get_user_model().objects.values_list('id', flat=True))
+    # Columns added since the part was written take their model default
+    defaults = {f.column: f.get_default() for f in Booking._meta.concrete_fields}
+    run = datetime.now(dt_timezone.utc).strftime('%Y%m%dT%H%M%S')
+    restored = 0
+    skipped_lrs = []
+    kept_parts, entries = [], []
+    dates = set()
+    owners = set()
+    for part in parts:
+        skipped = []
+        originals, batch = [], []
+        with gzip.open(root / part['path'], 'rt') as handle:
+            for line in handle:
+                row = json.loads(line)
+                originals.append(row)
+                batch.append({**defaults, **row})
+                if row.get('user_id') not in user_ids:
+                    batch[-1]['user_id'] = None
+                dates.add(row['booking_date'])
+                owners.add(batch[-1]['user_id'])
+                if len(batch) >= batch_size:
+                    inserted = _insert_rows(batch)
+                    restored += len(inserted)
+                    skipped += [o for o, r in zip(originals, batch) if r['id'] not in inserted]
+                    originals, batch = [], []
+        if batch:
+            inserted = _insert_rows(batch)
+            restored += len(inserted)
+            skipped += [o for o, r in zip(originals, batch) if r['id'] not in inserted]
+        if skipped:
+            # Rewritten as they were archived (owner included) for a later restore
+            writer = _PartWriter(root, part['month'], manifest['next_part'], run)
+            manifest['next_part'] += 1
+            for row in skipped:
+                writer.add(row)
+            kept_parts.append(writer.close())
+            entries.extend(writer.entries)
+            skipped_lrs += [row['lr_no'] for row in skipped]
+    mark_weeks_dirty(date.fromisoformat(d) for d in dates if d)
+    bump_booking_version(owners)
+
+    restored_ids = {p['id'] for p in parts}
+    keys, locations = _read_index(root)
+    keep = ~np.isin(locations['part'], list(restored_ids))
+    _write_index(
+        root,
+        np.concatenate([keys[keep], np.array([e[0] for e in entries], dtype=KEY_DTYPE)]),
+        np.concatenate([locations[keep], np.array([e[1] for e in entries], dtype=LOCATION_DTYPE)]),
+    )
+    manifest['parts'] = [p for p in manifest['parts'] if p['id'] not in restored_ids] + kept_parts
+    _write_manifest(root, manifest)
+    for part in parts:
+        (root / part['path']).unlink()
+    archived_lookup.reset()
+    return restored, skipped_lrs
+
+
+class ArchivedLookup:
+    """Finds archived bookings by LR number via the memory-mapped sorted index.
+
+    The index is reopened whenever the manifest changes on disk.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.keys = self.locations = None
+        self.paths = {}
+        self.stamp = None
+
+    def _load(self):
+        root = archive_dir()
+        try:
+            stamp = (root / MANIFEST).stat().st_mtime_ns
+        except FileNotFoundError:
+            self.reset()
+            return False
+        if stamp != self.stamp:
+            with self._lock:
+                if (root / LR_KEYS).exists():
+                    self.keys = np.load(root / LR_KEYS, mmap_mode='r')
+                    self.locations = np.load(root / LR_LOCATIONS, mmap_mode='r')
+                else:
+                    self.keys = self.locations = None
+                self.paths = {p['id']: root / p['path'] for p in read_manifest(root)['parts']}
+                self.stamp = stamp
+        return self.keys is not None and len(self.keys) > 0 and len(self.keys) == len(self.locations)
+
+    def find(self, lr_no):
+        """The archived row (dict of field values) for ``lr_no``, matched case-insensitively, or None."""
+        key = str(lr_no or '').strip().upper().encode()
+        if not key or len(key) > 20 or not self._load():
+            return None
+        keys = self.keys
+        position = int(np.searchsorted(keys, np.array(key, dtype=KEY_DTYPE)))
+        if position == len(keys) or keys[position] != key:
+            return None
+        entry = self.locations[position]
+        path = self.paths.get(int(entry['part']))
+        if path is None:
+            return None
+        with open(path, 'rb') as handle:
+            handle.seek(int(entry['offset']))
+            block = gzip.decompress(handle.read(int(entry['length'])))
+        for line in block.splitlines():
+            # Compare the lr_no token first; only the matching line is fully parsed
+            match = _LR_FIELD.search(line)
+            if match and (json.loads(match.group(1)) or '').upper().encode() == key:
+                return json.loads(line)
+        return None
+
+    def find_booking(self, lr_no):
+        row = self.find(lr_no)
+        return booking_from_row(row) if row is not None else None
+
+
+archived_lookup = ArchivedLookup()
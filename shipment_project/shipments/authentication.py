@@ -0,0 +1,97 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# user id -> (expires_at, user); only used for tokens missing a claim or views needing the row
+_user_cache = {}
+
+
+def get_cached_user(user_id):
+    now = time.monotonic()
+    hit = _user_cache.get(user_id)
+    if hit and hit[0] > now:
+        return hit[1]
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if len(_user_cache) >= getattr(settings, 'JWT_USER_CACHE_SIZE', 1024):
+        _user_cache.clear()
+    _user_cache[user_id] = (now + getattr(settings, 'JWT_USER_CACHE_TTL', 60), user)
+    return user
+
+
+def clear_user_cache():
+    _user_cache.clear()
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token carrying the claims ClaimsUser needs; access tokens inherit them."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['username'] = user.username
+        token['user_type'] = getattr(user, 'user_type', None)
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        token['groups'] = sorted(user.groups.values_list('name', flat=True))
+        return token
+
+
+class ClaimsUser(TokenUser):
+    """Request user built from signed token claims.
+
+    ``id``, ``user_type``, ``is_staff`` and ``group_names`` come straight from the
+    token. Anything else (email, first_name, ...) or ``get_user()`` loads the
+    CustomUser row through a short per-process TTL cache. Tokens issued before
+    these claims existed fall back to that cache as well.
+    """
+
+    def get_user(self):
+        user = get_cached_user(self.id)
+        if user is None:
+            raise InvalidToken('User not found')
+        return user
+
+    @cached_property
+    def user_type(self):
+        if 'user_type' in self.token:
+            return self.token['user_type']
+        return self.get_user().user_type
+
+    @cached_property
+    def is_staff(self):
+        if 'is_staff' in self.token:
+            return self.token['is_staff']
+        return self.get_user().is_staff
+
+    @cached_property
+    def group_names(self):
+        if 'groups' in self.token:
+            return frozenset(self.token['groups'])
+        return frozenset(self.get_user().groups.values_list('name', flat=True))
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name == 'token':
+            raise AttributeError(name)
+        return getattr(self.get_user(), name)
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    """Like simplejwt's JWTAuthentication but without the per-request user SELECT.
+
+    is_active and the claims are not re-read per request: a deactivated or
+    changed user keeps the old access until the token expires
+    (ACCESS_TOKEN_LIFETIME). Refreshing reloads the user, so from then on a
+    deactivated user is refused and a changed one gets the new claims.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken('Token contained no recognizable user identification')
+        return ClaimsUser(validated_token)
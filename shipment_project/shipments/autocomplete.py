@@ -0,0 +1,215 @@
+"""Autocomplete for locations and parties typed into booking forms.
+
+Each process keeps a prefix index per field: every distinct value (case and
+spacing folded) is entered once per word, in a sorted list searched with
+bisect, and ranked by how many bookings use it. Prefixes that match more than
+AUTOCOMPLETE_RANGE_CUTOFF entries have their top results precomputed, so a
+lookup never ranks more than that many candidates.
+
+Counts are loaded with one GROUP BY per column, then topped up from bookings
+with a higher id every AUTOCOMPLETE_SYNC_INTERVAL seconds on a background
+thread; requests keep using the previous index meanwhile. A full reload every
+AUTOCOMPLETE_REBUILD_INTERVAL picks up edits, deletions and rows that were
+committed out of id order.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Max
+
+from .models import Booking, Pincode
+
+# Public name -> Booking columns feeding it
+FIELDS = {
+    'location': ('from_location', 'to_location'),
+    'consignor': ('consignor',),
+    'consignee': ('consignee',),
+}
+# Past the last character any prefix can continue with
+_HIGH = '\U0010ffff'
+
+
+def normalise(text):
+    return ' '.join(str(text).split()).casefold()
+
+
+class PrefixIndex:
+    """Immutable prefix index over one field's {normalised value: Counter of spellings}."""
+
+    def __init__(self, spellings, top_k, cutoff, previous=None):
+        """``previous`` may be the index built before ``spellings`` was topped up.
+
+        Only pass it when values can have been added but not removed (not
+        after a full reload): the same size then means the same values.
+        """
+        self.top_k = top_k
+        self.cutoff = cutoff
+        reuse = previous is not None and len(previous.normalised) == len(spellings)
+        self.normalised = previous.normalised if reuse else sorted(spellings)
+        counters = [spellings[key] for key in self.normalised]
+        # Shown as the most used spelling; ties go to the alphabetically first
+        self.values = [min(c.items(), key=lambda item: (-item[1], item[0]))[0] for c in counters]
+        self.counts = np.fromiter((sum(c.values()) for c in counters), dtype=np.int64, count=len(counters))
+
+        if reuse:
+            # Only counts changed (the usual top-up): the word-start keys are still valid
+            self.keys, self.ids = previous.keys, previous.ids
+        else:
+            # One entry per word start, so 'sharma' finds 'Rahul Sharma'
+            entries = []
+            for value_id, key in enumerate(self.normalised):
+                words = key.split(' ')
+                for start in range(len(words)):
+                    entries.append((' '.join(words[start:]), value_id))
+            entries.sort()
+            self.keys = [key for key, _ in entries]
+            self.ids = np.fromiter((value_id for _, value_id in entries), dtype=np.int64, count=len(entries))
+        # Value ids best first: more bookings, then alphabetical (ids follow the sorted keys)
+        self.order = np.lexsort((np.arange(len(self.values)), -self.counts))
+        self.rank = np.empty(len(self.values), dtype=np.int64)
+        self.rank[self.order] = np.arange(len(self.values))
+        self.top = self._precompute()
+
+    def _best(self, lo, hi, limit):
+        candidates = np.unique(self.ids[lo:hi])
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(self.rank[candidates], limit - 1)[:limit]]
+        return candidates[np.argsort(self.rank[candidates])]
+
+    def _best_of_many(self, lo, hi, limit):
+        # For ranges of thousands of entries a pass over all values beats np.unique
+        matched = np.zeros(len(self.values), dtype=bool)
+        matched[self.ids[lo:hi]] = True
+        return self.order[matched[self.order]][:limit]
+
+    def _precompute(self):
+        """{prefix: best value ids} for every prefix matching more than ``cutoff`` entries."""
+        top = {}
+        # Only ranges that are still too big are split by one more character
+        pending = [('', 0, len(self.keys))]
+        while pending:
+            prefix, lo, hi = pending.pop()
+            if hi - lo <= self.cutoff:
+                continue
+            if prefix:
+                top[prefix] = self._best_of_many(lo, hi, self.top_k)
+            start = lo
+            while start < hi and len(self.keys[start]) == len(prefix):
+                start += 1  # the prefix itself sorts first; it has no longer continuation
+            while start < hi:
+                child = self.keys[start][:len(prefix) + 1]
+                end = bisect_left(self.keys, child + _HIGH, start, hi)
+                pending.append((child, start, end))
+                start = end
+        return top
+
+    def search(self, prefix, limit):
+        prefix = normalise(prefix)
+        if not prefix:
+            return []
+        limit = min(limit, self.top_k)
+        best = self.top.get(prefix)
+        if best is None:
+            lo = bisect_left(self.keys, prefix)
+            hi = bisect_left(self.keys, prefix + _HIGH, lo)
+            best = self._best(lo, hi, limit)
+        return [{'value': self.values[i], 'count': int(self.counts[i])} for i in best[:limit]]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class AutocompleteIndex:
+    """Per-process PrefixIndex for each of FIELDS, refreshed in the background."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.spellings = {field: defaultdict(Counter) for field in FIELDS}
+        self.indexes = {}
+        self.last_id = 0
+        self.synced_at = None
+        self.built_at = None
+        self._worker = None
+
+    def _add(self, field, value, n):
+        if value and str(value).strip():
+            self.spellings[field][normalise(value)][' '.join(str(value).split())] += n
+
+    def _load_all(self):
+        self.spellings = {field: defaultdict(Counter) for field in FIELDS}
+        self.last_id = Booking.objects.aggregate(last=Max('id'))['last'] or 0
+        for field, columns in FIELDS.items():
+            for column in columns:
+                rows = (Booking.objects.filter(id__lte=self.last_id).order_by().values_list(column)
+                        .annotate(n=Count('id')))
+                for value, n in rows:
+                    self._add(field, value, n)
+        # Districts nobody has booked to yet still complete, below every booked location
+        for district in Pincode.objects.exclude(district='').values_list('district', flat=True).distinct():
+            self._add('location', district.title(), 0)
+        return set(FIELDS)
+
+    def _load_new(self):
+        columns = sorted({column for columns in FIELDS.values() for column in columns})
+        changed = set()
+        rows = Booking.objects.filter(id__gt=self.last_id).order_by('id').values_list('id', *columns)
+        for row in rows.iterator(chunk_size=5000):
+            self.last_id = row[0]
+            values = dict(zip(columns, row[1:]))
+            for field, field_columns in FIELDS.items():
+                for column in field_columns:
+                    if values[column]:
+                        self._add(field, values[column], 1)
+                        changed.add(field)
+        return changed
+
+    def refresh(self, full=False):
+        """Load new bookings (or everything) and swap in rebuilt indexes for fields that changed."""
+        with self._lock:
+            now = time.monotonic()
+            if full or self.built_at is None or now - self.built_at > settings.AUTOCOMPLETE_REBUILD_INTERVAL:
+                changed = self._load_all()
+                self.built_at = now
+                reusable = {}  # values may have gone as well as come
+            else:
+                changed = self._load_new()
+                reusable = self.indexes
+            indexes = dict(self.indexes)
+            for field in changed:
+                indexes[field] = PrefixIndex(self.spellings[field], settings.AUTOCOMPLETE_MAX_RESULTS,
+                                             settings.AUTOCOMPLETE_RANGE_CUTOFF, previous=reusable.get(field))
+            self.indexes = indexes  # readers see the old or the new dict, never a partial one
+            self.synced_at = now
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        finally:
+            connection.close()  # this thread's own connection
+
+    def sync(self):
+        """Build on first use; afterwards refresh on a background thread when stale."""
+        if self.synced_at is None:
+            self.refresh()
+            return
+        if time.monotonic() - self.synced_at < settings.AUTOCOMPLETE_SYNC_INTERVAL:
+            return
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._refresh_in_background, name='autocomplete-refresh',
+                                            daemon=True)
+            self._worker.start()
+
+    def search(self, field, prefix, limit=10):
+        self.sync()
+        return self.indexes[field].search(prefix, limit)
+
+
+autocomplete_index = AutocompleteIndex()
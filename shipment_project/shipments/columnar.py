@@ -0,0 +1,276 @@
+"""Columnar extract of bookings for analysis.
+
+extract_columnar() writes bookings under COLUMNAR_DIR as one NumPy ``.npy``
+file per column, so a lane or revenue query reads just the columns it needs,
+memory-mapped without parsing or copying::
+
+    COLUMNAR_DIR/
+        CURRENT                      name of the live version, e.g. v0002
+        v0002/manifest.json          columns, dtypes, parts and the last booking id
+        v0002/dictionaries/<name>.json
+        v0002/part-00001/<column>.npy
+
+Strings with few distinct values (locations, statuses, service types) are
+stored as int32 codes into a dictionary shared by every part; -1 is NULL.
+Dates are datetime64[D], timestamps datetime64[s] in UTC (NaT is NULL),
+money is int64 paise (NULL reads as 0) and weights are float64 (NaN is NULL).
+
+Each run appends a part with the bookings whose id is above the manifest's
+last_id, and dictionaries only ever grow, so earlier codes stay valid. Rows
+already extracted are not revisited: status changes, edits and rows
+committed late with a lower id reach the extract with ``full=True``, which writes a new version directory and switches
+CURRENT to it once it is complete.
+"""
+import json
+import os
+import shutil
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .archive import write_atomic
+from .models import Booking
+
+FORMAT = 1
+CURRENT = 'CURRENT'
+MANIFEST = 'manifest.json'
+# Advisory lock key; a second extract waits, then appends after the first one's last_id
+COLUMNAR_LOCK_ID = 260049
+
+_NAT = np.iinfo(np.int64).min  # the int64 that reads back as NaT
+
+Column = namedtuple('Column', 'name sql dtype dictionary')
+COLUMNS = [
+    Column('id', 'b.id', '<i8', None),
+    Column('lr_no', "COALESCE(b.lr_no, '')", 'S20', None),
+    Column('booking_date', f"COALESCE(b.booking_date - DATE '1970-01-01', {_NAT})", '<M8[D]', None),
+    Column('pickup_date', f"COALESCE(b.pickup_date - DATE '1970-01-01', {_NAT})", '<M8[D]', None),
+    Column('delivered_at', f'COALESCE(EXTRACT(EPOCH FROM b.delivered_at)::bigint, {_NAT})', '<M8[s]', None),
+    Column('delivery_deadline', f'COALESCE(EXTRACT(EPOCH FROM b.delivery_deadline)::bigint, {_NAT})', '<M8[s]', None),
+    Column('from_location', 'b.from_location', '<i4', 'location'),
+    Column('to_location', 'b.to_location', '<i4', 'location'),
+    Column('service_type', 'b.service_type', '<i4', 'service_type'),
+    Column('package_type', 'b.package_type', '<i4', 'package_type'),
+    Column('payment_method', 'b.payment_method', '<i4', 'payment_method'),
+    Column('status', 'b.status', '<i4', 'status'),
+    Column('weight', 'b.weight', '<f8', None),
+    Column('actual_weight', 'b.actual_weight::float8', '<f8', None),
+    Column('chargeable_weight', 'b.chargeable_weight::float8', '<f8', None),
+    Column('freight_paise', 'COALESCE(ROUND(b.freight * 100), 0)::bigint', '<i8', None),
+    Column('sgst_paise', 'COALESCE(ROUND(b.sgst * 100), 0)::bigint', '<i8', None),
+    Column('cgst_paise', 'COALESCE(ROUND(b.cgst * 100), 0)::bigint', '<i8', None),
+    Column('scans', "jsonb_array_length(CASE WHEN jsonb_typeof(b.updates) = 'array' THEN b.updates ELSE '[]' END)",
+           '<i4', None),
+    Column('user_id', 'COALESCE(b.user_id, -1)', '<i8', None),
+    Column('version', 'b.version', '<i4', None),
+]
+
+
+def columnar_dir():
+    return Path(settings.COLUMNAR_DIR)
+
+
+def _write_json(path, data):
+    write_atomic(path, lambda h: h.write(json.dumps(data, indent=2).encode()))
+
+
+def current_version(root=None):
+    """Directory of the live version, or None before the first extract."""
+    root = root or columnar_dir()
+    try:
+        name = (root / CURRENT).read_text().strip()
+    except FileNotFoundError:
+        return None
+    return root / name
+
+
+class _Dictionaries:
+    """Append-only value -> code maps, one per dictionary name."""
+
+    def __init__(self, version_dir):
+        self.dir = version_dir / 'dictionaries'
+        self.values = {}
+        self.codes = {}
+        for name in {c.dictionary for c in COLUMNS if c.dictionary}:
+            path = self.dir / f'{name}.json'
+            values = json.loads(path.read_text()) if path.exists() else []
+            self.values[name] = values
+            self.codes[name] = {value: code for code, value in enumerate(values)}
+
+    def encode(self, name, raw):
+        codes = self.codes[name]
+        values = self.values[name]
+        out = np.empty(len(raw), dtype='<i4')
+        for i, value in enumerate(raw):
+            if value is None:
+                out[i] = -1
+                continue
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(values)
+                values.append(value)
+            out[i] = code
+        return out
+
+    def save(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        for name, values in self.values.items():
+            _write_json(self.dir / f'{name}.json', values)
+
+
+def _to_array(column, raw, dictionaries):
+    if column.dictionary:
+        return dictionaries.encode(column.dictionary, raw)
+    if column.dtype.startswith('<M8'):
+        return np.array(raw, dtype=np.int64).view(column.dtype)
+    if column.dtype.startswith('S'):
+        return np.array([value.encode()[:20] for value in raw], dtype=column.dtype)
+    return np.array(raw, dtype=column.dtype)  # None becomes NaN in the float columns
+
+
+def _write_part(version_dir, part_name, chunks):
+    """Write the concatenated chunks as one part directory; returns (rows, first id, last id)."""
+    tmp = version_dir / f'{part_name}.tmp'
+    if tmp.exists():
+        shutil.rmtree(tmp)  # left by an interrupted run
+    tmp.mkdir(parents=True)
+    for index, column in enumerate(COLUMNS):
+        array = np.concatenate([chunk[index] for chunk in chunks])
+        write_atomic(tmp / f'{column.name}.npy', lambda h: np.save(h, array))
+    ids = np.concatenate([chunk[0] for chunk in chunks])
+    final = version_dir / part_name
+    if final.exists():
+        # Renamed into place by a run that died before its manifest write, so never listed
+        shutil.rmtree(final)
+    os.replace(tmp, final)
+    return len(ids), int(ids[0]), int(ids[-1])
+
+
+def _new_manifest():
+    return {
+        'format': FORMAT,
+        'created': timezone.now().isoformat(),
+        'rows': 0,
+        'last_id': 0,
+        'columns': [{'name': c.name, 'dtype': c.dtype, 'dictionary': c.dictionary} for c in COLUMNS],
+        'parts': [],
+    }
+
+
+def extract_columnar(full=False, root=None, part_rows=None, fetch_size=20000):
+    """Append bookings added since the last extract (or rewrite everything into a new version).
+
+    Returns (version directory, rows written).
+    """
+    root = root or columnar_dir()
+    part_rows = part_rows or settings.COLUMNAR_PART_ROWS
+    root.mkdir(parents=True, exist_ok=True)
+    with transaction.atomic(), connection.cursor() as cursor, connection.chunked_cursor() as rows_cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [COLUMNAR_LOCK_ID])
+
+        live = current_version(root)
+        if live is not None and not full:
+            version_dir = live
+            manifest = json.loads((version_dir / MANIFEST).read_text())
+        else:
+            number = int(live.name[1:]) + 1 if live is not None else 1
+            version_dir = root / f'v{number:04d}'
+            if version_dir.exists():
+                shutil.rmtree(version_dir)  # left by an interrupted full extract
+            version_dir.mkdir()
+            manifest = _new_manifest()
+        dictionaries = _Dictionaries(version_dir)
+
+        select = ', '.join(c.sql for c in COLUMNS)
+        # Server-side cursor: rows arrive fetch_size at a time rather than all at once
+        rows_cursor.execute(
+            f'SELECT {select} FROM {Booking._meta.db_table} b WHERE b.id > %s ORDER BY b.id',
+            [manifest['last_id']],
+        )
+        written = 0
+        chunks, pending = [], 0
+
+        def flush():
+            nonlocal chunks, pending, written
+            part_name = f"part-{len(manifest['parts']) + 1:05d}"
+            rows, first_id, last_id = _write_part(version_dir, part_name, chunks)
+            # Dictionaries first: the manifest only ever refers to codes already saved
+            dictionaries.save()
+            manifest['parts'].append({'name': part_name, 'rows': rows, 'first_id': first_id, 'last_id': last_id,
+                                      'created': timezone.now().isoformat()})
+            manifest['rows'] += rows
+            manifest['last_id'] = last_id
+            _write_json(version_dir / MANIFEST, manifest)
+            written += rows
+            chunks, pending = [], 0
+
+        while True:
+            rows = rows_cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            chunks.append([_to_array(column, raw, dictionaries) for column, raw in zip(COLUMNS, columns)])
+            pending += len(rows)
+            if pending >= part_rows:
+                flush()
+        if chunks:
+            flush()
+        if not (version_dir / MANIFEST).exists():
+            dictionaries.save()
+            _write_json(version_dir / MANIFEST, manifest)
+
+        if version_dir != live:
+            write_atomic(root / CURRENT, lambda h: h.write(version_dir.name.encode()))
+            # Open readers keep their memory maps; the files go once they close them
+            versions = sorted(p for p in root.glob('v[0-9]*') if p.is_dir())
+            for old in versions[:-settings.COLUMNAR_KEEP_VERSIONS]:
+                shutil.rmtree(old, ignore_errors=True)
+    return version_dir, written
+
+
+class ColumnarExtract:
+    """Read side of the live extract: per-part memory maps and dictionary decoding."""
+
+    def __init__(self, root=None):
+        self.dir = current_version(root)
+        if self.dir is None:
+            raise FileNotFoundError(f'No columnar extract in {root or columnar_dir()}; run extract_columnar.')
+        self.manifest = json.loads((self.dir / MANIFEST).read_text())
+        self.columns = {c['name']: c for c in self.manifest['columns']}
+        self._dictionaries = {}
+
+    def __len__(self):
+        return self.manifest['rows']
+
+    def parts(self, name):
+        """The column as one read-only memory map per part (no copies)."""
+        if name not in self.columns:
+            raise KeyError(name)
+        return [np.load(self.dir / part['name'] / f'{name}.npy', mmap_mode='r') for part in self.manifest['parts']]
+
+    def column(self, name):
+        """The whole column: a memory map when there is one part, otherwise a concatenated copy."""
+        parts = self.parts(name)
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return np.zeros(0, dtype=self.columns[name]['dtype'])
+        return np.concatenate(parts)
+
+    def dictionary(self, name):
+        """Values of a dictionary-encoded column, indexed by code."""
+        dictionary = self.columns[name]['dictionary']
+        if dictionary is None:
+            raise ValueError(f'{name} is not dictionary-encoded')
+        if dictionary not in self._dictionaries:
+            path = self.dir / 'dictionaries' / f'{dictionary}.json'
+            self._dictionaries[dictionary] = json.loads(path.read_text())
+        return self._dictionaries[dictionary]
+
+    def decode(self, name, codes):
+        values = self.dictionary(name)
+        return [values[code] if code >= 0 else None for code in np.asarray(codes).tolist()]
@@ -0,0 +1,125 @@
+"""Batch rendering of printable consignment notes (LR copies).
+
+Bookings are read in chunks of plain values, each chunk is rendered with the
+note template (compiled once per process), and the pages are streamed inside
+a single HTML document that prints one copy per A4 page. Large batches are
+rendered in a process pool; the pool starts workers with forkserver so they
+do not inherit the web worker's threads or database connection.
+"""
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+DOCUMENT_TEMPLATE = 'shipment/consignment_notes.html'
+PAGES_TEMPLATE = 'shipment/consignment_note_pages.html'
+
+NOTE_FIELDS = (
+    'lr_no', 'booking_date', 'from_location', 'to_location', 'branch_from_phone', 'branch_to_phone',
+    'consignor', 'consignee', 'pickup_address', 'delivery_address', 'noofpkgs', 'package_type',
+    'saidtocontain', 'actual_weight', 'chargeable_weight', 'dimensions', 'service_type', 'payment_method',
+    'policy_no', 'remarks', 'freight', 'sgst', 'cgst',
+)
+
+_SPLIT = '\x00NOTES\x00'
+_pages_template = None
+
+
+def _init_worker():
+    # forkserver children start from a bare interpreter
+    if not apps.ready:
+        django.setup()
+    _compiled()
+
+
+def _compiled():
+    global _pages_template
+    if _pages_template is None:
+        _pages_template = get_template(PAGES_TEMPLATE)
+    return _pages_template
+
+
+def render_pages(rows, copies):
+    """HTML for one chunk of note rows (dicts of NOTE_FIELDS), one section per copy."""
+    for row in rows:
+        row['total'] = sum((row[f] or Decimal(0) for f in ('freight', 'sgst', 'cgst')), Decimal(0))
+        for party, address in (('consignor', 'pickup_address'), ('consignee', 'delivery_address')):
+            if not isinstance(row[address], dict):
+                row[address] = {}
+            row[party] = row[party] or row[address].get('name') or ''
+    return _compiled().render({
+        'notes': rows, 'copies': copies, 'company': settings.CONSIGNMENT_NOTE_COMPANY,
+    })
+
+
+def document_shell(title):
+    """(head, tail) of the printable document, split around the note pages."""
+    document = get_template(DOCUMENT_TEMPLATE).render({'title': title, 'notes': mark_safe(_SPLIT)})
+    head, tail = document.split(_SPLIT)
+    return head, tail
+
+
+def note_queryset(start=None, end=None, lr_nos=None):
+    """Bookings for a booking_date range (inclusive) and/or a list of LR numbers, in booking order."""
+    # Imported here: pool workers import this module before django.setup()
+    from .models import Booking
+
+    queryset = Booking.objects.all()
+    if start:
+        queryset = queryset.filter(booking_date__gte=start)
+    if end:
+        queryset = queryset.filter(booking_date__lte=end)
+    if lr_nos is not None:
+        queryset = queryset.filter(lr_no__in=lr_nos)
+    return queryset.order_by('id')
+
+
+def _chunks(queryset, chunk_size):
+    chunk = []
+    for row in queryset.values(*NOTE_FIELDS).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_consignment_notes(queryset, copies, title='Consignment notes', workers=None, total=None):
+    """Yield the combined document for ``queryset`` piece by piece.
+
+    ``workers`` > 1 renders chunks in a process pool (at most two chunks per
+    worker in flight, so memory stays flat); by default the pool is used only
+    when ``total`` notes reach CONSIGNMENT_NOTE_POOL_MIN, since starting it
+    costs more than rendering a few hundred notes inline.
+    """
+    if workers is None:
+        big = total is None or total >= settings.CONSIGNMENT_NOTE_POOL_MIN
+        workers = settings.CONSIGNMENT_NOTE_WORKERS if big else 1
+    chunk_size = settings.CONSIGNMENT_NOTE_CHUNK_SIZE
+    head, tail = document_shell(title)
+    yield head
+    if workers <= 1:
+        for chunk in _chunks(queryset, chunk_size):
+            yield render_pages(chunk, copies)
+    else:
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('forkserver'),
+                                   initializer=_init_worker)
+        try:
+            pending = deque()
+            for chunk in _chunks(queryset, chunk_size):
+                pending.append(pool.submit(render_pages, chunk, copies))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # Also reached when the client goes away mid-stream
+            pool.shutdown(wait=True, cancel_futures=True)
+    yield tail
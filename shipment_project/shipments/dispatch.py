@@ -0,0 +1,274 @@
+"""Pickup run planning.
+
+A day's pickups are grouped by zip, swept around the depot(s) into one cluster
+per vehicle (respecting capacity and a fair share of stops), and each cluster
+is routed window by window: nearest neighbour to get a tour, then 2-opt over a
+NumPy distance matrix built from pincode centroids.
+"""
+import math
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import numpy as np
+from django.db.models import Avg
+from django.db.models.fields.json import KT
+from django.db.models.functions import Substr
+
+from .models import Booking, Pincode
+
+EARTH_RADIUS_KM = 6371.0
+_WINDOW_START = re.compile(r'^\s*(\d{1,2})(?::(\d{2}))?')
+
+
+@dataclass
+class Vehicle:
+    id: str
+    capacity_kg: float = math.inf
+    max_stops: int = None
+    start: tuple = None  # (lat, lng) of the depot; routes start and end here
+
+
+@dataclass
+class Pickup:
+    booking_id: int
+    lr_no: str
+    zip: str
+    window: str
+    weight: float
+    lat: float
+    lng: float
+
+
+@dataclass
+class Route:
+    vehicle: Vehicle
+    stops: list = field(default_factory=list)
+    distance_km: float = 0.0
+
+    @property
+    def load_kg(self):
+        return sum(p.weight for p in self.stops)
+
+
+def window_start(window):
+    """Minutes after midnight a '09:00-12:00' style window opens; unknown windows sort last."""
+    match = _WINDOW_START.match(window or '')
+    if not match:
+        return 24 * 60
+    return int(match.group(1)) * 60 + int(match.group(2) or 0)
+
+
+def distance_matrix(lat, lng):
+    """Great-circle distances in km between every pair of points."""
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lng = np.radians(np.asarray(lng, dtype=float))
+    dlat = lat[:, None] - lat[None, :]
+    dlng = lng[:, None] - lng[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def nearest_neighbour(dist, start, nodes):
+    """Greedy tour over ``nodes`` (matrix indices) beginning at ``start``."""
+    remaining = np.asarray(nodes)
+    order = []
+    current = start
+    while len(remaining):
+        nearest = int(np.argmin(dist[current, remaining]))
+        current = int(remaining[nearest])
+        order.append(current)
+        remaining = np.delete(remaining, nearest)
+    return order
+
+
+def two_opt(dist, path, max_passes=100):
+    """Shorten ``path`` by segment reversals; its first and last nodes stay put.
+
+    Each pass scores every (edge, edge) exchange at once and applies the best.
+    """
+    path = np.asarray(path)
+    if len(path) < 4:
+        return path
+    for _ in range(max_passes):
+        head, tail = path[:-1], path[1:]
+        edges = dist[head, tail]
+        # Replacing edges k1 and k2 (k1 < k2) by (head[k1], head[k2]) and (tail[k1], tail[k2])
+        delta = dist[head[:, None], head[None, :]] + dist[tail[:, None], tail[None, :]] - edges[:, None] - edges[None, :]
+        delta = np.triu(delta, 1)
+        k1, k2 = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[k1, k2] >= -1e-9:
+            break
+        path[k1 + 1:k2 + 1] = path[k1 + 1:k2 + 1][::-1]
+    return path
+
+
+def _route(vehicle, stops):
+    """Order one vehicle's stops: windows in time order, NN + 2-opt inside each window."""
+    # Matrix rows: 0 = depot, 1..n = stops, n + 1 = free end (zero distance to everything)
+    lat = [vehicle.start[0]] + [p.lat for p in stops]
+    lng = [vehicle.start[1]] + [p.lng for p in stops]
+    n = len(stops)
+    dist = np.zeros((n + 2, n + 2))
+    dist[:n + 1, :n + 1] = distance_matrix(lat, lng)
+    free_end = n + 1
+
+    windows = defaultdict(list)
+    for index, pickup in enumerate(stops, start=1):
+        windows[window_start(pickup.window)].append(index)
+
+    ordered, current = [], 0
+    starts = sorted(windows)
+    for position, start in enumerate(starts):
+        end = 0 if position == len(starts) - 1 else free_end
+        path = [current] + nearest_neighbour(dist, current, windows[start]) + [end]
+        path = two_opt(dist, path)
+        ordered.extend(int(i) for i in path[1:-1])
+        current = ordered[-1]
+
+    legs = [0] + ordered + [0]
+    distance = float(dist[legs[:-1], legs[1:]].sum())
+    return [stops[i - 1] for i in ordered], distance
+
+
+def _zip_groups(pickups, stop_share):
+    by_zip = defaultdict(list)
+    for pickup in pickups:
+        by_zip[pickup.zip].append(pickup)
+    groups = []
+    for members in by_zip.values():
+        if len(members) <= stop_share:
+            groups.append(members)
+            continue
+        # A zip busier than one vehicle's share is split by window, then evenly
+        by_window = defaultdict(list)
+        for pickup in members:
+            by_window[pickup.window].append(pickup)
+        for window_members in by_window.values():
+            for i in range(0, len(window_members), stop_share):
+                groups.append(window_members[i:i + stop_share])
+    return groups
+
+
+def _sweep_order(groups, center):
+    lat = np.array([np.mean([p.lat for p in g]) for g in groups])
+    lng = np.array([np.mean([p.lng for p in g]) for g in groups])
+    angles = np.arctan2(lat - center[0], (lng - center[1]) * math.cos(math.radians(center[0])))
+    order = np.argsort(angles)
+    # Start the sweep at the widest empty sector so no natural cluster is cut in two
+    sorted_angles = angles[order]
+    gaps = np.diff(np.concatenate([sorted_angles, sorted_angles[:1] + 2 * math.pi]))
+    first = (int(np.argmax(gaps)) + 1) % len(order)
+    return [groups[i] for i in np.roll(order, -first)]
+
+
+def plan_routes(pickups, vehicles):
+    """Assign ``pickups`` to ``vehicles`` and order each route.
+
+    Returns (routes, unassigned) where unassigned is a list of (pickup, reason).
+    Vehicles without a start use the centroid of the day's pickups as depot.
+    """
+    if not pickups or not vehicles:
+        return [], [(p, 'no vehicles') for p in pickups]
+    center = (float(np.mean([p.lat for p in pickups])), float(np.mean([p.lng for p in pickups])))
+    for vehicle in vehicles:
+        if vehicle.start is None:
+            vehicle.start = center
+
+    stop_share = max(1, math.ceil(len(pickups) / len(vehicles)))
+    groups = _sweep_order(_zip_groups(pickups, stop_share), center)
+    vehicle_angles = [math.atan2(v.start[0] - center[0], v.start[1] - center[1]) for v in vehicles]
+    fleet = [vehicles[i] for i in np.argsort(vehicle_angles, kind='stable')]
+
+    routes = [Route(vehicle) for vehicle in fleet]
+    unassigned = []
+    largest_capacity = max(v.capacity_kg for v in fleet)
+    slot, load, placed_before = 0, 0.0, 0
+    # Walk the sweep pickup by pickup (a zip's pickups are adjacent, ordered by window)
+    # and move to the next vehicle once this one has its share or is full, so zips
+    # are only split at vehicle boundaries.
+    for pickup in (p for group in groups for p in sorted(group, key=lambda p: window_start(p.window))):
+        if pickup.weight > largest_capacity:
+            unassigned.append((pickup, 'heavier than any vehicle'))
+            continue
+        while slot < len(routes):
+            route = routes[slot]
+            share = math.ceil((len(pickups) - placed_before) / (len(routes) - slot))
+            limit = min(share, route.vehicle.max_stops or share)
+            if len(route.stops) < limit and load + pickup.weight <= route.vehicle.capacity_kg:
+                break
+            placed_before += len(route.stops)
+            slot, load = slot + 1, 0.0
+        if slot == len(routes):
+            unassigned.append((pickup, 'fleet capacity exceeded'))
+            continue
+        routes[slot].stops.append(pickup)
+        load += pickup.weight
+
+    planned = []
+    for route in routes:
+        if route.stops:
+            route.stops, route.distance_km = _route(route.vehicle, route.stops)
+        planned.append(route)
+    return planned, unassigned
+
+
+def pincode_coordinates(zips):
+    """zip -> (lat, lng); unknown pincodes fall back to their 3-digit sorting district's centroid."""
+    zips = {z for z in zips if z}
+    coords = {code: (lat, lng) for code, lat, lng in
+              Pincode.objects.filter(pincode__in=zips).values_list('pincode', 'latitude', 'longitude')}
+    prefixes = {z[:3] for z in zips - coords.keys()}
+    if prefixes:
+        centroids = {
+            row['prefix']: (row['lat'], row['lng'])
+            for row in Pincode.objects.annotate(prefix=Substr('pincode', 1, 3)).filter(prefix__in=prefixes)
+            .values('prefix').annotate(lat=Avg('latitude'), lng=Avg('longitude'))
+        }
+        for z in zips - coords.keys():
+            if z[:3] in centroids:
+                coords[z] = centroids[z[:3]]
+    return coords
+
+
+def load_pickups(day):
+    """The day's outstanding pickups plus (booking id, lr, reason) for ones that cannot be placed."""
+    rows = list(
+        Booking.objects.filter(pickup_date=day).exclude(status='delivered')
+        .annotate(zip=KT('pickup_address__zip'))
+        .values_list('id', 'lr_no', 'zip', 'pickup_time_window', 'weight')
+    )
+    coords = pincode_coordinates(str(row[2]).strip() for row in rows if row[2])
+    pickups, skipped = [], []
+    for booking_id, lr_no, zip_code, window, weight in rows:
+        zip_code = str(zip_code or '').strip()
+        point = coords.get(zip_code)
+        if point is None:
+            skipped.append((booking_id, lr_no, 'unknown pincode'))
+            continue
+        pickups.append(Pickup(booking_id, lr_no, zip_code, window or '', float(weight or 0), point[0], point[1]))
+    return pickups, skipped
+
+
+def plan_day(day, vehicles):
+    pickups, skipped = load_pickups(day)
+    routes, unassigned = plan_routes(pickups, vehicles)
+    return {
+        'date': day.isoformat(),
+        'pickups': len(pickups) + len(skipped),
+        'routes': [
+            {
+                'vehicle': route.vehicle.id,
+                'stops': [
+                    {'booking_id': p.booking_id, 'lr_no': p.lr_no, 'zip': p.zip, 'time_window': p.window,
+                     'weight': p.weight, 'lat': p.lat, 'lng': p.lng}
+                    for p in route.stops
+                ],
+                'load_kg': round(route.load_kg, 2),
+                'distance_km': round(route.distance_km, 2),
+            }
+            for route in routes
+        ],
+        'unassigned': [{'booking_id': p.booking_id, 'lr_no': p.lr_no, 'reason': reason} for p, reason in unassigned]
+                      + [{'booking_id': b, 'lr_no': lr, 'reason': reason} for b, lr, reason in skipped],
+    }
@@ -0,0 +1,236 @@
+"""Delivery ETAs learned from delivered bookings.
+
+refresh_transit_stats() keeps a histogram of whole days from booking_date to
+delivered_at for every (from_location, to_location, service_type) over the
+last ETA_HISTORY_DAYS, plus origin-hub and global rows summed from them. Each
+process holds the table in memory (eta_table) and answers a lookup with a few
+dict probes, falling back lane -> origin hub -> global when a lane has too few
+deliveries to trust.
+"""
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Min
+from django.db.models.functions import Lower, Trim, TruncDate
+from django.utils import timezone
+
+from .models import Booking, TransitTimeStat
+
+# Arbitrary key for pg_try_advisory_xact_lock so only one worker refreshes at a time
+TRANSIT_STATS_LOCK_ID = 260039
+
+
+def lane_key(value):
+    return (value or '').strip().lower()
+
+
+def percentile_days(histogram, q):
+    """Smallest whole number of days within which a fraction ``q`` of the deliveries arrived."""
+    counts = np.cumsum(histogram)
+    return int(np.searchsorted(counts, q * counts[-1]))
+
+
+def backfill_delivered_at(batch_size=20000):
+    """Fill delivered_at for delivered bookings from the 'delivered' entry in their updates.
+
+    Runs in id-range batches so no single statement holds many row locks.
+    Returns the number of bookings updated.
+    """
+    table = Booking._meta.db_table
+    bounds = Booking.objects.filter(status='delivered', delivered_at__isnull=True).aggregate(
+        first=Min('id'), last=Max('id'),
+    )
+    if bounds['first'] is None:
+        return 0
+    updated = 0
+    for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} b SET delivered_at = d.ts FROM (
+                    SELECT id, (
+                        SELECT MAX((u->>'timestamp')::timestamp) AT TIME ZONE %s
+                        FROM jsonb_array_elements(CASE WHEN jsonb_typeof(updates) = 'array' THEN updates ELSE '[]' END) u
+                        WHERE u->>'status' = 'delivered'
+                          AND u->>'timestamp' ~ '^\\d{{4}}-\\d{{2}}-\\d{{2}}T\\d{{2}}:\\d{{2}}(:\\d{{2}})?$'
+                    ) AS ts
+                    FROM {table}
+                    WHERE id >= %s AND id < %s AND status = 'delivered' AND delivered_at IS NULL
+                ) d
+                WHERE b.id = d.id AND d.ts IS NOT NULL
+                """,
+                [settings.TIME_ZONE, start, start + batch_size],
+            )
+            updated += cursor.rowcount
+    return updated
+
+
+def _lane_histograms(since, cutoff):
+    """{(from, to, service): day counts} for lanes with a delivery at or after ``since``.
+
+    ``since`` None means every lane. Locations are matched case-insensitively.
+    """
+    max_days = settings.ETA_MAX_DAYS
+    delivered = Booking.objects.filter(delivered_at__gte=cutoff).exclude(booking_date__isnull=True)
+    if since is not None:
+        changed = set(
+            Booking.objects.filter(delivered_at__gte=since).order_by()
+            .values_list('from_location', 'to_location', 'service_type').distinct()
+        )
+        if not changed:
+            return {}, set()
+        changed = {(lane_key(a), lane_key(b), lane_key(c)) for a, b, c in changed}
+        # Folded like lane_key, so every spelling of a changed lane is counted again
+        delivered = delivered.alias(
+            origin_key=Lower(Trim('from_location')), destination_key=Lower(Trim('to_location')),
+        ).filter(origin_key__in={c[0] for c in changed}, destination_key__in={c[1] for c in changed})
+
+    histograms = defaultdict(lambda: np.zeros(max_days + 1, dtype=np.int64))
+    rows = (
+        delivered.order_by()
+        .annotate(transit=TruncDate('delivered_at') - F('booking_date'))
+        .values_list('from_location', 'to_location', 'service_type', 'transit')
+        .annotate(n=Count('id'))
+    )
+    for origin, destination, service, transit, n in rows.iterator(chunk_size=10000):
+        key = (lane_key(origin), lane_key(destination), lane_key(service))
+        if since is not None and key not in changed:
+            continue
+        # Same-day (or clock-skewed) deliveries count as 0; the last bucket is "max_days or more"
+        histograms[key][min(max(transit.days, 0), max_days)] += n
+    return histograms, (changed if since is not None else set(histograms))
+
+
+def _stat(key, histogram, refreshed_at):
+    return TransitTimeStat(
+        from_location=key[0], to_location=key[1], service_type=key[2],
+        samples=int(histogram.sum()), histogram=histogram.tolist(),
+        median_days=percentile_days(histogram, 0.5), p90_days=percentile_days(histogram, 0.9),
+        refreshed_at=refreshed_at,
+    )
+
+
+def _save(stats):
+    TransitTimeStat.objects.bulk_create(
+        stats, batch_size=2000, update_conflicts=True,
+        unique_fields=['from_location', 'to_location', 'service_type'],
+        update_fields=['samples', 'histogram', 'median_days', 'p90_days', 'refreshed_at'],
+    )
+
+
+def refresh_transit_stats(full=False, wait=False):
+    """Recompute lane histograms for lanes with deliveries since the last refresh.
+
+    Changed lanes are recomputed from scratch over the history window, so
+    overlapping runs are harmless; lanes with no new deliveries keep their old
+    window until the next ``full`` refresh. Origin-hub and global rows are then
+    summed from the lane rows. Returns the number of lanes recomputed, or None
+    when another worker holds the refresh lock and ``wait`` is False.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            if wait:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [TRANSIT_STATS_LOCK_ID])
+            else:
+                cursor.execute('SELECT pg_try_advisory_xact_lock(%s)', [TRANSIT_STATS_LOCK_ID])
+                if not cursor.fetchone()[0]:
+                    return None
+
+        started = timezone.now()
+        cutoff = started - timedelta(days=settings.ETA_HISTORY_DAYS)
+        last = TransitTimeStat.objects.aggregate(last=Max('refreshed_at'))['last']
+        # Look back past the previous run: delivered_at is stamped before commit
+        since = None if full or last is None else last - timedelta(seconds=settings.ETA_REFRESH_LOOKBACK)
+        histograms, lanes = _lane_histograms(since, cutoff)
+        if since is not None and not lanes:
+            return 0
+
+        lane_rows = TransitTimeStat.objects.exclude(to_location='')
+        if full:
+            lane_rows.delete()
+        else:
+            # Lanes that changed but have nothing left in the window
+            gone = lanes - histograms.keys()
+            for origin, destination, service in gone:
+                lane_rows.filter(from_location=origin, to_location=destination, service_type=service).delete()
+        _save([_stat(key, histogram, started) for key, histogram in histograms.items()])
+
+        # Fallback rows from every lane row; there are only a few hundred lanes
+        max_days = settings.ETA_MAX_DAYS
+        fallbacks = defaultdict(lambda: np.zeros(max_days + 1, dtype=np.int64))
+        for origin, histogram in TransitTimeStat.objects.exclude(to_location='').values_list('from_location', 'histogram'):
+            histogram = np.asarray(histogram[:max_days + 1], dtype=np.int64)
+            fallbacks[(origin, '', '')][:len(histogram)] += histogram
+            fallbacks[('', '', '')][:len(histogram)] += histogram
+        TransitTimeStat.objects.filter(to_location='').exclude(
+            from_location__in=[key[0] for key in fallbacks],
+        ).delete()
+        _save([_stat(key, histogram, started) for key, histogram in fallbacks.items()])
+    return len(lanes)
+
+
+class EtaTable:
+    """Per-process copy of TransitTimeStat keyed by normalised (from, to, service).
+
+    Checks for a newer refresh at most every ETA_SYNC_INTERVAL seconds, so a
+    lookup is normally a clock read and a few dict probes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.stats = {}
+        self.version = None
+        self.synced_at = None
+
+    def sync(self, force=False):
+        now = time.monotonic()
+        if not force and self.synced_at is not None and now - self.synced_at < settings.ETA_SYNC_INTERVAL:
+            return
+        with self._lock:
+            if not force and self.synced_at is not None and now - self.synced_at < settings.ETA_SYNC_INTERVAL:
+                return
+            version = TransitTimeStat.objects.aggregate(last=Max('refreshed_at'))['last']
+            if force or version != self.version:
+                self.stats = {
+                    (origin, destination, service): (samples, median, p90)
+                    for origin, destination, service, samples, median, p90 in TransitTimeStat.objects.values_list(
+                        'from_location', 'to_location', 'service_type', 'samples', 'median_days', 'p90_days')
+                }
+                self.version = version
+            self.synced_at = now
+
+    def lookup(self, from_location, to_location, service_type):
+        """(median days, p90 days, source) where source is lane, origin, global or default."""
+        self.sync()
+        origin = lane_key(from_location)
+        minimum = settings.ETA_MIN_SAMPLES
+        for source, key in (
+            ('lane', (origin, lane_key(to_location), lane_key(service_type))),
+            ('origin', (origin, '', '')),
+            ('global', ('', '', '')),
+        ):
+            stat = self.stats.get(key)
+            if stat is not None and stat[0] >= minimum:
+                return stat[1], stat[2], source
+        return settings.ETA_DEFAULT_DAYS, settings.ETA_DEFAULT_DAYS, 'default'
+
+    def estimate(self, booking):
+        """(expected date, latest likely date, source) for a booking; None dates without a booking_date."""
+        if booking.delivered_at:
+            delivered = timezone.localdate(booking.delivered_at)
+            return delivered, delivered, 'delivered'
+        if not booking.booking_date:
+            return None, None, None
+        median, p90, source = self.lookup(booking.from_location, booking.to_location, booking.service_type)
+        return booking.booking_date + timedelta(days=median), booking.booking_date + timedelta(days=p90), source
+
+
+eta_table = EtaTable()
@@ -0,0 +1,111 @@
+"""Project-wide JSON encoding: orjson when installed, the stdlib otherwise.
+
+Both paths produce the same JSON for what the API returns: Decimal as a
+string (like DRF's DecimalField and Django's JsonResponse), dates and
+datetimes in ISO 8601 with 'Z' for UTC, UUIDs and lazy strings as strings,
+and JSONField values as they are stored.
+"""
+import datetime
+import decimal
+import json
+import uuid
+
+from django.http import HttpResponse
+from django.utils.functional import Promise
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only where orjson is missing
+    orjson = None
+
+
+def _default(obj):
+    # Types orjson and json.dumps do not know natively
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, (uuid.UUID, Promise)):
+        return str(obj)
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, 'tolist'):  # numpy scalars and arrays
+        return obj.tolist()
+    if hasattr(obj, '__iter__'):  # querysets, generators, sets
+        return list(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class _StdlibEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, datetime.datetime):
+            text = obj.isoformat()
+            return text[:-6] + 'Z' if text.endswith('+00:00') else text
+        if isinstance(obj, (datetime.date, datetime.time)):
+            return obj.isoformat()
+        return _default(obj)
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj, indent=False):
+        """Serialize to UTF-8 JSON bytes."""
+        return orjson.dumps(obj, default=_default, option=_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+
+    def loads(data):
+        return orjson.loads(data)
+
+    DECODE_ERRORS = (orjson.JSONDecodeError,)
+else:
+    def dumps(obj, indent=False):
+        """Serialize to UTF-8 JSON bytes."""
+        return json.dumps(
+            obj, cls=_StdlibEncoder, ensure_ascii=False, allow_nan=False,
+            indent=2 if indent else None, separators=None if indent else (',', ':'),
+        ).encode()
+
+    def loads(data):
+        return json.loads(data)
+
+    DECODE_ERRORS = (ValueError,)
+
+
+class FastJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None  # JSON is always UTF-8, same as DRF's JSONRenderer
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # The browsable API asks for indented output via 'application/json; indent=4'
+        indent = 'indent' in (accepted_media_type or '')
+        return dumps(data, indent=indent)
+
+
+class FastJSONParser(BaseParser):
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding') or 'utf-8'
+        body = stream.read() if stream is not None else b''
+        try:
+            if encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+                body = body.decode(encoding)
+            return loads(body)
+        except DECODE_ERRORS + (UnicodeDecodeError,) as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class JSONResponse(HttpResponse):
+    """JsonResponse equivalent for plain Django views, encoded with ``dumps``."""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
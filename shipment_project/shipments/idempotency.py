@@ -0,0 +1,85 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+MAX_KEY_LENGTH = 100
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def _claim(scope, key, request_hash):
+    """Insert the key row. Blocks while another transaction holds the same key."""
+    expires_at = timezone.now() + timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {IdempotencyKey._meta.db_table} (scope, key, request_hash, expires_at) '
+            f'VALUES (%s, %s, %s, %s) ON CONFLICT (scope, key) DO NOTHING RETURNING id',
+            [scope, key, request_hash, expires_at],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def idempotent(view):
+    """Honour an Idempotency-Key header on a DRF function view (apply under @api_view).
+
+    The key row and the view's writes commit in one transaction. A concurrent
+    request with the same key waits on that row, then replays the stored
+    response; a retry after a 5xx runs again since nothing was committed.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters.'}, status=400)
+        scope = f'{view.__name__}:{request.user.id if request.user.is_authenticated else "-"}'
+        request_hash = _fingerprint(request)
+
+        with transaction.atomic():
+            row_id = _claim(scope, key, request_hash)
+            if row_id is None:
+                record = IdempotencyKey.objects.select_for_update().get(scope=scope, key=key)
+                if record.expires_at <= timezone.now():
+                    record.delete()
+                    row_id = _claim(scope, key, request_hash)
+                elif record.request_hash != request_hash:
+                    return Response({'error': 'Idempotency-Key was already used for a different request.'}, status=422)
+                else:
+                    response = Response(record.response_body, status=record.status_code)
+                    response['Idempotent-Replayed'] = 'true'
+                    return response
+
+            response = view(request, *args, **kwargs)
+            if response.status_code >= 500:
+                # Forget the key along with anything the view wrote, so a retry runs again
+                transaction.set_rollback(True)
+                return response
+            body = response.data if hasattr(response, 'data') else json.loads(response.content or b'null')
+            IdempotencyKey.objects.filter(pk=row_id).update(status_code=response.status_code, response_body=body)
+        return response
+
+    return wrapper
+
+
+def prune_expired(batch_size=10000):
+    """Delete expired keys in batches; returns the number of rows removed."""
+    removed = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return removed
+        removed += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
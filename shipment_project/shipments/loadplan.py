@@ -0,0 +1,264 @@
+"""Line-haul load planning.
+
+Bookings on a lane are packed into vehicles by weight and volume: first-fit
+decreasing, then an optional local search that tries to empty the lightest
+vehicles into the others. A booking's pieces always travel together.
+"""
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+
+from .models import Booking
+
+# Volumetric divisor (cm3 per kg) used to back out volume when dimensions are unreadable
+VOLUMETRIC_DIVISOR = 5000
+_UNITS = {'mm': 0.1, 'cm': 1.0, 'm': 100.0, 'in': 2.54, 'inch': 2.54, 'ft': 30.48}
+_DIMENSIONS = re.compile(
+    r'^\s*(\d+(?:\.\d+)?)\s*[x*×]\s*(\d+(?:\.\d+)?)\s*[x*×]\s*(\d+(?:\.\d+)?)\s*([a-z]*)\s*$', re.IGNORECASE,
+)
+
+
+def parse_dimensions(texts):
+    """Parse 'LxWxH[unit]' strings into an (n, 3) float array in cm; unreadable rows are NaN.
+
+    Booking forms repeat a handful of carton sizes, so each distinct string is
+    parsed once.
+    """
+    parsed = {}
+    out = np.full((len(texts), 3), np.nan)
+    for i, text in enumerate(texts):
+        if text not in parsed:
+            match = _DIMENSIONS.match(text or '')
+            unit = _UNITS.get(match.group(4).lower() or 'cm') if match else None
+            parsed[text] = tuple(float(match.group(g)) * unit for g in (1, 2, 3)) if unit else None
+        if parsed[text] is not None:
+            out[i] = parsed[text]
+    return out
+
+
+@dataclass
+class Consignments:
+    """Column arrays for the bookings being planned (one entry per booking)."""
+    booking_id: np.ndarray
+    lr_no: np.ndarray
+    pieces: np.ndarray
+    dims_cm: np.ndarray
+    weight_kg: np.ndarray
+    volume_m3: np.ndarray
+    dims_known: np.ndarray
+
+    @classmethod
+    def from_rows(cls, rows):
+        """rows: (id, lr_no, dimensions, noofpkgs, weight, chargeable_weight)."""
+        n = len(rows)
+        booking_id = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+        lr_no = np.array([r[1] for r in rows], dtype=object)
+        pieces = np.fromiter((_pieces(r[3]) for r in rows), dtype=np.int32, count=n)
+        dims = parse_dimensions([r[2] for r in rows])
+        weight = np.fromiter((float(r[4] or 0) for r in rows), dtype=np.float64, count=n)
+        chargeable = np.fromiter((float(r[5] or 0) for r in rows), dtype=np.float64, count=n)
+        known = ~np.isnan(dims).any(axis=1)
+        volume = np.where(known, np.prod(np.nan_to_num(dims), axis=1) * pieces / 1e6,
+                          chargeable * VOLUMETRIC_DIVISOR / 1e6)
+        return cls(booking_id, lr_no, pieces, dims, np.maximum(weight, 0), volume, known)
+
+    def __len__(self):
+        return len(self.booking_id)
+
+
+def _pieces(value):
+    try:
+        return max(1, int(str(value).strip()))
+    except (TypeError, ValueError):
+        return 1
+
+
+@dataclass
+class VehicleType:
+    name: str
+    max_weight_kg: float
+    volume_m3: float
+    count: int = None  # None = as many as needed
+
+
+def first_fit_decreasing(weight, volume, capacities):
+    """Pack items into bins; returns (bin per item or -1, bins opened, capacities).
+
+    ``capacities`` has a row of (weight, volume, ...) per available bin in the
+    order they may be opened. When an item needs a new bin and the next one is
+    too small, the first spare that fits is swapped forward, so the returned
+    array is reordered to match the bin numbers (extra columns ride along).
+    Items are taken largest first, sized by their bigger share of the first
+    bin's capacity.
+    """
+    n, m = len(weight), len(capacities)
+    assignment = np.full(n, -1, dtype=np.int64)
+    if n == 0 or m == 0:
+        return assignment, 0, capacities
+    size = np.maximum(weight / capacities[0, 0], volume / capacities[0, 1])
+    order = np.argsort(-size, kind='stable')
+    free_weight = capacities[:, 0].astype(float).copy()
+    free_volume = capacities[:, 1].astype(float).copy()
+    opened = 0
+    for item in order:
+        w, v = weight[item], volume[item]
+        fits = (free_weight[:opened] >= w) & (free_volume[:opened] >= v)
+        if fits.any():
+            target = int(fits.argmax())
+        else:
+            # Open the next bin that can take the item at all
+            candidates = np.nonzero((capacities[opened:, 0] >= w) & (capacities[opened:, 1] >= v))[0]
+            if not len(candidates):
+                continue
+            target = opened + int(candidates[0])
+            if target != opened:
+                # Keep bins contiguous: swap the chosen spare into the next slot
+                capacities = capacities.copy()
+                capacities[[opened, target]] = capacities[[target, opened]]
+                free_weight[[opened, target]] = free_weight[[target, opened]]
+                free_volume[[opened, target]] = free_volume[[target, opened]]
+                target = opened
+            opened += 1
+        assignment[item] = target
+        free_weight[target] -= w
+        free_volume[target] -= v
+    return assignment, opened, capacities
+
+
+def improve(weight, volume, assignment, capacities, bins, time_budget=0.5):
+    """Try to empty the emptiest vehicles by moving their bookings into the others.
+
+    Returns (assignment, bins, capacities) with surviving bins renumbered
+    0..bins-1 and the emptied ones moved back among the spares.
+    """
+    deadline = time.perf_counter() + time_budget
+    load_w = np.bincount(assignment[assignment >= 0], weights=weight[assignment >= 0], minlength=bins)
+    load_v = np.bincount(assignment[assignment >= 0], weights=volume[assignment >= 0], minlength=bins)
+    alive = np.ones(bins, dtype=bool)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        fill = np.maximum(load_w / capacities[:bins, 0], load_v / capacities[:bins, 1])
+        for source in np.argsort(fill):
+            if not alive[source] or alive.sum() <= 1 or time.perf_counter() > deadline:
+                continue
+            items = np.nonzero(assignment == source)[0]
+            items = items[np.argsort(-np.maximum(weight[items], volume[items]))]
+            trial_w, trial_v = load_w.copy(), load_v.copy()
+            moves = []
+            for item in items:
+                fits = alive & (np.arange(bins) != source) \
+                    & (trial_w + weight[item] <= capacities[:bins, 0]) & (trial_v + volume[item] <= capacities[:bins, 1])
+                if not fits.any():
+                    break
+                # Best fit: the vehicle left fullest (by its tighter dimension) by the move
+                fill_after = np.maximum((trial_w + weight[item]) / capacities[:bins, 0],
+                                        (trial_v + volume[item]) / capacities[:bins, 1])
+                target = int(np.argmax(np.where(fits, fill_after, -np.inf)))
+                trial_w[target] += weight[item]
+                trial_v[target] += volume[item]
+                moves.append((item, target))
+            else:
+                for item, target in moves:
+                    assignment[item] = target
+                trial_w[source] = trial_v[source] = 0
+                load_w, load_v = trial_w, trial_v
+                alive[source] = False
+                improved = True
+    # Renumber surviving bins in their original order
+    mapping = np.full(bins, -1, dtype=np.int64)
+    mapping[alive] = np.arange(int(alive.sum()))
+    placed = assignment >= 0
+    assignment[placed] = mapping[assignment[placed]]
+    capacities = np.concatenate([capacities[:bins][alive], capacities[:bins][~alive], capacities[bins:]])
+    return assignment, int(alive.sum()), capacities
+
+
+def right_size(weight, volume, assignment, capacities, bins):
+    """Swap each loaded vehicle for the smallest spare vehicle that still holds its load."""
+    placed = assignment >= 0
+    load_w = np.bincount(assignment[placed], weights=weight[placed], minlength=bins)
+    load_v = np.bincount(assignment[placed], weights=volume[placed], minlength=bins)
+    capacities = capacities.copy()
+    fill = np.maximum(load_w / capacities[:bins, 0], load_v / capacities[:bins, 1])
+    for b in np.argsort(fill):
+        spare = capacities[bins:]
+        fits = (spare[:, 0] >= load_w[b]) & (spare[:, 1] >= load_v[b])
+        if not fits.any():
+            continue
+        # Size relative to the current vehicle; 2.0 means the same size
+        size = np.where(fits, spare[:, 0] / capacities[b, 0] + spare[:, 1] / capacities[b, 1], np.inf)
+        pick = int(np.argmin(size))
+        if size[pick] < 2.0 - 1e-9:
+            capacities[[b, bins + pick]] = capacities[[bins + pick, b]]
+    return capacities
+
+
+def pack(consignments, vehicle_types, local_search=True, time_budget=0.5):
+    """Assign consignments to vehicles. Returns (assignment, vehicle names, capacities)."""
+    slots = []
+    remaining = len(consignments)
+    for vt in vehicle_types:
+        # Unlimited types get as many slots as there are bookings (never more are needed)
+        count = vt.count if vt.count is not None else remaining
+        slots.extend([(vt.name, vt.max_weight_kg, vt.volume_m3)] * count)
+    names = np.array([s[0] for s in slots], dtype=object)
+    capacities = np.array([s[1:] for s in slots], dtype=float).reshape(-1, 2)
+    tagged = np.column_stack([capacities, np.arange(len(slots))]) if len(slots) else np.zeros((0, 3))
+
+    weight, volume = consignments.weight_kg, consignments.volume_m3
+    assignment, bins, tagged = first_fit_decreasing(weight, volume, tagged)
+    if local_search and bins:
+        assignment, bins, tagged = improve(weight, volume, assignment, tagged, bins, time_budget)
+        tagged = right_size(weight, volume, assignment, tagged, bins)
+    used = tagged[:bins]
+    return assignment, names[used[:, 2].astype(np.int64)], used[:, :2]
+
+
+def plan_lane(consignments, vehicle_types, local_search=True, time_budget=0.5):
+    assignment, names, capacities = pack(consignments, vehicle_types, local_search, time_budget)
+    vehicles = []
+    for index, name in enumerate(names):
+        members = np.nonzero(assignment == index)[0]
+        weight = float(consignments.weight_kg[members].sum())
+        volume = float(consignments.volume_m3[members].sum())
+        vehicles.append({
+            'vehicle': f'{name} #{index + 1}',
+            'type': name,
+            'lr_nos': consignments.lr_no[members].tolist(),
+            'weight_kg': round(weight, 2),
+            'volume_m3': round(volume, 3),
+            'weight_utilisation': round(weight / capacities[index, 0], 3),
+            'volume_utilisation': round(volume / capacities[index, 1], 3),
+        })
+    unassigned = consignments.lr_no[assignment < 0].tolist()
+    return {
+        'bookings': len(consignments),
+        'pieces': int(consignments.pieces.sum()),
+        'weight_kg': round(float(consignments.weight_kg.sum()), 2),
+        'volume_m3': round(float(consignments.volume_m3.sum()), 3),
+        'dimensions_estimated': int((~consignments.dims_known).sum()),
+        'vehicles': vehicles,
+        'unassigned': unassigned,
+    }
+
+
+def plan_loads(day, vehicle_types, from_location=None, to_location=None, local_search=True, time_budget=0.5):
+    """Load plans for every lane booked on ``day`` (optionally one lane)."""
+    queryset = Booking.objects.filter(booking_date=day).exclude(status='delivered')
+    if from_location:
+        queryset = queryset.filter(from_location__iexact=from_location)
+    if to_location:
+        queryset = queryset.filter(to_location__iexact=to_location)
+    lanes = defaultdict(list)
+    for row in queryset.values_list('from_location', 'to_location', 'id', 'lr_no', 'dimensions', 'noofpkgs',
+                                    'weight', 'chargeable_weight').iterator(chunk_size=10000):
+        lanes[(row[0], row[1])].append(row[2:])
+    return [
+        {'from_location': origin, 'to_location': destination,
+         **plan_lane(Consignments.from_rows(rows), vehicle_types, local_search, time_budget)}
+        for (origin, destination), rows in sorted(lanes.items())
+    ]
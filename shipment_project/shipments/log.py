@@ -0,0 +1,140 @@
+"""Logging pipeline: JSON lines written by a background thread.
+
+Request threads only copy the record onto a bounded queue (QueueingHandler);
+formatting and the actual write happen in a QueueListener thread. Every record
+carries the request id and URL name set by RequestContextMiddleware.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+# Per-request dict: request_id, view, sampled (debug sampling decision)
+request_context = contextvars.ContextVar('request_context', default=None)
+
+_traceback_formatter = logging.Formatter()
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the current request id and view name."""
+
+    def filter(self, record):
+        context = request_context.get()
+        if context is not None:
+            record.request_id, record.view = context['request_id'], context['view']
+            return True
+        # django.request logs after the middleware stack has unwound but passes the request
+        request = getattr(record, 'request', None)
+        match = getattr(request, 'resolver_match', None)
+        record.request_id = getattr(request, 'request_id', None)
+        record.view = (match.url_name or match.view_name) if match else None
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Keeps DEBUG records from a sample of requests, capped at per_second overall.
+
+    The sampling decision is made once per request, so a sampled request keeps
+    its whole debug trail. INFO and above always pass.
+    """
+
+    def __init__(self, rate=0.01, per_second=50):
+        super().__init__()
+        self.rate = float(rate)
+        self.per_second = int(per_second)
+        self.window = 0
+        self.count = 0
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        context = request_context.get()
+        if context is None:
+            sampled = random.random() < self.rate
+        else:
+            sampled = context.get('sampled')
+            if sampled is None:
+                sampled = context['sampled'] = random.random() < self.rate
+        if not sampled:
+            return False
+        window = int(time.monotonic())
+        if window != self.window:
+            self.window, self.count = window, 0
+        self.count += 1
+        return self.count <= self.per_second
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'view': getattr(record, 'view', None),
+            'pid': record.process,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class QueueingHandler(logging.handlers.QueueHandler):
+    """QueueHandler that owns its listener and JSON stream handler.
+
+    Records are dropped (and counted) rather than blocking a request when the
+    queue is full. The listener is restarted in forked children.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        target = logging.StreamHandler(stream or sys.stdout)
+        target.setFormatter(JsonFormatter())
+        self.listener = logging.handlers.QueueListener(self.queue, target, respect_handler_level=False)
+        self.dropped = 0
+        self.listener.start()
+        atexit.register(self.close)
+        os.register_at_fork(after_in_child=self._restart_in_child)
+
+    def _restart_in_child(self):
+        # The listener thread does not survive fork(); anything queued belongs to the parent
+        self.queue = self.listener.queue = queue.Queue(self.queue.maxsize)
+        self.listener._thread = None
+        self.listener.start()
+
+    def prepare(self, record):
+        # Only do what must happen on the calling thread: merge args (they may be
+        # mutated after the call) and render tracebacks. JSON formatting is left
+        # to the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            from .metrics import registry
+
+            self.dropped += 1
+            registry.inc('log_records_dropped_total')
+
+    def close(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from shipments.archive import archive_bookings, archive_dir
+
+
+class Command(BaseCommand):
+    help = "Move delivered bookings older than --older-than days into compressed monthly JSONL files under ARCHIVE_DIR."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, required=True, help="Archive bookings booked more than this many days ago.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help="Only count the bookings that would be archived.")
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 1:
+            raise CommandError('--older-than must be at least 1 day')
+        before = timezone.localdate() - timedelta(days=options['older_than'])
+        archived = archive_bookings(before, batch_size=options['batch_size'], dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(f"{archived} delivered booking(s) booked before {before} would be archived.")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {archived} delivered booking(s) booked before {before} to {archive_dir()}."
+            ))
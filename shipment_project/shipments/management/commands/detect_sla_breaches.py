@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shipments.sla import backfill_delivery_deadlines, detect_sla_breaches
+
+
+class Command(BaseCommand):
+    help = "Alert open bookings that missed their delivery deadline or are due within --hours."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, help="Look this far ahead (default SLA_HORIZON_HOURS).")
+        parser.add_argument('--backfill', action='store_true',
+                            help="First give open bookings without a delivery_deadline one.")
+        parser.add_argument('--batch-size', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        if options['hours'] is not None and options['hours'] <= 0:
+            raise CommandError('--hours must be positive')
+        if options['backfill']:
+            filled = backfill_delivery_deadlines(batch_size=options['batch_size'])
+            self.stdout.write(f"Backfilled delivery_deadline on {filled} booking(s).")
+        report = detect_sla_breaches(hours=options['hours'])
+        for bucket in report['buckets']:
+            new = [s['lr_no'] for s in bucket['shipments'] if s['new_alert']]
+            self.stdout.write(f"{bucket['bucket']:>10}: {bucket['count']} booking(s), {len(new)} new"
+                              + (f" ({', '.join(new[:20])}{' ...' if len(new) > 20 else ''})" if new else ''))
+        self.stdout.write(self.style.SUCCESS(f"Raised {report['new_alerts']} new SLA alert(s)."))
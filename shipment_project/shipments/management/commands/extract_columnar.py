@@ -0,0 +1,20 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from shipments.columnar import columnar_dir, extract_columnar
+
+
+class Command(BaseCommand):
+    help = "Append new bookings to the columnar extract (one .npy per column) under COLUMNAR_DIR."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Rewrite every booking into a new version, picking up edits and status changes.")
+        parser.add_argument('--output', help="Extract directory (default COLUMNAR_DIR).")
+        parser.add_argument('--part-rows', type=int, help="Bookings per part (default COLUMNAR_PART_ROWS).")
+
+    def handle(self, *args, **options):
+        root = Path(options['output']) if options['output'] else columnar_dir()
+        version_dir, written = extract_columnar(full=options['full'], root=root, part_rows=options['part_rows'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} booking(s) to {version_dir}."))
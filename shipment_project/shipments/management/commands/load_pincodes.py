@@ -0,0 +1,70 @@
+import csv
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shipments.models import Pincode
+
+# Header names used by the India Post all-India pincode directory and common re-exports
+COLUMNS = {
+    'pincode': ('pincode', 'pin_code', 'pin'),
+    'latitude': ('latitude', 'lat'),
+    'longitude': ('longitude', 'lng', 'lon', 'long'),
+    'district': ('district', 'districtname', 'district_name'),
+    'state': ('statename', 'state', 'state_name'),
+}
+
+
+class Command(BaseCommand):
+    help = "Load pincode centroids (for pickup routing) from a post office CSV; several offices per pincode are averaged."
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with open(options['csv_path'], newline='', encoding='utf-8-sig') as handle:
+            reader = csv.DictReader(handle)
+            headers = {name.strip().lower(): name for name in reader.fieldnames or []}
+            columns = {}
+            for field, candidates in COLUMNS.items():
+                columns[field] = next((headers[c] for c in candidates if c in headers), None)
+            missing = [f for f in ('pincode', 'latitude', 'longitude') if columns[f] is None]
+            if missing:
+                raise CommandError(f"CSV has no {', '.join(missing)} column.")
+
+            offices = defaultdict(list)
+            names = {}
+            skipped = 0
+            for row in reader:
+                pincode = (row[columns['pincode']] or '').strip()
+                try:
+                    lat, lng = float(row[columns['latitude']]), float(row[columns['longitude']])
+                except (TypeError, ValueError):
+                    skipped += 1
+                    continue
+                # The directory has 'NA' and swapped/zero coordinates; keep points inside India only
+                if len(pincode) != 6 or not pincode.isdigit() or not (6 <= lat <= 38 and 68 <= lng <= 98):
+                    skipped += 1
+                    continue
+                offices[pincode].append((lat, lng))
+                names.setdefault(pincode, (
+                    (row[columns['district']] or '').strip().title() if columns['district'] else '',
+                    (row[columns['state']] or '').strip().title() if columns['state'] else '',
+                ))
+
+        pincodes = [
+            Pincode(
+                pincode=code,
+                latitude=sum(p[0] for p in points) / len(points),
+                longitude=sum(p[1] for p in points) / len(points),
+                district=names[code][0][:100],
+                state=names[code][1][:100],
+            )
+            for code, points in offices.items()
+        ]
+        Pincode.objects.bulk_create(
+            pincodes, batch_size=options['batch_size'], update_conflicts=True,
+            unique_fields=['pincode'], update_fields=['latitude', 'longitude', 'district', 'state'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Loaded {len(pincodes)} pincode(s); skipped {skipped} row(s)."))
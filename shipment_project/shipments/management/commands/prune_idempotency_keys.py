@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from shipments.idempotency import prune_expired
+
+
+class Command(BaseCommand):
+    help = "Delete Idempotency-Key records whose TTL has passed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        removed = prune_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} expired idempotency key(s)."))
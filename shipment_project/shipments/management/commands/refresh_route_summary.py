@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from shipments.reports import refresh_route_summary
+
+
+class Command(BaseCommand):
+    help = "Recompute the weekly route summary for booking weeks changed since the last refresh."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rebuild every week instead of only the dirty ones.")
+
+    def handle(self, *args, **options):
+        weeks = refresh_route_summary(full=options['full'], wait=True)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {weeks} week(s) of route summary."))
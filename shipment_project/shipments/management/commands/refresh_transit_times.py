@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from shipments.eta import backfill_delivered_at, refresh_transit_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute delivery transit-time stats for lanes with deliveries since the last refresh."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rebuild every lane over the history window.")
+        parser.add_argument('--backfill', action='store_true',
+                            help="First fill delivered_at for delivered bookings from their status updates.")
+        parser.add_argument('--batch-size', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            filled = backfill_delivered_at(batch_size=options['batch_size'])
+            self.stdout.write(f"Backfilled delivered_at on {filled} booking(s).")
+        lanes = refresh_transit_stats(full=options['full'], wait=True)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed transit times for {lanes} lane(s)."))
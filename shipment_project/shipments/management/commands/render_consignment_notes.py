@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from shipments.consignment_notes import note_queryset, stream_consignment_notes
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}; use YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Render printable consignment notes for a booking date range and/or LR numbers into one HTML document."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', type=_date, help="First booking date (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='end', type=_date, help="Last booking date (YYYY-MM-DD), inclusive.")
+        parser.add_argument('--lr', dest='lr_nos', action='append', help="LR number to include; repeatable.")
+        parser.add_argument('--copies', type=int, default=len(settings.CONSIGNMENT_NOTE_COPIES),
+                            help="Copies per note, taken in order from CONSIGNMENT_NOTE_COPIES.")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Render processes (default: CONSIGNMENT_NOTE_WORKERS for large batches).")
+        parser.add_argument('--output', '-o', help="File to write (default: stdout).")
+
+    def handle(self, *args, **options):
+        if not (options['start'] or options['end'] or options['lr_nos']):
+            raise CommandError('Give --from/--to or at least one --lr')
+        labels = settings.CONSIGNMENT_NOTE_COPIES
+        if not 1 <= options['copies'] <= len(labels):
+            raise CommandError(f'--copies must be between 1 and {len(labels)}')
+        queryset = note_queryset(options['start'], options['end'], options['lr_nos'])
+        total = queryset.count()
+        pieces = stream_consignment_notes(queryset, labels[:options['copies']], workers=options['workers'], total=total)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as out:
+                out.writelines(pieces)
+            self.stderr.write(self.style.SUCCESS(f"Wrote {total} consignment note(s) to {options['output']}."))
+        else:
+            for piece in pieces:
+                self.stdout.write(piece, ending='')
@@ -0,0 +1,59 @@
+import csv
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shipments.models import TariffVersion
+from shipments.tariffs import current_tariff, hundredths, rerate_bookings
+
+REPORT_FIELDS = ['lr_no', 'from_location', 'to_location', 'service_type', 'chargeable_kg', 'old_freight',
+                 'new_freight', 'old_sgst', 'new_sgst', 'old_cgst', 'new_cgst']
+
+
+class Command(BaseCommand):
+    help = "Recompute freight and GST of open, unbilled bookings from a tariff, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tariff', type=int, help="TariffVersion id (default: the newest one in effect).")
+        parser.add_argument('--dry-run', action='store_true', help="Work out the changes without writing them.")
+        parser.add_argument('--report', help="Write every changed booking, old and new charges, to this CSV file.")
+        parser.add_argument('--booked-from', help="Only bookings booked on or after this YYYY-MM-DD date.")
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--restart', action='store_true',
+                            help="Abandon an interrupted run for this tariff instead of resuming it.")
+
+    def handle(self, *args, **options):
+        if options['tariff']:
+            tariff = TariffVersion.objects.filter(pk=options['tariff']).first()
+        else:
+            tariff = current_tariff()
+        if tariff is None:
+            raise CommandError('No such tariff.' if options['tariff'] else 'No tariff is in effect yet.')
+        try:
+            booked_from = datetime.strptime(options['booked_from'], '%Y-%m-%d').date() if options['booked_from'] else None
+        except ValueError:
+            raise CommandError("Use 'YYYY-MM-DD' for --booked-from.")
+
+        report = writer = None
+        if options['report']:
+            # Appended to, so a resumed run adds to the rows written before the interruption
+            report = open(options['report'], 'a', newline='')
+            writer = csv.DictWriter(report, REPORT_FIELDS)
+            if report.tell() == 0:
+                writer.writeheader()
+        try:
+            run = rerate_bookings(
+                tariff, dry_run=options['dry_run'], booked_from=booked_from, batch_size=options['batch_size'],
+                restart=options['restart'], on_batch=writer.writerows if writer else None,
+            )
+        finally:
+            if report:
+                report.close()
+
+        verb = 'Would change' if run.dry_run else 'Changed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {run.changed} of {run.scanned} booking(s) with {tariff} (run {run.pk}); "
+            f"{run.unrated} had no matching rate. Freight {hundredths(abs(run.freight_delta_paise))} "
+            f"{'up' if run.freight_delta_paise >= 0 else 'down'}, GST {hundredths(abs(run.gst_delta_paise))} "
+            f"{'up' if run.gst_delta_paise >= 0 else 'down'}."
+        ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shipments.archive import read_manifest, restore_bookings, verify_archive
+
+
+class Command(BaseCommand):
+    help = "Load archived bookings back into the database (whole months) and drop them from the archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', action='append', dest='months', metavar='YYYY-MM',
+                            help="Month to restore; repeat for several. Omit with --all to restore everything.")
+        parser.add_argument('--all', action='store_true')
+        parser.add_argument('--verify', action='store_true', help="Only check part checksums against the manifest.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            bad = verify_archive()
+            parts = len(read_manifest()['parts'])
+            if bad:
+                raise CommandError(f"{len(bad)} of {parts} part(s) failed verification: {', '.join(bad)}")
+            self.stdout.write(self.style.SUCCESS(f"All {parts} part(s) match the manifest."))
+            return
+        if not options['months'] and not options['all']:
+            raise CommandError('Pass --month YYYY-MM (repeatable) or --all.')
+        try:
+            restored, skipped = restore_bookings(months=None if options['all'] else set(options['months']),
+                                                 batch_size=options['batch_size'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f"Restored {restored} booking(s) from the archive."))
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f"{len(skipped)} booking(s) kept in the archive; their id or LR number is in use again: "
+                f"{', '.join(skipped)}"
+            ))
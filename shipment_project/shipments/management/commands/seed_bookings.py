@@ -0,0 +1,256 @@
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from shipments.models import Booking
+from shipments.reports import mark_all_weeks_dirty
+
+# (city, state, pincode prefix, relative booking volume)
+CITIES = [
+    ('Mumbai', 'Maharashtra', 400, 100), ('Delhi', 'Delhi', 110, 95), ('Bengaluru', 'Karnataka', 560, 90),
+    ('Hyderabad', 'Telangana', 500, 85), ('Chennai', 'Tamil Nadu', 600, 80), ('Kolkata', 'West Bengal', 700, 60),
+    ('Pune', 'Maharashtra', 411, 55), ('Ahmedabad', 'Gujarat', 380, 50), ('Surat', 'Gujarat', 395, 35),
+    ('Jaipur', 'Rajasthan', 302, 30), ('Lucknow', 'Uttar Pradesh', 226, 25), ('Kanpur', 'Uttar Pradesh', 208, 15),
+    ('Nagpur', 'Maharashtra', 440, 18), ('Indore', 'Madhya Pradesh', 452, 18), ('Bhopal', 'Madhya Pradesh', 462, 12),
+    ('Visakhapatnam', 'Andhra Pradesh', 530, 16), ('Vijayawada', 'Andhra Pradesh', 520, 20), ('Coimbatore', 'Tamil Nadu', 641, 15),
+    ('Kochi', 'Kerala', 682, 14), ('Thiruvananthapuram', 'Kerala', 695, 8), ('Patna', 'Bihar', 800, 10),
+    ('Guwahati', 'Assam', 781, 8), ('Bhubaneswar', 'Odisha', 751, 9), ('Chandigarh', 'Chandigarh', 160, 10),
+    ('Ludhiana', 'Punjab', 141, 12), ('Nashik', 'Maharashtra', 422, 9), ('Vadodara', 'Gujarat', 390, 10),
+    ('Madurai', 'Tamil Nadu', 625, 8), ('Warangal', 'Telangana', 506, 7), ('Mysuru', 'Karnataka', 570, 7),
+]
+FIRST_NAMES = ['Arjun', 'Priya', 'Ravi', 'Lakshmi', 'Suresh', 'Anita', 'Vikram', 'Deepa', 'Kiran', 'Meena', 'Rahul', 'Sneha']
+LAST_NAMES = ['Reddy', 'Sharma', 'Iyer', 'Patel', 'Nair', 'Rao', 'Gupta', 'Das', 'Singh', 'Menon', 'Joshi', 'Kumar']
+STREETS = ['MG Road', 'Station Road', 'Industrial Area', 'Ring Road', 'Market Street', 'Gandhi Nagar', 'Transport Nagar']
+SERVICE_TYPES = ['standard', 'express', 'economy']
+PACKAGE_TYPES = ['box', 'envelope', 'pallet', 'crate', 'bag']
+TIME_WINDOWS = ['09:00-12:00', '12:00-15:00', '15:00-18:00']
+PAYMENT_METHODS = ['cash', 'upi', 'card', 'to-pay', 'tbb']
+CONTENTS = ['Electronics', 'Garments', 'Auto Parts', 'Documents', 'Pharma', 'Machinery', 'FMCG']
+
+NULL = '\\N'  # COPY text-format NULL
+SEED_USER_PREFIX = 'seed-user-'
+SEED_PASSWORD = 'seed-password'
+
+BOOKING_COLUMNS = [
+    'lr_no', 'booking_date', 'from_location', 'to_location', 'branch_from_phone', 'branch_to_phone',
+    'actual_weight', 'chargeable_weight', 'freight', 'dod', 'sgst', 'cgst', 'policy_no', 'noofpkgs',
+    'consignor', 'consignee', 'saidtocontain', 'pickup_address', 'delivery_address', 'service_type',
+    'package_type', 'weight', 'dimensions', 'description', 'pickup_date', 'pickup_time_window',
+    'payment_method', 'status', 'updates', 'phone', 'delivery_email', 'user_id',
+]
+
+
+class Command(BaseCommand):
+    help = "Bulk-load deterministic synthetic bookings and users with COPY, for scale testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, required=True, help="Number of bookings to add.")
+        parser.add_argument('--users', type=int, default=1000, help="Number of client users to spread bookings over.")
+        parser.add_argument('--seed', type=int, default=42, help="RNG seed; the same seed produces the same data.")
+        parser.add_argument('--days', type=int, default=730, help="Spread booking dates over this many past days.")
+        parser.add_argument('--batch-size', type=int, default=200000)
+
+    def handle(self, *args, **options):
+        if options['rows'] <= 0:
+            raise CommandError('--rows must be positive')
+        rng = np.random.default_rng(options['seed'])
+        started = time.perf_counter()
+
+        user_ids = self._ensure_users(options['users'])
+        # Skip non-numeric LRs (benchmark fixtures such as DSP.../LDP...) when numbering on
+        last = Booking.objects.filter(lr_no__regex=r'^[0-9]+$').order_by('-id').values_list('lr_no', flat=True).first()
+        next_lr = (int(last) if last and last.isdigit() else 0) + 1
+
+        batches = []
+        remaining = options['rows']
+        while remaining:
+            batches.append(min(remaining, options['batch_size']))
+            remaining -= batches[-1]
+
+        def generate(index):
+            first = next_lr + sum(batches[:index])
+            return self._booking_batch(rng, batches[index], first, user_ids, options['days'])
+
+        # Generate batch N+1 on a helper thread while batch N streams through COPY;
+        # batches are still produced strictly in order, so the output stays deterministic.
+        loaded = 0
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pending = pool.submit(generate, 0)
+            for index, size in enumerate(batches):
+                buffer = pending.result()
+                if index + 1 < len(batches):
+                    pending = pool.submit(generate, index + 1)
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL synchronous_commit = off')
+                    cursor.copy_expert(
+                        f"COPY {Booking._meta.db_table} ({', '.join(BOOKING_COLUMNS)}) FROM STDIN", buffer
+                    )
+                loaded += size
+                rate = loaded / (time.perf_counter() - started)
+                if options['verbosity']:
+                    self.stdout.write(f"  {loaded:,} / {options['rows']:,} bookings ({rate:,.0f} rows/s)")
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Booking._meta.db_table}')
+        # COPY bypasses post_save, so the route summary has to be told about the new weeks
+        mark_all_weeks_dirty()
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Loaded {loaded:,} bookings for {len(user_ids):,} users in {time.perf_counter() - started:.1f}s"
+            ))
+
+    def _ensure_users(self, count):
+        User = get_user_model()
+        existing = set(User.objects.filter(username__startswith=SEED_USER_PREFIX).values_list('username', flat=True))
+        missing = [i for i in range(count) if f'{SEED_USER_PREFIX}{i:07d}' not in existing]
+        if missing:
+            password = make_password(SEED_PASSWORD)  # hashing is slow, so every seed user shares one hash
+            now = timezone.now().isoformat()
+            lines = []
+            for i in missing:
+                first, last = FIRST_NAMES[i % len(FIRST_NAMES)], LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]
+                username = f'{SEED_USER_PREFIX}{i:07d}'
+                lines.append(f'{password}\tf\t{username}\t{first}\t{last}\t{username}@example.com\tf\tt\t{now}\tclient\n')
+            with connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f'COPY {User._meta.db_table} (password, is_superuser, username, first_name, last_name, '
+                    f'email, is_staff, is_active, date_joined, user_type) FROM STDIN',
+                    io.StringIO(''.join(lines)),
+                )
+        return list(
+            User.objects.filter(username__startswith=SEED_USER_PREFIX)
+            .order_by('username').values_list('id', flat=True)[:count]
+        )
+
+    def _booking_batch(self, rng, size, first_lr, user_ids, days):
+        # Every column is built as a whole array; the only per-row Python work is the final join
+        n_cities = len(CITIES)
+        weights = np.array([c[3] for c in CITIES], dtype=float)
+        weights /= weights.sum()
+        # Skewed lanes: both ends follow city volume, so metro-to-metro dominates
+        origin = rng.choice(n_cities, size, p=weights)
+        dest = rng.choice(n_cities, size, p=weights)
+        same = origin == dest
+        dest[same] = (dest[same] + rng.integers(1, n_cities, same.sum())) % n_cities
+
+        # Recent days are busier (growth); ages are whole days before today
+        age = np.minimum(rng.exponential(days / 3, size).astype(np.int64), days - 1)
+        today = np.datetime64(date.today(), 'D')
+        booking_date = today - age.astype('timedelta64[D]')
+        pickup_date = booking_date + rng.integers(0, 3, size).astype('timedelta64[D]')
+        picked_date = booking_date + np.minimum(1, age).astype('timedelta64[D]')
+        delivered_date = booking_date + np.minimum(rng.integers(2, 8, size), age).astype('timedelta64[D]')
+
+        weight = np.round(rng.lognormal(2.3, 1.0, size).clip(0.5, 9999), 1)
+        chargeable = np.ceil(weight)
+        rate = rng.choice([18, 22, 28, 35], size)
+        freight_paise = np.maximum(chargeable.astype(np.int64) * rate * 100, 15000)
+        gst_paise = (freight_paise * 9 + 50) // 100
+
+        # Status follows age: nothing older than ~10 days is still moving
+        roll = rng.random(size)
+        status = np.select(
+            [age < 1, age < 4, age < 10],
+            [
+                np.zeros(size, np.int8),
+                np.where(roll < 0.85, 1, 0),
+                np.where(roll < 0.6, 2, np.where(roll < 0.9, 1, 3)),
+            ],
+            np.where(roll < 0.97, 2, 3),
+        )
+
+        # ~30% anonymous bookings (AllowAny create_booking); the rest Zipf-ish over users
+        if user_ids:
+            user_idx = np.minimum(rng.zipf(1.3, size) - 1, len(user_ids) - 1)
+            users = np.array([str(u) for u in user_ids], dtype=object)[user_idx]
+            users[rng.random(size) < 0.3] = NULL
+        else:
+            users = np.full(size, NULL, dtype=object)
+
+        consignor = rng.integers(0, len(PEOPLE), size)
+        consignee = rng.integers(0, len(PEOPLE), size)
+        phone_from = rng.integers(7000000000, 9999999999, size).astype(str).astype(object)
+        phone_to = rng.integers(7000000000, 9999999999, size).astype(str).astype(object)
+        ocity, dcity = CITY_NAMES[origin], CITY_NAMES[dest]
+        bdate = booking_date.astype(str).astype(object)
+
+        pickup = (
+            '{"name": "' + PEOPLE[consignor] + '", "address": "' + _street(rng, size) + '", "city": "' + ocity
+            + '", "zip": "' + _pincode(rng, origin) + '", "country": "India", "phone": "' + phone_from
+            + '", "email": ""}'
+        )
+        delivery = (
+            '{"name": "' + PEOPLE[consignee] + '", "address": "' + _street(rng, size) + '", "city": "' + dcity
+            + '", "zip": "' + _pincode(rng, dest) + '", "country": "India", "phone": "' + phone_to
+            + '", "email": "' + EMAILS[consignee] + '"}'
+        )
+        placed = '[{"status": "Order Placed", "location": "' + ocity + '", "timestamp": "' + bdate + 'T09:00:00"}'
+        moving = (', {"status": "in-transit", "location": "' + ocity + '", "timestamp": "'
+                  + picked_date.astype(str).astype(object) + 'T18:00:00"}')
+        delivered = (', {"status": "delivered", "location": "' + dcity + '", "timestamp": "'
+                     + delivered_date.astype(str).astype(object) + 'T14:00:00"}')
+        delayed = (', {"status": "delayed", "location": "' + ocity + '", "timestamp": "'
+                   + picked_date.astype(str).astype(object) + 'T22:00:00"}')
+        updates = (
+            placed
+            + np.where(status > 0, moving, '')
+            + np.where(status == 2, delivered, np.where(status == 3, delayed, ''))
+            + ']'
+        )
+
+        dims = rng.integers(10, 120, (size, 3)).astype(str).astype(object)
+        weight_s = weight.astype(str).astype(object)
+        columns = [
+            np.arange(first_lr, first_lr + size).astype(str).astype(object),
+            bdate, ocity, dcity, phone_from, phone_to,
+            weight_s, chargeable.astype(np.int64).astype(str).astype(object),
+            _money(freight_paise), bdate, _money(gst_paise), _money(gst_paise),
+            np.full(size, NULL, dtype=object),
+            rng.integers(1, 20, size).astype(str).astype(object),
+            PEOPLE[consignor], PEOPLE[consignee],
+            _pick(rng, CONTENTS, size), pickup, delivery,
+            _pick(rng, SERVICE_TYPES, size), _pick(rng, PACKAGE_TYPES, size), weight_s,
+            dims[:, 0] + 'x' + dims[:, 1] + 'x' + dims[:, 2],
+            np.full(size, NULL, dtype=object),
+            pickup_date.astype(str).astype(object),
+            _pick(rng, TIME_WINDOWS, size), _pick(rng, PAYMENT_METHODS, size),
+            STATUS_NAMES[status], updates, phone_to, EMAILS[consignee], users,
+        ]
+        out = io.StringIO()
+        out.write('\n'.join(map('\t'.join, zip(*(c.tolist() for c in columns)))))
+        out.write('\n')
+        out.seek(0)
+        return out
+
+
+CITY_NAMES = np.array([c[0] for c in CITIES], dtype=object)
+CITY_PIN_PREFIX = np.array([str(c[2]) for c in CITIES], dtype=object)
+STATUS_NAMES = np.array(['pending', 'in-transit', 'delivered', 'delayed'], dtype=object)
+PEOPLE = np.array([f'{first} {last}' for first in FIRST_NAMES for last in LAST_NAMES], dtype=object)
+EMAILS = np.array([f'{first.lower()}.{last.lower()}@example.com' for first in FIRST_NAMES for last in LAST_NAMES], dtype=object)
+TWO_DIGITS = np.array([f'{i:02d}' for i in range(100)], dtype=object)
+THREE_DIGITS = np.array([f'{i:03d}' for i in range(1000)], dtype=object)
+
+
+def _pick(rng, choices, size):
+    return np.array(choices, dtype=object)[rng.integers(0, len(choices), size)]
+
+
+def _money(paise):
+    return (paise // 100).astype(str).astype(object) + '.' + TWO_DIGITS[paise % 100]
+
+
+def _street(rng, size):
+    return rng.integers(1, 999, size).astype(str).astype(object) + ' ' + _pick(rng, STREETS, size)
+
+
+def _pincode(rng, city_idx):
+    return CITY_PIN_PREFIX[city_idx] + THREE_DIGITS[rng.integers(1, 99, len(city_idx))]
@@ -0,0 +1,180 @@
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class QueryCounter:
+    """execute_wrapper that counts the SQL run while a request is in flight."""
+
+    __slots__ = ('count', 'duration')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class MetricsRegistry:
+    """Per-process request metrics.
+
+    Everything is kept as plain dicts of numbers so a snapshot can be dumped to
+    JSON and summed with the snapshots of the other gunicorn workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self.reset()
+
+    def reset(self):
+        self.requests = {}        # (view, method, status) -> count
+        self.latency = {}         # view -> [bucket counts..., +Inf, sum]
+        self.response_size = {}   # view -> [bucket counts..., +Inf, sum]
+        self.db_queries = {}      # view -> total queries
+        self.db_time = {}         # view -> total seconds spent in SQL
+        self.extra = {}           # name -> value, for counters/gauges owned by other modules
+
+    def observe(self, view, method, status, duration, size, queries, query_time):
+        with self._lock:
+            key = (view, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            _observe(self.latency, view, LATENCY_BUCKETS, duration)
+            if size is not None:
+                _observe(self.response_size, view, SIZE_BUCKETS, size)
+            self.db_queries[view] = self.db_queries.get(view, 0) + queries
+            self.db_time[view] = self.db_time.get(view, 0.0) + query_time
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self.extra[name] = self.extra.get(name, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': [[*key, value] for key, value in self.requests.items()],
+                'latency': {k: list(v) for k, v in self.latency.items()},
+                'response_size': {k: list(v) for k, v in self.response_size.items()},
+                'db_queries': dict(self.db_queries),
+                'db_time': dict(self.db_time),
+                'extra': dict(self.extra),
+            }
+
+    def maybe_flush(self):
+        # Cheap enough to call after every request; writes at most once per interval
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if not directory:
+            return
+        now = time.monotonic()
+        if now - self._last_flush < getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+            return
+        self._last_flush = now
+        self.flush(directory)
+
+    def flush(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(tmp, path)
+
+
+def _observe(histograms, view, buckets, value):
+    row = histograms.get(view)
+    if row is None:
+        # one slot per bucket, one for +Inf, then the running sum
+        row = histograms[view] = [0] * (len(buckets) + 2)
+    row[bisect_left(buckets, value)] += 1
+    row[-1] += value
+
+
+registry = MetricsRegistry()
+
+
+def collect_snapshots():
+    """This process's live numbers plus the last flush of every other worker."""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if not directory:
+        return [registry.snapshot()]
+    registry.flush(directory)
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        try:
+            with open(path) as fh:
+                snapshots.append(json.load(fh))
+        except (OSError, ValueError):
+            continue  # worker was mid-write or the file was cleaned up
+    return snapshots
+
+
+def merge_snapshots(snapshots):
+    merged = {'requests': {}, 'latency': {}, 'response_size': {}, 'db_queries': {}, 'db_time': {}, 'extra': {}}
+    for snap in snapshots:
+        for view, method, status, value in snap['requests']:
+            key = (view, method, status)
+            merged['requests'][key] = merged['requests'].get(key, 0) + value
+        for name in ('latency', 'response_size'):
+            for view, row in snap[name].items():
+                current = merged[name].setdefault(view, [0] * len(row))
+                for i, value in enumerate(row):
+                    current[i] += value
+        for name in ('db_queries', 'db_time', 'extra'):
+            for key, value in snap[name].items():
+                merged[name][key] = merged[name].get(key, 0) + value
+    return merged
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _render_histogram(lines, name, help_text, buckets, rows):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for view, row in sorted(rows.items()):
+        cumulative = 0
+        for bound, count in zip(buckets, row):
+            cumulative += count
+            lines.append(f'{name}_bucket{{view="{_label(view)}",le="{bound}"}} {cumulative}')
+        cumulative += row[len(buckets)]
+        lines.append(f'{name}_bucket{{view="{_label(view)}",le="+Inf"}} {cumulative}')
+        lines.append(f'{name}_sum{{view="{_label(view)}"}} {row[-1]}')
+        lines.append(f'{name}_count{{view="{_label(view)}"}} {cumulative}')
+
+
+def render_prometheus(merged):
+    lines = [
+        '# HELP http_requests_total Requests by URL name, method and status code.',
+        '# TYPE http_requests_total counter',
+    ]
+    for (view, method, status), value in sorted(merged['requests'].items()):
+        lines.append(f'http_requests_total{{view="{_label(view)}",method="{method}",status="{status}"}} {value}')
+    _render_histogram(lines, 'http_request_duration_seconds', 'Request latency by URL name.', LATENCY_BUCKETS, merged['latency'])
+    _render_histogram(lines, 'http_response_size_bytes', 'Response body size by URL name.', SIZE_BUCKETS, merged['response_size'])
+    lines.append('# HELP db_queries_total SQL statements executed by URL name.')
+    lines.append('# TYPE db_queries_total counter')
+    for view, value in sorted(merged['db_queries'].items()):
+        lines.append(f'db_queries_total{{view="{_label(view)}"}} {value}')
+    lines.append('# HELP db_query_duration_seconds_total Time spent in SQL by URL name.')
+    lines.append('# TYPE db_query_duration_seconds_total counter')
+    for view, value in sorted(merged['db_time'].items()):
+        lines.append(f'db_query_duration_seconds_total{{view="{_label(view)}"}} {value}')
+    for name, value in sorted(merged['extra'].items()):
+        lines.append(f'# TYPE {name} counter')
+        lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
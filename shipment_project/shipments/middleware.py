@@ -0,0 +1,181 @@
+import gzip
+import re
+import time
+import uuid
+import zlib
+
+from django.conf import settings
+from django.db import connection
+from django.utils.cache import patch_vary_headers
+
+from .log import request_context
+from .metrics import QueryCounter, registry
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class RequestContextMiddleware:
+    """Assigns a request id (or keeps a sane incoming X-Request-ID) for log records."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        incoming = request.headers.get('X-Request-ID', '')
+        request.request_id = incoming if _REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        token = request_context.set({'request_id': request.request_id, 'view': None, 'sampled': None})
+        try:
+            response = self.get_response(request)
+        finally:
+            request_context.reset(token)
+        response['X-Request-ID'] = request.request_id
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        request_context.get()['view'] = (match.url_name or match.view_name) if match else None
+
+
+class MetricsMiddleware:
+    """Records latency, SQL count/time, response size and status per URL name."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        size = None if response.streaming else len(response.content)
+        registry.observe(view, request.method, response.status_code, duration, size, queries.count, queries.duration)
+        registry.maybe_flush()
+        return response
+
+
+def _compression_settings():
+    return getattr(settings, 'COMPRESSION', {})
+
+
+def parse_accept_encoding(header):
+    """{coding: q} from an Accept-Encoding header; malformed q-values count as 0."""
+    codings = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def choose_encoding(header, available):
+    """Best coding in ``available`` (server preference order) the client accepts, or None.
+
+    An explicit q=0 rules a coding out even when '*' would allow it.
+    """
+    codings = parse_accept_encoding(header or '')
+    best, best_q = None, 0.0
+    for coding in available:
+        q = codings.get(coding, codings.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _gzip_stream(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _brotli_stream(chunks, level):
+    compressor = brotli.Compressor(quality=level)
+    for chunk in chunks:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def _codecs(conf):
+    codecs = {}
+    if brotli is not None and conf.get('BROTLI_LEVEL') is not None:
+        level = conf['BROTLI_LEVEL']
+        codecs['br'] = (lambda data: brotli.compress(data, quality=level), lambda chunks: _brotli_stream(chunks, level))
+    level = conf.get('GZIP_LEVEL', 6)
+    codecs['gzip'] = (lambda data: gzip.compress(data, compresslevel=level, mtime=0),
+                      lambda chunks: _gzip_stream(chunks, level))
+    return codecs
+
+
+class CompressionMiddleware:
+    """Compresses text-like responses with the best coding the client accepts.
+
+    Brotli is offered when the brotli package is installed and BROTLI_LEVEL is
+    set, gzip otherwise. Bodies under MIN_SIZE are sent as they are; streamed
+    responses (CSV exports) are compressed chunk by chunk.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        conf = _compression_settings()
+        if not conf.get('ENABLED', True) or response.status_code == 206 or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(tuple(conf.get('CONTENT_TYPES', ('application/json', 'text/')))):
+            return response
+        # The body now depends on the request's Accept-Encoding, whichever way this goes
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not response.streaming and len(response.content) < conf.get('MIN_SIZE', 1024):
+            return response
+        if getattr(response, 'is_async', False):
+            return response
+        codecs = _codecs(conf)
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'), list(codecs))
+        if encoding is None:
+            return response
+
+        compress, compress_stream = codecs[encoding]
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content)
+            del response['Content-Length']
+        else:
+            original = len(response.content)
+            compressed = compress(response.content)
+            if len(compressed) >= original:
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+            registry.inc('response_compressed_bytes_saved_total', original - len(compressed))
+        registry.inc('response_compressed_total')
+
+        # The representation changed, so a strong validator no longer matches its bytes
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
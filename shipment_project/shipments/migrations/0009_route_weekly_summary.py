@@ -0,0 +1,53 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0008_booking_delivery_email_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteSummaryDirtyWeek',
+            fields=[
+                ('week_start', models.DateField(primary_key=True, serialize=False)),
+                ('marked_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='booking_date',
+            field=models.DateField(auto_now_add=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='RouteWeeklySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_location', models.CharField(max_length=100)),
+                ('to_location', models.CharField(max_length=100)),
+                ('week_start', models.DateField()),
+                ('bookings', models.PositiveIntegerField(default=0)),
+                ('total_weight', models.FloatField(default=0)),
+                ('total_chargeable_weight', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_freight', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_gst', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('week_start', 'from_location', 'to_location'), name='route_summary_week_lane_uniq')],
+            },
+        ),
+        # Existing bookings: mark every booked week dirty so the first refresh builds the table
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO shipments_routesummarydirtyweek (week_start, marked_at)
+                SELECT DISTINCT date_trunc('week', booking_date)::date, now()
+                FROM shipments_booking
+                WHERE booking_date IS NOT NULL
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
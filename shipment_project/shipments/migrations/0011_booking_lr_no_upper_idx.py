@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:43
+
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build without locking out bookings on a large table
+    atomic = False
+
+    dependencies = [
+        ('shipments', '0010_revokedtoken'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='booking',
+            index=models.Index(django.db.models.functions.text.Upper('lr_no'), name='booking_lr_no_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0012_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Pincode',
+            fields=[
+                ('pincode', models.CharField(max_length=6, primary_key=True, serialize=False)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('district', models.CharField(blank=True, max_length=100)),
+                ('state', models.CharField(blank=True, max_length=100)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='pickup_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-19 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0013_pincode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='TransitTimeStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_location', models.CharField(max_length=100)),
+                ('to_location', models.CharField(max_length=100)),
+                ('service_type', models.CharField(max_length=50)),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('histogram', models.JSONField(default=list)),
+                ('median_days', models.PositiveSmallIntegerField()),
+                ('p90_days', models.PositiveSmallIntegerField()),
+                ('refreshed_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('from_location', 'to_location', 'service_type'), name='transit_stat_lane_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0014_transit_time_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='version',
+            field=models.PositiveIntegerField(db_default=1, default=1),
+        ),
+    ]
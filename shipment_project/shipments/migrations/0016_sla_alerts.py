@@ -0,0 +1,42 @@
+# Generated by Django 5.1.2 on 2026-10-19 14:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0015_booking_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlaAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('at_risk', 'At risk'), ('breached', 'Breached')], max_length=10)),
+                ('deadline', models.DateTimeField()),
+                ('priority', models.PositiveSmallIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='delivery_deadline',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('status', 'delivered'), _negated=True), fields=['status', 'delivery_deadline'], name='booking_status_deadline_idx'),
+        ),
+        migrations.AddField(
+            model_name='slaalert',
+            name='booking',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sla_alerts', to='shipments.booking'),
+        ),
+        migrations.AddConstraint(
+            model_name='slaalert',
+            constraint=models.UniqueConstraint(fields=('booking', 'kind', 'deadline'), name='sla_alert_booking_kind_deadline_uniq'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.2 on 2026-10-19 14:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0016_sla_alerts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TariffVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('effective_from', models.DateField(db_index=True)),
+                ('sgst_bp', models.PositiveIntegerField()),
+                ('cgst_bp', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RerateRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dry_run', models.BooleanField(default=False)),
+                ('booked_from', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('done', 'Done'), ('abandoned', 'Abandoned')], default='running', max_length=10)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('scanned', models.PositiveIntegerField(default=0)),
+                ('changed', models.PositiveIntegerField(default=0)),
+                ('unrated', models.PositiveIntegerField(default=0)),
+                ('freight_delta_paise', models.BigIntegerField(default=0)),
+                ('gst_delta_paise', models.BigIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('tariff', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='runs', to='shipments.tariffversion')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TariffRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_location', models.CharField(blank=True, max_length=100)),
+                ('to_location', models.CharField(blank=True, max_length=100)),
+                ('service_type', models.CharField(blank=True, max_length=50)),
+                ('base_paise', models.PositiveBigIntegerField(default=0)),
+                ('per_kg_paise', models.PositiveBigIntegerField(default=0)),
+                ('min_paise', models.PositiveBigIntegerField(default=0)),
+                ('tariff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rates', to='shipments.tariffversion')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('tariff', 'from_location', 'to_location', 'service_type'), name='tariff_rate_lane_uniq')],
+            },
+        ),
+    ]
@@ -1,9 +1,16 @@
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Upper
+from django.db.models.signals import post_save
 from decimal import Decimal
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
 import logging
 
+logger = logging.getLogger(__name__)
+
 class Shipment(models.Model):
     lr_no = models.CharField(max_length=20, unique=True)    
     tracking_number = models.CharField(max_length=50, unique=True)
@@ -59,9 +66,18 @@ class ShipmentDetails(models.Model):
         return f"Details for {self.shipment.tracking_number}"
 
 
+class BookingConflict(Exception):
+    """The booking was changed by another writer since it was read."""
+
+    def __init__(self, booking, expected_version):
+        super().__init__(f'Booking {booking.pk} is no longer at version {expected_version}')
+        self.booking = booking
+        self.expected_version = expected_version
+
+
 class Booking(models.Model):
     lr_no = models.CharField(max_length=20, unique=True, blank=True, null=True)  # Allow blank and null for auto-generation
-    booking_date = models.DateField(auto_now_add=True)  # Booking Date auto-populated on creation
+    booking_date = models.DateField(auto_now_add=True, db_index=True)  # Booking Date auto-populated on creation
     from_location = models.CharField(max_length=100)
     to_location = models.CharField(max_length=100)
     branch_from_phone = models.CharField(max_length=15)
@@ -85,35 +101,258 @@ class Booking(models.Model):
     weight = models.FloatField(blank=True, null=True)
     dimensions = models.CharField(max_length=50, blank=True, null=True)
     description = models.TextField(blank=True, null=True)
-    pickup_date = models.DateField(blank=True, null=True)
+    pickup_date = models.DateField(blank=True, null=True, db_index=True)  # dispatch plans load one day at a time
     pickup_time_window = models.CharField(max_length=50, blank=True, null=True)
     payment_method = models.CharField(max_length=50, blank=True, null=True)
     status = models.CharField(max_length=50, default='in-transit')
+    delivered_at = models.DateTimeField(blank=True, null=True, db_index=True)  # ETA stats learn from delivered_at - booking_date
     updates = models.JSONField(default=list)
     phone = models.CharField(max_length=15, blank=True, null=True)  # Add phone field to Booking model
     delivery_email = models.CharField(max_length=255, blank=True, null=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='bookings')
+    # Bumped by every write; guards update_if_current(). db_default covers raw INSERTs and COPY
+    version = models.PositiveIntegerField(default=1, db_default=1)
+    # Promised delivery time, set on creation from SLA_PROMISE_DAYS; watched by shipments.sla
+    delivery_deadline = models.DateTimeField(blank=True, null=True)
 
     def save(self, *args, **kwargs):
-        logger = logging.getLogger(__name__)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not self._state.adding:
+            # Narrow write: only the listed columns, plus whatever they derive
+            fields = set(update_fields) | {'version'}
+            if 'weight' in fields:
+                self.actual_weight = self.weight
+                fields.add('actual_weight')
+            if 'status' in fields and self.status == 'delivered' and self.delivered_at is None:
+                self.delivered_at = timezone.now()
+                fields.add('delivered_at')
+            self.version += 1
+            kwargs['update_fields'] = fields
+            super().save(*args, **kwargs)
+            return
 
+        if not self._state.adding:
+            self.version += 1
         if not self.lr_no:
             # Generate auto-incremental LR number based on the last record
             last_booking = Booking.objects.order_by('-id').first()
             last_lr_no = int(last_booking.lr_no) if last_booking and last_booking.lr_no else 0
             self.lr_no = str(last_lr_no + 1)  # Store only the numeric part
 
+        if self._state.adding and self.delivery_deadline is None:
+            service = (self.service_type or '').strip().lower()
+            days = settings.SLA_PROMISE_DAYS.get(service, settings.SLA_DEFAULT_PROMISE_DAYS)
+            self.delivery_deadline = timezone.now() + timedelta(days=days)
+
         # Input weight into actual_weight
         self.actual_weight = self.weight
 
-        logger.info(f"Booking saved with LR No: {self.lr_no}, From: {self.from_location}, To: {self.to_location}")
+        if self.status == 'delivered' and self.delivered_at is None:
+            self.delivered_at = timezone.now()
+
+        logger.info("Booking saved with LR No: %s, From: %s, To: %s", self.lr_no, self.from_location, self.to_location)
 
         super().save(*args, **kwargs)
 
+    def update_if_current(self, **changes):
+        """Write only ``changes``, and only if the row is still at ``self.version``.
+
+        A compare-and-swap: one UPDATE ... WHERE id = %s AND version = %s that
+        also bumps the version. Derived fields follow as in save(), unless
+        given (e.g. delivered_at from the scan's own time). Raises
+        BookingConflict when another writer got there first; the caller should
+        re-read and decide. Sends post_save so caches and summaries follow.
+        """
+        if 'weight' in changes:
+            changes['actual_weight'] = changes['weight']
+        if changes.get('status') == 'delivered' and self.delivered_at is None:
+            changes.setdefault('delivered_at', timezone.now())
+        updated = Booking.objects.filter(pk=self.pk, version=self.version).update(version=F('version') + 1, **changes)
+        if not updated:
+            raise BookingConflict(self, self.version)
+        for name, value in changes.items():
+            setattr(self, name, value)
+        self.version += 1
+        post_save.send(sender=Booking, instance=self, created=False, raw=False, using=self._state.db,
+                       update_fields=frozenset(changes) | {'version'})
+
+    class Meta:
+        indexes = [
+            # Tracking matches LR numbers case-insensitively (lr_no__iexact / UPPER(lr_no) IN ...)
+            models.Index(Upper('lr_no'), name='booking_lr_no_upper_idx'),
+            # SLA checks read open bookings by deadline; delivered ones (most of the table) stay out
+            models.Index(fields=['status', 'delivery_deadline'], name='booking_status_deadline_idx',
+                         condition=~Q(status='delivered')),
+        ]
+
     def __str__(self):
         return f"LR No. {self.lr_no} - {self.from_location} to {self.to_location}"
 
 
+class RouteWeeklySummary(models.Model):
+    # Materialized lane report: one row per from_location -> to_location per week (Monday)
+    from_location = models.CharField(max_length=100)
+    to_location = models.CharField(max_length=100)
+    week_start = models.DateField()
+    bookings = models.PositiveIntegerField(default=0)
+    total_weight = models.FloatField(default=0)
+    total_chargeable_weight = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_freight = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_gst = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['week_start', 'from_location', 'to_location'], name='route_summary_week_lane_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.from_location} -> {self.to_location} ({self.week_start})"
+
+
+class RouteSummaryDirtyWeek(models.Model):
+    # Weeks touched by booking writes since the last route summary refresh
+    week_start = models.DateField(primary_key=True)
+    marked_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return str(self.week_start)
+
+
+class SlaAlert(models.Model):
+    # One row per booking, kind and deadline, so detect_sla_breaches alerts once rather than every run
+    KINDS = (('at_risk', 'At risk'), ('breached', 'Breached'))
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='sla_alerts')
+    kind = models.CharField(max_length=10, choices=KINDS)
+    deadline = models.DateTimeField()
+    priority = models.PositiveSmallIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['booking', 'kind', 'deadline'], name='sla_alert_booking_kind_deadline_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.booking_id} ({self.deadline})"
+
+
+class RevokedToken(models.Model):
+    # Revoked refresh tokens; rows are useless once the token would have expired anyway
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+class Pincode(models.Model):
+    # Post office pincode centroids for pickup routing; loaded with load_pincodes
+    pincode = models.CharField(max_length=6, primary_key=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    district = models.CharField(max_length=100, blank=True)
+    state = models.CharField(max_length=100, blank=True)
+
+    def __str__(self):
+        return self.pincode
+
+
+class IdempotencyKey(models.Model):
+    # Stored response for an Idempotency-Key; status_code/response_body are set before commit
+    scope = models.CharField(max_length=64)  # view name + user id
+    key = models.CharField(max_length=100)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='idempotency_scope_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
+
+
+class TransitTimeStat(models.Model):
+    # Delivered transit-time histogram per lane and service; blank keys are the origin-hub
+    # ('' to/service) and global ('' everywhere) fallbacks. Rebuilt by refresh_transit_times.
+    from_location = models.CharField(max_length=100)
+    to_location = models.CharField(max_length=100)
+    service_type = models.CharField(max_length=50)
+    samples = models.PositiveIntegerField(default=0)
+    histogram = models.JSONField(default=list)  # bookings delivered after 0, 1, 2 ... days
+    median_days = models.PositiveSmallIntegerField()
+    p90_days = models.PositiveSmallIntegerField()
+    refreshed_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['from_location', 'to_location', 'service_type'], name='transit_stat_lane_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.from_location or '*'} -> {self.to_location or '*'} ({self.service_type or '*'})"
+
+
+class TariffVersion(models.Model):
+    # A rate card. Rates are per lane and service; GST is in basis points (900 = 9%).
+    # rerate_bookings applies one to open, unbilled bookings.
+    name = models.CharField(max_length=100)
+    effective_from = models.DateField(db_index=True)
+    sgst_bp = models.PositiveIntegerField()
+    cgst_bp = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} (from {self.effective_from})"
+
+
+class TariffRate(models.Model):
+    # Freight = max(min_paise, base_paise + per_kg_paise x chargeable kg). Blank locations or
+    # service match anything; the most specific rate for a booking wins (see shipments.tariffs).
+    tariff = models.ForeignKey(TariffVersion, on_delete=models.CASCADE, related_name='rates')
+    from_location = models.CharField(max_length=100, blank=True)
+    to_location = models.CharField(max_length=100, blank=True)
+    service_type = models.CharField(max_length=50, blank=True)
+    base_paise = models.PositiveBigIntegerField(default=0)
+    per_kg_paise = models.PositiveBigIntegerField(default=0)
+    min_paise = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tariff', 'from_location', 'to_location', 'service_type'],
+                                    name='tariff_rate_lane_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.from_location or '*'} -> {self.to_location or '*'} ({self.service_type or '*'})"
+
+
+class RerateRun(models.Model):
+    # Progress of one rerate_bookings run; last_id moves with each committed batch so an
+    # interrupted run resumes where it stopped
+    STATUSES = (('running', 'Running'), ('done', 'Done'), ('abandoned', 'Abandoned'))
+    tariff = models.ForeignKey(TariffVersion, on_delete=models.PROTECT, related_name='runs')
+    dry_run = models.BooleanField(default=False)
+    booked_from = models.DateField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default='running')
+    last_id = models.BigIntegerField(default=0)
+    scanned = models.PositiveIntegerField(default=0)
+    changed = models.PositiveIntegerField(default=0)
+    unrated = models.PositiveIntegerField(default=0)  # no rate matched; left as they were
+    freight_delta_paise = models.BigIntegerField(default=0)
+    gst_delta_paise = models.BigIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Re-rate {self.pk} with {self.tariff} ({self.status})"
+
+
 class CustomUser(AbstractUser):
     USER_TYPES = (
         ('admin', 'Admin'),
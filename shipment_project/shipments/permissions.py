@@ -0,0 +1,19 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsAdminUserType(BasePermission):
+    # Matches the frontend's AdminRoute check (user_type == 'admin') plus Django staff
+    def has_permission(self, request, view):
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        return bool(getattr(user, 'is_staff', False) or getattr(user, 'user_type', None) == 'admin')
+
+
+class IsHubStaff(BasePermission):
+    # Branch agents scan consignments at hubs; admins and Django staff may too
+    def has_permission(self, request, view):
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        return bool(getattr(user, 'is_staff', False) or getattr(user, 'user_type', None) in ('admin', 'agent'))
@@ -0,0 +1,303 @@
+"""Opt-in request profiling.
+
+With PROFILING['ENABLED'] set, ProfilingMiddleware profiles a request when a
+staff user sends ``X-Profile: 1`` or when it falls in the SAMPLE_RATE
+fraction. Each profile records either cProfile stats or periodic stack
+samples (MODE 'sample', much cheaper on long requests), plus every SQL
+statement with its time. It is written to PROFILING['DIR'] as
+<stamp>-<request id>.json (and .prof for cProfile, loadable by pstats and
+snakeviz). Only the newest KEEP profiles are kept. When profiling is
+disabled the middleware removes itself from the stack at startup.
+"""
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils import timezone
+
+from .metrics import registry
+
+PROFILE_HEADER = 'X-Profile'
+_NAME = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9]{6}-[A-Za-z0-9._-]{1,64}$')
+_NUMBERS = re.compile(r"\b\d+\b|'(?:[^']|'')*'")
+
+
+def profiling_settings():
+    return getattr(settings, 'PROFILING', {})
+
+
+def profile_dir():
+    return Path(profiling_settings().get('DIR') or Path(settings.BASE_DIR) / 'profiles')
+
+
+def _is_staff(request):
+    # Runs before DRF authentication: accept a staff session or a staff bearer token
+    from .authentication import ClaimsJWTAuthentication
+
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return bool(user.is_staff or getattr(user, 'user_type', None) == 'admin')
+    try:
+        authenticated = ClaimsJWTAuthentication().authenticate(request)
+    except Exception:
+        return False
+    if authenticated is None:
+        return False
+    user = authenticated[0]
+    return bool(user.is_staff or user.user_type == 'admin')
+
+
+class SqlRecorder:
+    """execute_wrapper that keeps each statement's SQL and time (up to MAX_QUERIES)."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.queries = []
+        self.dropped = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if len(self.queries) < self.limit:
+                self.queries.append((sql, time.perf_counter() - start))
+            else:
+                self.dropped += 1
+
+
+class StackSampler:
+    """Samples one thread's Python stack every ``interval`` seconds from a helper thread."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = Counter()
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def enable(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_filename}:{code.co_firstlineno}({code.co_name})')
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+
+class RequestProfile:
+    def __init__(self, request, conf):
+        self.request = request
+        self.conf = conf
+        self.mode = conf.get('MODE', 'cprofile')
+        if self.mode == 'sample':
+            self.profiler = StackSampler(conf.get('SAMPLE_INTERVAL', 0.005))
+        else:
+            self.profiler = cProfile.Profile()
+        self.sql = SqlRecorder(conf.get('MAX_QUERIES', 2000))
+        self.started = timezone.now()
+        self.elapsed = 0.0
+
+    def run(self, fn, *args):
+        start = time.perf_counter()
+        self.profiler.enable()
+        try:
+            with connection.execute_wrapper(self.sql):
+                return fn(*args)
+        finally:
+            self.profiler.disable()
+            self.elapsed += time.perf_counter() - start
+
+    def wrap_stream(self, response, chunks):
+        # Streamed bodies (consignment notes) do their work after the view returns
+        sentinel = object()
+        try:
+            while True:
+                chunk = self.run(next, chunks, sentinel)
+                if chunk is sentinel:
+                    break
+                yield chunk
+        finally:
+            self.save(response)
+
+    def save(self, response):
+        match = self.request.resolver_match
+        meta = {
+            'name': None,
+            'path': self.request.path,
+            'method': self.request.method,
+            'view': (match.url_name or match.view_name) if match else None,
+            'status': response.status_code,
+            'request_id': getattr(self.request, 'request_id', None),
+            'started': self.started.isoformat(),
+            'duration_ms': round(self.elapsed * 1000, 2),
+            'mode': self.mode,
+            'sql': [{'sql': sql, 'ms': round(seconds * 1000, 3)} for sql, seconds in self.sql.queries],
+            'sql_dropped': self.sql.dropped,
+        }
+        if self.mode == 'sample':
+            meta['samples'] = [{'stack': list(stack), 'count': n} for stack, n in self.profiler.samples.most_common()]
+        try:
+            name = write_profile(meta, self.profiler if self.mode != 'sample' else None)
+        except OSError:
+            registry.inc('profiles_failed_total')
+            return None
+        registry.inc('profiles_captured_total')
+        return name
+
+
+def write_profile(meta, profiler=None):
+    """Write one profile into the ring directory, then drop the oldest beyond KEEP."""
+    root = profile_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%dT%H%M%S-%f')
+    request_id = meta.get('request_id') or os.urandom(6).hex()
+    name = f"{stamp}-{re.sub(r'[^A-Za-z0-9._-]', '', request_id)[:64]}"
+    meta['name'] = name
+    if profiler is not None:
+        profiler.create_stats()
+        with open(root / f'{name}.prof', 'wb') as out:
+            marshal.dump(profiler.stats, out)
+    # Written last and renamed into place: a .json file means the profile is complete
+    tmp = root / f'.{name}.json.tmp'
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, root / f'{name}.json')
+
+    keep = profiling_settings().get('KEEP', 50)
+    for old in sorted(root.glob('*.json'))[:-keep or None]:
+        for path in (old, old.with_suffix('.prof')):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass  # another worker pruned it first
+    return name
+
+
+def list_profiles():
+    """Summaries of the stored profiles, newest first."""
+    summaries = []
+    for path in sorted(profile_dir().glob('*.json'), reverse=True):
+        try:
+            meta = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue  # pruned or being replaced
+        summaries.append({
+            'name': meta['name'], 'path': meta['path'], 'method': meta['method'], 'view': meta['view'],
+            'status': meta['status'], 'started': meta['started'], 'duration_ms': meta['duration_ms'],
+            'mode': meta['mode'], 'queries': len(meta['sql']) + meta['sql_dropped'],
+            'query_ms': round(sum(q['ms'] for q in meta['sql']), 2),
+        })
+    return summaries
+
+
+def _top_functions_cprofile(path, limit):
+    stats = pstats.Stats(str(path), stream=io.StringIO())
+    rows = []
+    for (filename, line, name), (calls, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': f'{filename}:{line}({name})', 'calls': ncalls, 'primitive_calls': calls,
+            'self_ms': round(tottime * 1000, 3), 'cumulative_ms': round(cumtime * 1000, 3),
+        })
+    return sorted(rows, key=lambda r: r['cumulative_ms'], reverse=True)[:limit]
+
+
+def _top_functions_sampled(samples, limit):
+    total = sum(s['count'] for s in samples) or 1
+    own, inclusive = Counter(), Counter()
+    for sample in samples:
+        own[sample['stack'][-1]] += sample['count']
+        for function in set(sample['stack']):
+            inclusive[function] += sample['count']
+    return [
+        {'function': function, 'samples': n, 'self_pct': round(100 * own[function] / total, 1),
+         'cumulative_pct': round(100 * n / total, 1)}
+        for function, n in inclusive.most_common(limit)
+    ]
+
+
+def profile_report(name, limit=40):
+    """Top functions and SQL (grouped by statement shape) for one profile; None if it is gone."""
+    if not _NAME.match(name):
+        return None
+    root = profile_dir()
+    try:
+        meta = json.loads((root / f'{name}.json').read_text())
+    except (OSError, ValueError):
+        return None
+    if meta['mode'] == 'sample':
+        functions = _top_functions_sampled(meta.get('samples', []), limit)
+    else:
+        try:
+            functions = _top_functions_cprofile(root / f'{name}.prof', limit)
+        except (OSError, EOFError, ValueError):
+            functions = []
+    grouped = {}
+    for query in meta['sql']:
+        # Literal values differ between otherwise identical statements (N+1 loops)
+        shape = _NUMBERS.sub('?', query['sql'])
+        entry = grouped.setdefault(shape, {'sql': shape, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        entry['count'] += 1
+        entry['total_ms'] = round(entry['total_ms'] + query['ms'], 3)
+        entry['max_ms'] = max(entry['max_ms'], query['ms'])
+    summary = {k: meta[k] for k in ('name', 'path', 'method', 'view', 'status', 'started', 'duration_ms', 'mode')}
+    return {
+        **summary,
+        'queries': len(meta['sql']) + meta['sql_dropped'],
+        'query_ms': round(sum(q['ms'] for q in meta['sql']), 2),
+        'functions': functions,
+        'sql': sorted(grouped.values(), key=lambda q: q['total_ms'], reverse=True)[:limit],
+    }
+
+
+class ProfilingMiddleware:
+    """Profiles staff requests that ask for it (X-Profile: 1) and a random SAMPLE_RATE of the rest."""
+
+    def __init__(self, get_response):
+        if not profiling_settings().get('ENABLED', False):
+            raise MiddlewareNotUsed('PROFILING is disabled')
+        self.get_response = get_response
+
+    def __call__(self, request):
+        conf = profiling_settings()
+        wanted = request.headers.get(PROFILE_HEADER) == '1' and _is_staff(request)
+        if not wanted and not random.random() < conf.get('SAMPLE_RATE', 0.0):
+            return self.get_response(request)
+
+        profile = RequestProfile(request, conf)
+        response = profile.run(self.get_response, request)
+        if response.streaming:
+            # Saved once the body has been sent; find it by the X-Request-ID in its name
+            response.streaming_content = profile.wrap_stream(response, iter(response.streaming_content))
+        else:
+            name = profile.save(response)
+            if wanted and name:
+                response['X-Profile-Name'] = name
+        return response
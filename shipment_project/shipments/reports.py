@@ -0,0 +1,176 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Max, Min, Sum, Value
+from django.db.models.functions import Coalesce, TruncWeek
+
+from .models import Booking, RouteSummaryDirtyWeek, RouteWeeklySummary
+
+# Arbitrary key for pg_try_advisory_xact_lock so only one worker refreshes at a time
+ROUTE_SUMMARY_LOCK_ID = 260026
+
+ROUTE_REPORT_ORDERING = {
+    'freight': 'freight',
+    'bookings': 'bookings',
+    'weight': 'weight',
+    'gst': 'gst',
+}
+
+
+def week_start(day):
+    # Report buckets are ISO weeks starting on Monday, same as Postgres date_trunc('week')
+    return day - timedelta(days=day.weekday())
+
+
+def mark_weeks_dirty(dates):
+    weeks = {week_start(d) for d in dates if d}
+    if weeks:
+        RouteSummaryDirtyWeek.objects.bulk_create(
+            [RouteSummaryDirtyWeek(week_start=w) for w in weeks],
+            ignore_conflicts=True,
+        )
+
+
+def mark_all_weeks_dirty():
+    bounds = Booking.objects.aggregate(first=Min('booking_date'), last=Max('booking_date'))
+    if not bounds['first']:
+        return 0
+    weeks = []
+    current = week_start(bounds['first'])
+    while current <= bounds['last']:
+        weeks.append(current)
+        current += timedelta(days=7)
+    mark_weeks_dirty(weeks)
+    return len(weeks)
+
+
+def _contiguous_runs(weeks):
+    # Group sorted week starts into [first, last] runs so each run is one index range scan
+    runs = []
+    for week in sorted(weeks):
+        if runs and week - runs[-1][1] == timedelta(days=7):
+            runs[-1][1] = week
+        else:
+            runs.append([week, week])
+    return runs
+
+
+def _aggregate_weeks(first_week, last_week):
+    money = DecimalField(max_digits=16, decimal_places=2)
+    return (
+        Booking.objects
+        .filter(booking_date__gte=first_week, booking_date__lt=last_week + timedelta(days=7))
+        .order_by()
+        .annotate(week=TruncWeek('booking_date'))
+        .values('from_location', 'to_location', 'week')
+        .annotate(
+            n=Count('id'),
+            weight_sum=Coalesce(Sum('weight'), Value(0.0)),
+            chargeable_sum=Coalesce(Sum('chargeable_weight'), Value(Decimal('0')), output_field=money),
+            freight_sum=Coalesce(Sum('freight'), Value(Decimal('0')), output_field=money),
+            gst_sum=Coalesce(
+                Sum(Coalesce(F('sgst'), Value(Decimal('0'))) + Coalesce(F('cgst'), Value(Decimal('0'))), output_field=money),
+                Value(Decimal('0')),
+                output_field=money,
+            ),
+        )
+    )
+
+
+def refresh_route_summary(full=False, wait=False, max_weeks=None):
+    """Recompute the summary rows for weeks marked dirty since the last refresh.
+
+    ``max_weeks`` claims only that many dirty weeks, latest first, and leaves
+    the rest marked for the next call. Returns the number of weeks recomputed,
+    or None when another worker holds the refresh lock and ``wait`` is False.
+    """
+    if full:
+        mark_all_weeks_dirty()
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            if wait:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [ROUTE_SUMMARY_LOCK_ID])
+            else:
+                cursor.execute('SELECT pg_try_advisory_xact_lock(%s)', [ROUTE_SUMMARY_LOCK_ID])
+                if not cursor.fetchone()[0]:
+                    return None
+            # Claim the dirty weeks; marks written after this point stay for the next run
+            table = RouteSummaryDirtyWeek._meta.db_table
+            if max_weeks:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE week_start IN '
+                    f'(SELECT week_start FROM {table} ORDER BY week_start DESC LIMIT %s) RETURNING week_start',
+                    [max_weeks],
+                )
+            else:
+                cursor.execute(f'DELETE FROM {table} RETURNING week_start')
+            weeks = [row[0] for row in cursor.fetchall()]
+
+        if not weeks:
+            return 0
+
+        RouteWeeklySummary.objects.filter(week_start__in=weeks).delete()
+        for first_week, last_week in _contiguous_runs(weeks):
+            rows = [
+                RouteWeeklySummary(
+                    from_location=row['from_location'],
+                    to_location=row['to_location'],
+                    week_start=row['week'],
+                    bookings=row['n'],
+                    total_weight=row['weight_sum'],
+                    total_chargeable_weight=row['chargeable_sum'],
+                    total_freight=row['freight_sum'],
+                    total_gst=row['gst_sum'],
+                )
+                for row in _aggregate_weeks(first_week, last_week).iterator(chunk_size=5000)
+            ]
+            RouteWeeklySummary.objects.bulk_create(rows, batch_size=5000)
+    return len(weeks)
+
+
+def route_report(start_date=None, end_date=None, top=20, order_by='freight'):
+    summaries = RouteWeeklySummary.objects.all()
+    if start_date:
+        summaries = summaries.filter(week_start__gte=week_start(start_date))
+    if end_date:
+        summaries = summaries.filter(week_start__lte=end_date)
+
+    ordering = ROUTE_REPORT_ORDERING.get(order_by, 'freight')
+    lanes = list(
+        summaries
+        .values('from_location', 'to_location')
+        .annotate(
+            bookings=Sum('bookings'),
+            weight=Sum('total_weight'),
+            chargeable_weight=Sum('total_chargeable_weight'),
+            freight=Sum('total_freight'),
+            gst=Sum('total_gst'),
+        )
+        .order_by(f'-{ordering}', 'from_location', 'to_location')[:top]
+    )
+    if not lanes:
+        return []
+
+    # Weekly breakdown only for the lanes that made the top-N cut
+    by_lane = {(lane['from_location'], lane['to_location']): lane for lane in lanes}
+    for lane in lanes:
+        lane['weeks'] = []
+    weekly = (
+        summaries
+        .filter(from_location__in={k[0] for k in by_lane}, to_location__in={k[1] for k in by_lane})
+        .order_by('week_start')
+        .values('from_location', 'to_location', 'week_start', 'bookings', 'total_weight', 'total_freight', 'total_gst')
+    )
+    for row in weekly:
+        lane = by_lane.get((row['from_location'], row['to_location']))
+        if lane is not None:
+            lane['weeks'].append({
+                'week_start': row['week_start'].isoformat(),
+                'bookings': row['bookings'],
+                'weight': row['total_weight'],
+                'freight': row['total_freight'],
+                'gst': row['total_gst'],
+            })
+    return lanes
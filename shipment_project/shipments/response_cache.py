@@ -0,0 +1,157 @@
+"""Per-process cache of rendered booking list responses.
+
+Entries are keyed on view, user, normalised query string, negotiated media
+type and a data version. The versions are counters in the shared Django cache:
+one per user, bumped by every write to that user's bookings, and a global one
+bumped by every booking write. Views whose data spans all users (and admins)
+use the global version. A write never deletes entries; it changes the key, and
+old entries fall off the LRU end.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+from .eta import eta_table
+from .metrics import registry
+
+GLOBAL_VERSION_KEY = 'bookings:version'
+
+
+def _user_version_key(user_id):
+    return f'bookings:version:user:{user_id}'
+
+
+def _cache_settings():
+    return getattr(settings, 'RESPONSE_CACHE', {})
+
+
+def _incr_versions(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Unknown or evicted: restart from a fresh value so no old key can come back
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump_booking_version(user_ids=()):
+    """Invalidate cached lists for these users and every global (all-bookings) list.
+
+    Inside a transaction the bump waits for the commit: bumped any earlier, a
+    list read in between would cache the old rows under the new version, to
+    be served until the next write.
+    """
+    keys = [GLOBAL_VERSION_KEY] + [_user_version_key(u) for u in set(user_ids) if u is not None]
+    transaction.on_commit(lambda: _incr_versions(keys))
+
+
+def _versions(user_id, global_data):
+    keys = [GLOBAL_VERSION_KEY] if global_data else [_user_version_key(user_id)]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return ':'.join(str(found[k]) for k in keys)
+
+
+class ResponseCache:
+    """LRU of rendered responses bounded by entry count and total bytes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, content, content_type):
+        options = _cache_settings()
+        max_bytes = options.get('MAX_BYTES', 64 * 1024 * 1024)
+        if len(content) > max_bytes // 8:
+            return  # one huge page would push out everything else
+        with self._lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[0])
+            self.entries[key] = (content, content_type)
+            self.size += len(content)
+            evicted = 0
+            while len(self.entries) > options.get('MAX_ENTRIES', 2000) or self.size > max_bytes:
+                _, (old_content, _) = self.entries.popitem(last=False)
+                self.size -= len(old_content)
+                evicted += 1
+        if evicted:
+            registry.inc('response_cache_evictions_total', evicted)
+
+
+response_cache = ResponseCache()
+
+
+def _normalised_query(request):
+    # Order-insensitive and blind to empty parameters, so ?a=1&b= and ?a=1 share an entry
+    items = sorted((k, v) for k in request.query_params for v in request.query_params.getlist(k) if v != '')
+    return urlencode(items)
+
+
+def cache_booking_list(global_data=False):
+    """Cache a DRF GET handler's rendered 200 responses (apply under @api_view, or to a view method).
+
+    ``global_data`` marks views that return every user's bookings; those key on
+    the global version, as does any admin caller.
+    """
+
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            # Works for function views (request, ...) and methods (self, request, ...)
+            view = args[0] if not hasattr(args[0], 'query_params') else None
+            request = args[1] if view is not None else args[0]
+            if not _cache_settings().get('ENABLED', True) or request.method != 'GET':
+                return handler(*args, **kwargs)
+
+            user = request.user
+            user_id = user.id if user.is_authenticated else None
+            is_admin = getattr(user, 'user_type', None) == 'admin'
+            eta_table.sync()  # ETAs are part of the payload
+            key = (
+                handler.__qualname__, user_id, _versions(user_id, global_data or is_admin or user_id is None),
+                str(eta_table.version), request.accepted_media_type, request.get_host(), _normalised_query(request),
+            )
+            entry = response_cache.get(key)
+            if entry is not None:
+                registry.inc('response_cache_hits_total')
+                response = HttpResponse(entry[0], content_type=entry[1])
+                response['X-Cache'] = 'HIT'
+                return response
+
+            registry.inc('response_cache_misses_total')
+            response = handler(*args, **kwargs)
+            if response.status_code == 200 and hasattr(response, 'render'):
+                # Render here (finalize_response would do the same) so the bytes can be kept
+                response.accepted_renderer = request.accepted_renderer
+                response.accepted_media_type = request.accepted_media_type
+                response.renderer_context = {'request': request, 'view': view or getattr(request, 'parser_context', {}).get('view')}
+                response.render()
+                response_cache.put(key, response.content, response['Content-Type'])
+                response['X-Cache'] = 'MISS'
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,145 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import RevokedToken
+
+
+_MASK64 = (1 << 64) - 1
+
+
+def _hash_pair(key):
+    digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+
+class BloomFilter:
+    """Bit-packed Bloom filter with double hashing (Kirsch-Mitzenmacher)."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(int(capacity), 1)
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    def _positions(self, key):
+        h1, h2 = _hash_pair(key)
+        # wrap at 64 bits exactly like the uint64 maths in add_many
+        return [((h1 + i * h2) & _MASK64) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def add_many(self, keys):
+        pairs = np.array([_hash_pair(k) for k in keys], dtype=np.uint64).reshape(-1, 2)
+        if not len(pairs):
+            return
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        positions = ((pairs[:, :1] + steps * pairs[:, 1:]) % np.uint64(self.size)).ravel()
+        np.bitwise_or.at(self.bits, (positions >> np.uint64(3)).astype(np.int64),
+                         (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)))
+        self.count += len(pairs)
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class RevocationStore:
+    """Revoked refresh-token jtis: a per-process Bloom filter in front of RevokedToken.
+
+    A miss in the filter means "not revoked" without touching the database; a hit
+    is confirmed with an indexed lookup. Each process pulls rows added by other
+    workers at most every REVOCATION_SYNC_INTERVAL seconds and rebuilds the filter
+    from scratch periodically so expired jtis drop out.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.bloom = None
+        self.recent = set()     # jtis already folded in from the current lookback window
+        self.synced_from = None  # wall-clock start of the last sync
+        self.synced_at = 0.0
+        self.built_at = 0.0
+
+    def _rebuild(self, started):
+        jtis = list(
+            RevokedToken.objects.filter(expires_at__gt=started).values_list('jti', flat=True).iterator(chunk_size=50000)
+        )
+        capacity = max(getattr(settings, 'REVOCATION_BLOOM_CAPACITY', 100000), 2 * len(jtis))
+        bloom = BloomFilter(capacity, getattr(settings, 'REVOCATION_BLOOM_ERROR_RATE', 0.01))
+        bloom.add_many(jtis)
+        self.bloom = bloom
+        self.recent = set()
+        self.built_at = time.monotonic()
+
+    def _catch_up(self, started):
+        # Look back a little past the previous sync: ids are handed out before commit,
+        # so a row can become visible after later ones. Timestamps plus the recent set
+        # catch those without double counting.
+        lookback = timedelta(seconds=getattr(settings, 'REVOCATION_SYNC_LOOKBACK', 30))
+        rows = set(RevokedToken.objects.filter(revoked_at__gte=self.synced_from - lookback).values_list('jti', flat=True))
+        fresh = rows - self.recent
+        if fresh:
+            self.bloom.add_many(list(fresh))
+        self.recent = rows
+
+    def sync(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.synced_at < getattr(settings, 'REVOCATION_SYNC_INTERVAL', 1.0):
+            return
+        with self._lock:
+            started = timezone.now()
+            rebuild_every = getattr(settings, 'REVOCATION_REBUILD_INTERVAL', 3600)
+            if self.bloom is None or now - self.built_at > rebuild_every or self.bloom.count > self.bloom.capacity:
+                self._rebuild(started)
+            else:
+                self._catch_up(started)
+            self.synced_from = started
+            self.synced_at = now
+
+    def is_revoked(self, jti):
+        self.sync()
+        if jti not in self.bloom:
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def revoke(self, jti, expires_at):
+        """Record a revocation. Returns False if the jti was already revoked."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {RevokedToken._meta.db_table} (jti, expires_at, revoked_at) '
+                f'VALUES (%s, %s, %s) ON CONFLICT (jti) DO NOTHING RETURNING id',
+                [jti, expires_at, timezone.now()],
+            )
+            inserted = cursor.fetchone() is not None
+        if self.bloom is not None:
+            self.bloom.add(jti)
+        return inserted
+
+
+revocations = RevocationStore()
+
+
+def prune_expired(batch_size=10000):
+    """Delete expired revocations in batches; returns the number of rows removed."""
+    removed = 0
+    while True:
+        ids = list(RevokedToken.objects.filter(expires_at__lte=timezone.now()).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return removed
+        removed += RevokedToken.objects.filter(id__in=ids).delete()[0]
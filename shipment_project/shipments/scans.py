@@ -0,0 +1,90 @@
+"""Bulk status changes from hub scans.
+
+When a truck is unloaded every consignment on it changes status at once.
+apply_status_updates() sets the status and appends the scans to each
+booking's updates history with a single UPDATE ... FROM (VALUES ...), rather
+than a SELECT and a full-row save() per LR.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import fastjson
+from .models import Booking
+from .reports import mark_weeks_dirty
+from .response_cache import bump_booking_version
+
+# Same shape as the timestamps already stored in Booking.updates (local time, no offset)
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def scan_timestamp(value):
+    """Local 'YYYY-MM-DDTHH:MM:SS' for an ISO 8601 scan time (naive means local); now when empty.
+
+    Raises ValueError for anything else.
+    """
+    if not value:
+        return timezone.localtime().strftime(TIMESTAMP_FORMAT)
+    moment = parse_datetime(str(value))
+    if moment is None:
+        raise ValueError(f'Invalid timestamp: {value!r}')
+    if timezone.is_aware(moment):
+        moment = timezone.localtime(moment)
+    return moment.strftime(TIMESTAMP_FORMAT)
+
+
+def scan_datetime(timestamp):
+    """The aware datetime for a timestamp from scan_timestamp(), e.g. to stamp delivered_at."""
+    return timezone.make_aware(datetime.strptime(timestamp, TIMESTAMP_FORMAT))
+
+
+def apply_status_updates(scans):
+    """Apply validated scans: dicts of lr_no, status, location and timestamp.
+
+    LR numbers match case-insensitively, as tracking does. Several scans for
+    one LR are appended in the order given and the last one sets the status.
+    Returns ({booking lr_no: new status}, [lr_no as sent that matched nothing]).
+    """
+    history = {}
+    sent_as = {}
+    for scan in scans:
+        key = scan['lr_no'].strip().upper()
+        sent_as.setdefault(key, scan['lr_no'])
+        history.setdefault(key, []).append(
+            {'status': scan['status'], 'location': scan['location'], 'timestamp': scan['timestamp']}
+        )
+    if not history:
+        return {}, []
+
+    table = Booking._meta.db_table
+    values = ', '.join(['(%s, %s, %s::jsonb, %s::timestamp)'] * len(history))
+    params = [settings.TIME_ZONE]
+    for key, entries in history.items():
+        params += [key, entries[-1]['status'], fastjson.dumps(entries).decode(), entries[-1]['timestamp']]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {table} b SET
+                status = v.status,
+                version = b.version + 1,
+                updates = CASE WHEN jsonb_typeof(b.updates) = 'array' THEN b.updates ELSE '[]'::jsonb END || v.history,
+                -- Stamped once, at the delivering scan's (local) time, as backfill_delivered_at() reads
+                -- it from the history; the ETA stats learn from it
+                delivered_at = CASE WHEN v.status = 'delivered' THEN COALESCE(b.delivered_at, v.ts AT TIME ZONE %s)
+                                    ELSE b.delivered_at END
+            FROM (VALUES {values}) AS v(lr_key, status, history, ts)
+            WHERE UPPER(b.lr_no) = v.lr_key
+            RETURNING b.lr_no, UPPER(b.lr_no), v.status, b.user_id, b.booking_date
+            """,
+            params,
+        )
+        rows = cursor.fetchall()
+
+    # What the post_save signal would have done, once for the whole batch
+    mark_weeks_dirty({row[4] for row in rows})
+    bump_booking_version({row[3] for row in rows})
+    matched = {row[1] for row in rows}
+    return {row[0]: row[2] for row in rows}, [sent_as[key] for key in history if key not in matched]
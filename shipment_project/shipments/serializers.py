@@ -1,7 +1,13 @@
+from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .authentication import ClaimsRefreshToken
+from .eta import eta_table
 from .models import Booking, Shipment
+from .revocation import revocations
 import uuid
-from datetime import timedelta
+from datetime import datetime, timezone
 
 class AddressSerializer(serializers.Serializer):
     # Allow any values for address fields by making them optional and removing validation constraints
@@ -31,18 +37,27 @@ class BookingSerializer(serializers.ModelSerializer):
     branch_to_phone = serializers.CharField(max_length=15, allow_blank=True, required=False)
     phone = serializers.CharField(max_length=15, required=False)  # Make phone optional
     estimated_delivery = serializers.SerializerMethodField()
+    estimated_delivery_latest = serializers.SerializerMethodField()
 
     class Meta:
         model = Booking
         fields = '__all__'
+        # The owner comes from the authenticated request, never from the payload;
+        # version only moves on writes (see Booking.update_if_current); the deadline follows
+        # from the service type (SLA_PROMISE_DAYS)
+        read_only_fields = ['user', 'version', 'delivery_deadline']
         # If you want to explicitly add estimated_delivery:
         # fields = [ ...all your fields..., 'estimated_delivery']
 
     def get_estimated_delivery(self, obj):
-        # Example: 3 days after booking_date
-        if obj.booking_date:
-            return (obj.booking_date + timedelta(days=3)).isoformat()
-        return None
+        # Median transit time for the lane (in-memory lookup table, see shipments.eta)
+        expected, _, _ = eta_table.estimate(obj)
+        return expected.isoformat() if expected else None
+
+    def get_estimated_delivery_latest(self, obj):
+        # 90th percentile: nine in ten deliveries on this lane arrive by then
+        _, latest, _ = eta_table.estimate(obj)
+        return latest.isoformat() if latest else None
 
     def validate_pickup_address(self, value):
         required_fields = ['name', 'address', 'city', 'zip', 'country', 'phone']
@@ -79,3 +94,32 @@ class ShipmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Shipment
         fields = '__all__'
+
+
+class TokenRefreshSerializer(serializers.Serializer):
+    # Replaces simplejwt's refresh serializer: rotation revokes the old jti in our store
+    refresh = serializers.CharField()
+
+    def validate(self, attrs):
+        refresh = ClaimsRefreshToken(attrs['refresh'])
+        jti = refresh[jwt_settings.JTI_CLAIM]
+        if revocations.is_revoked(jti):
+            raise InvalidToken('Token is revoked')
+        # Requests trust the claims without a user query, so this is where deactivation
+        # and role changes take effect: new tokens are stamped from the row, not the old token
+        user = get_user_model().objects.filter(
+            **{jwt_settings.USER_ID_FIELD: refresh[jwt_settings.USER_ID_CLAIM]},
+        ).first()
+        if not jwt_settings.USER_AUTHENTICATION_RULE(user):
+            raise InvalidToken('User is inactive or no longer exists')
+        fresh = ClaimsRefreshToken.for_user(user)
+
+        data = {'access': str(fresh.access_token)}
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            if jwt_settings.BLACKLIST_AFTER_ROTATION:
+                expires_at = datetime.fromtimestamp(refresh['exp'], tz=timezone.utc)
+                # The unique insert is the real guard: a concurrent replay loses here
+                if not revocations.revoke(jti, expires_at):
+                    raise InvalidToken('Token is revoked')
+            data['refresh'] = str(fresh)
+        return data
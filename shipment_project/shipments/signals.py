@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Booking
+from .reports import mark_weeks_dirty
+from .response_cache import bump_booking_version
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def booking_changed(sender, instance, **kwargs):
+    # Route summary weeks are recomputed lazily; just remember which week moved
+    mark_weeks_dirty([instance.booking_date])
+    # Cached booking lists for this user (and all-bookings lists) are now stale
+    bump_booking_version([instance.user_id])
@@ -0,0 +1,181 @@
+"""Delivery deadline (SLA) monitoring.
+
+Bookings get a delivery_deadline when they are created (Booking.save()).
+at_risk_shipments() reads only open bookings whose deadline falls between
+SLA_BREACH_LOOKBACK_HOURS ago and ``hours`` ahead, through the partial
+(status, delivery_deadline) index, so a run costs in proportion to the
+consignments at risk rather than the size of the table. Each one is put in a
+time bucket and ranked by service priority. detect_sla_breaches() also
+records them in SlaAlert, once per booking, kind and deadline.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import Booking, SlaAlert
+
+OPEN_STATUSES = ('pending', 'in-transit', 'delayed')
+BREACHED = 'breached'
+_FIELDS = ('id', 'lr_no', 'from_location', 'to_location', 'status', 'service_type', 'delivery_deadline')
+
+
+def priority_of(service_type):
+    """0 for the most urgent service in SLA_PRIORITY; unlisted services come after all of them."""
+    order = settings.SLA_PRIORITY
+    service = (service_type or '').strip().lower()
+    return order.index(service) if service in order else len(order)
+
+
+def bucket_limits(hours):
+    """Upper bounds (in hours) of the 'due within' buckets for a ``hours`` horizon."""
+    return [limit for limit in settings.SLA_BUCKET_HOURS if limit < hours] + [hours]
+
+
+def bucket_name(hours_left, limits):
+    if hours_left <= 0:
+        return BREACHED
+    for limit in limits:
+        if hours_left <= limit:
+            return f'due_{limit:g}h'
+    return None
+
+
+def at_risk_shipments(hours=None, now=None):
+    """Open bookings breached within the lookback or due within ``hours``, most urgent first.
+
+    Returns (bucket names in order, shipments); each shipment is a dict with
+    its bucket, priority and hours_left (negative once breached).
+    """
+    hours = settings.SLA_HORIZON_HOURS if hours is None else hours
+    now = now or timezone.now()
+    limits = bucket_limits(hours)
+    names = [BREACHED] + [bucket_name(limit, limits) for limit in limits]
+    rows = Booking.objects.filter(
+        status__in=OPEN_STATUSES,
+        delivery_deadline__gte=now - timedelta(hours=settings.SLA_BREACH_LOOKBACK_HOURS),
+        delivery_deadline__lt=now + timedelta(hours=hours),
+    ).values(*_FIELDS)
+    shipments = []
+    for row in rows:
+        hours_left = (row['delivery_deadline'] - now).total_seconds() / 3600
+        row['bucket'] = bucket_name(hours_left, limits)
+        row['priority'] = priority_of(row['service_type'])
+        row['hours_left'] = round(hours_left, 1)
+        shipments.append(row)
+    shipments.sort(key=lambda s: (names.index(s['bucket']), s['priority'], s['delivery_deadline']))
+    return names, shipments
+
+
+def _kind(shipment):
+    return 'breached' if shipment['bucket'] == BREACHED else 'at_risk'
+
+
+def record_alerts(shipments, batch_size=1000):
+    """Insert an SlaAlert per shipment unless one exists; returns {(booking id, kind)} newly added."""
+    table = SlaAlert._meta.db_table
+    existing = alerted_kinds(shipments)
+    shipments = [s for s in shipments if _kind(s) not in existing.get(s['id'], ())]
+    added = set()
+    for start in range(0, len(shipments), batch_size):
+        batch = shipments[start:start + batch_size]
+        params = []
+        for shipment in batch:
+            params += [shipment['id'], _kind(shipment), shipment['delivery_deadline'], shipment['priority']]
+        with connection.cursor() as cursor:
+            # ON CONFLICT as well: another detector may have added some since alerted_kinds()
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (booking_id, kind, deadline, priority, created_at)
+                SELECT v.booking_id, v.kind, v.deadline, v.priority, now()
+                FROM (VALUES {', '.join(['(%s, %s, %s::timestamptz, %s)'] * len(batch))})
+                    AS v(booking_id, kind, deadline, priority)
+                ON CONFLICT (booking_id, kind, deadline) DO NOTHING
+                RETURNING booking_id, kind
+                """,
+                params,
+            )
+            added.update(cursor.fetchall())
+    return added
+
+
+def alerted_kinds(shipments):
+    """{booking id: {kinds}} already alerted for the shipments' current deadlines."""
+    kinds = {}
+    deadlines = {s['id']: s['delivery_deadline'] for s in shipments}
+    alerts = SlaAlert.objects.filter(booking_id__in=deadlines).values_list('booking_id', 'kind', 'deadline')
+    for booking_id, kind, deadline in alerts:
+        if deadline == deadlines[booking_id]:
+            kinds.setdefault(booking_id, set()).add(kind)
+    return kinds
+
+
+def sla_report(names, shipments, hours, now, new_alerts=None):
+    """JSON-ready buckets; ``new_alerts`` marks which shipments were alerted by this run."""
+    kinds = alerted_kinds(shipments) if new_alerts is None else {}
+    buckets = {name: [] for name in names}
+    for shipment in shipments:
+        kind = _kind(shipment)
+        entry = {
+            'lr_no': shipment['lr_no'],
+            'from_location': shipment['from_location'],
+            'to_location': shipment['to_location'],
+            'status': shipment['status'],
+            'service_type': shipment['service_type'],
+            'priority': shipment['priority'],
+            'delivery_deadline': shipment['delivery_deadline'].isoformat(),
+            'hours_left': shipment['hours_left'],
+        }
+        if new_alerts is None:
+            entry['alerted'] = kind in kinds.get(shipment['id'], ())
+        else:
+            entry['new_alert'] = (shipment['id'], kind) in new_alerts
+        buckets[shipment['bucket']].append(entry)
+    return {
+        'generated_at': now.isoformat(),
+        'horizon_hours': hours,
+        'buckets': [{'bucket': name, 'count': len(rows), 'shipments': rows} for name, rows in buckets.items()],
+    }
+
+
+def detect_sla_breaches(hours=None, now=None):
+    """Find at-risk and breached shipments and alert the new ones; returns the report."""
+    hours = settings.SLA_HORIZON_HOURS if hours is None else hours
+    now = now or timezone.now()
+    names, shipments = at_risk_shipments(hours, now)
+    added = record_alerts(shipments)
+    report = sla_report(names, shipments, hours, now, new_alerts=added)
+    report['new_alerts'] = len(added)
+    return report
+
+
+def backfill_delivery_deadlines(batch_size=20000):
+    """Give open bookings created before delivery_deadline existed (or bulk-loaded) a deadline.
+
+    The deadline counts from the start of the booking day. Runs in id-range
+    batches; returns the number of bookings updated.
+    """
+    table = Booking._meta.db_table
+    open_without = Booking.objects.filter(status__in=OPEN_STATUSES, delivery_deadline__isnull=True)
+    bounds = open_without.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return 0
+    promise = settings.SLA_PROMISE_DAYS
+    cases = ' '.join(['WHEN %s THEN %s'] * len(promise))
+    case_params = [value for item in promise.items() for value in item]
+    updated = 0
+    for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} SET delivery_deadline = (booking_date::timestamp AT TIME ZONE %s)
+                    + make_interval(days => CASE LOWER(TRIM(COALESCE(service_type, ''))) {cases} ELSE %s END)
+                WHERE id >= %s AND id < %s AND status IN %s AND delivery_deadline IS NULL
+                """,
+                [settings.TIME_ZONE, *case_params, settings.SLA_DEFAULT_PROMISE_DAYS,
+                 start, start + batch_size, OPEN_STATUSES],
+            )
+            updated += cursor.rowcount
+    return updated
@@ -0,0 +1,184 @@
+"""Tariffs and bulk re-rating of open bookings.
+
+A TariffVersion holds per-lane TariffRates and the GST split. When one
+changes, rerate_bookings() recomputes freight, SGST and CGST for bookings
+that are still open (status) and not yet billed (payment method in
+TARIFF_UNBILLED_PAYMENT_METHODS). Bookings are read in id order, a batch at
+a time, charges are worked out for the whole batch with integer paise
+arithmetic in NumPy (no floats, half-up rounding like the invoices), and
+only the rows whose charges change are written back with one
+UPDATE ... FROM (VALUES ...). Each batch commits together with the run's
+progress in RerateRun, so an interrupted run resumes after the last batch
+it committed.
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .eta import lane_key
+from .models import Booking, RerateRun, TariffVersion
+from .reports import mark_weeks_dirty
+from .response_cache import bump_booking_version
+from .sla import OPEN_STATUSES
+
+
+def current_tariff(on=None):
+    """The newest tariff already in effect on ``on`` (default today), or None."""
+    return (TariffVersion.objects.filter(effective_from__lte=on or timezone.localdate())
+            .order_by('-effective_from', '-id').first())
+
+
+def hundredths(value):
+    """Decimal for an amount in hundredths (paise, 1/100 kg); None for the -1 that stands for NULL."""
+    return None if value < 0 else Decimal(int(value)).scaleb(-2)
+
+
+class RateCard:
+    """One TariffVersion's rates in memory, looked up from the most specific key down."""
+
+    def __init__(self, tariff):
+        self.tariff = tariff
+        self.rates = {
+            (lane_key(r.from_location), lane_key(r.to_location), lane_key(r.service_type)):
+                (r.base_paise, r.per_kg_paise, r.min_paise)
+            for r in tariff.rates.all()
+        }
+
+    def lookup(self, from_location, to_location, service_type):
+        """(base, per kg, minimum) in paise: lane and service, lane, service, then the catch-all."""
+        origin, destination, service = lane_key(from_location), lane_key(to_location), lane_key(service_type)
+        for key in ((origin, destination, service), (origin, destination, ''), ('', '', service), ('', '', '')):
+            rate = self.rates.get(key)
+            if rate is not None:
+                return rate
+        return None
+
+    def charges(self, lanes, weight_centikg):
+        """Freight, SGST and CGST in paise for each (from, to, service) and weight in 1/100 kg.
+
+        Returns (freight, sgst, cgst, rated); rows without a matching rate
+        have rated False and charges of -1.
+        """
+        unique = {}
+        index = np.fromiter((unique.setdefault(lane, len(unique)) for lane in lanes), dtype=np.int64, count=len(lanes))
+        table = np.array([self.lookup(*lane) or (-1, -1, -1) for lane in unique], dtype=np.int64).reshape(-1, 3)
+        base, per_kg, minimum = table[index].T
+        rated = base >= 0
+        # Half-up to the paisa: weight is in 1/100 kg and nothing here is negative
+        freight = np.maximum(minimum, base + (per_kg * weight_centikg + 50) // 100)
+        sgst = (freight * self.tariff.sgst_bp + 5000) // 10000
+        cgst = (freight * self.tariff.cgst_bp + 5000) // 10000
+        return (np.where(rated, freight, -1), np.where(rated, sgst, -1), np.where(rated, cgst, -1), rated)
+
+
+def _select_batch(cursor, run, batch_size, lock):
+    table = Booking._meta.db_table
+    params = [run.last_id, OPEN_STATUSES, tuple(m.lower() for m in settings.TARIFF_UNBILLED_PAYMENT_METHODS)]
+    since = ''
+    if run.booked_from:
+        since = 'AND booking_date >= %s'
+        params.append(run.booked_from)
+    cursor.execute(
+        f"""
+        SELECT id, lr_no, from_location, to_location, service_type,
+               ROUND(COALESCE(chargeable_weight, weight::numeric, 0) * 100)::bigint,
+               COALESCE(ROUND(freight * 100)::bigint, -1), COALESCE(ROUND(sgst * 100)::bigint, -1),
+               COALESCE(ROUND(cgst * 100)::bigint, -1), booking_date, user_id
+        FROM {table}
+        WHERE id > %s AND status IN %s AND LOWER(payment_method) IN %s {since}
+        ORDER BY id LIMIT {int(batch_size)} {'FOR UPDATE' if lock else ''}
+        """,
+        params,
+    )
+    return cursor.fetchall()
+
+
+def _write_charges(cursor, ids, freight, sgst, cgst):
+    table = Booking._meta.db_table
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(ids))
+    params = []
+    for row in zip(ids, freight.tolist(), sgst.tolist(), cgst.tolist()):
+        params += row
+    cursor.execute(
+        f"""
+        UPDATE {table} b SET
+            freight = v.freight::numeric / 100,
+            sgst = v.sgst::numeric / 100,
+            cgst = v.cgst::numeric / 100,
+            version = b.version + 1
+        FROM (VALUES {values}) AS v(id, freight, sgst, cgst)
+        WHERE b.id = v.id
+        """,
+        params,
+    )
+
+
+def rerate_bookings(tariff, dry_run=False, booked_from=None, batch_size=None, restart=False, on_batch=None):
+    """Re-rate open, unbilled bookings with ``tariff``; returns the finished RerateRun.
+
+    A real run picks up the latest unfinished run for the same tariff and
+    booked_from unless ``restart``, which abandons it. Dry runs always start
+    over and write nothing but their RerateRun. ``on_batch`` is called after
+    each committed batch with the changed rows, for diff reports.
+    """
+    batch_size = batch_size or settings.TARIFF_RERATE_BATCH_SIZE
+    run = None
+    unfinished = RerateRun.objects.filter(tariff=tariff, dry_run=False, booked_from=booked_from, status='running')
+    if not dry_run:
+        if restart:
+            unfinished.update(status='abandoned', finished_at=timezone.now())
+        else:
+            run = unfinished.order_by('-id').first()
+    if run is None:
+        run = RerateRun.objects.create(tariff=tariff, dry_run=dry_run, booked_from=booked_from)
+    card = RateCard(tariff)
+
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            rows = _select_batch(cursor, run, batch_size, lock=not dry_run)
+            if not rows:
+                break
+            ids, lr_nos, origins, destinations, services, weight, old_freight, old_sgst, old_cgst, dates, users = (
+                list(column) for column in zip(*rows)
+            )
+            freight, sgst, cgst, rated = card.charges(list(zip(origins, destinations, services)),
+                                                      np.array(weight, dtype=np.int64))
+            old = [np.array(column, dtype=np.int64) for column in (old_freight, old_sgst, old_cgst)]
+            changed = rated & ((freight != old[0]) | (sgst != old[1]) | (cgst != old[2]))
+            picked = np.flatnonzero(changed)
+            if len(picked) and not dry_run:
+                _write_charges(cursor, [ids[i] for i in picked], freight[picked], sgst[picked], cgst[picked])
+
+            run.last_id = ids[-1]
+            run.scanned += len(ids)
+            run.changed += len(picked)
+            run.unrated += int((~rated).sum())
+            # A NULL charge counts from zero
+            run.freight_delta_paise += int((freight[picked] - np.maximum(old[0][picked], 0)).sum())
+            run.gst_delta_paise += int((sgst[picked] + cgst[picked] - np.maximum(old[1][picked], 0)
+                                        - np.maximum(old[2][picked], 0)).sum())
+            run.save(update_fields=['last_id', 'scanned', 'changed', 'unrated', 'freight_delta_paise',
+                                    'gst_delta_paise'])
+            if len(picked) and not dry_run:
+                # What the post_save signal would have done, once for the batch
+                mark_weeks_dirty({dates[i] for i in picked})
+                bump_booking_version({users[i] for i in picked})
+        if on_batch is not None:
+            on_batch([
+                {
+                    'lr_no': lr_nos[i], 'from_location': origins[i], 'to_location': destinations[i],
+                    'service_type': services[i], 'chargeable_kg': hundredths(weight[i]),
+                    'old_freight': hundredths(old[0][i]), 'new_freight': hundredths(freight[i]),
+                    'old_sgst': hundredths(old[1][i]), 'new_sgst': hundredths(sgst[i]),
+                    'old_cgst': hundredths(old[2][i]), 'new_cgst': hundredths(cgst[i]),
+                }
+                for i in picked
+            ])
+
+    run.status = 'done'
+    run.finished_at = timezone.now()
+    run.save(update_fields=['status', 'finished_at'])
+    return run
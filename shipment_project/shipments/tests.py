@@ -1,3 +1,1506 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import logging
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import close_old_connections, connection
+from django.core.management import call_command
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from unittest import mock
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.exceptions import ParseError
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .admin import DateProbeQuerySet, EstimatedCountPaginator
+from .autocomplete import PrefixIndex, autocomplete_index
+from .archive import archive_bookings, archived_lookup, read_manifest, restore_bookings, verify_archive
+from .columnar import ColumnarExtract, extract_columnar
+from .dispatch import distance_matrix, two_opt
+from .fastjson import FastJSONParser, FastJSONRenderer, JSONResponse
+from .eta import backfill_delivered_at, eta_table, percentile_days, refresh_transit_stats
+from .loadplan import VehicleType, first_fit_decreasing, pack, parse_dimensions, Consignments
+from .authentication import ClaimsJWTAuthentication, ClaimsRefreshToken, clear_user_cache
+
+from .middleware import CompressionMiddleware, choose_encoding
+from .profiling import ProfilingMiddleware
+from .log import DebugSamplingFilter, QueueingHandler, RequestContextFilter, request_context
+from .metrics import merge_snapshots, registry, render_prometheus
+from .models import (
+    Booking, BookingConflict, IdempotencyKey, Pincode, RerateRun, RevokedToken, RouteSummaryDirtyWeek, RouteWeeklySummary,
+    SlaAlert, TariffRate, TariffVersion, TransitTimeStat,
+)
+from .revocation import BloomFilter, revocations
+from .reports import mark_weeks_dirty, refresh_route_summary, week_start
+from .response_cache import ResponseCache, bump_booking_version, response_cache
+from .serializers import BookingSerializer
+from .sla import at_risk_shipments, backfill_delivery_deadlines, detect_sla_breaches
+from .tariffs import RateCard, current_tariff, rerate_bookings
+from .throttling import LocalBuckets
+
+
+def make_booking(**kwargs):
+    fields = {
+        'from_location': 'Hyderabad',
+        'to_location': 'Chennai',
+        'branch_from_phone': '9000000001',
+        'branch_to_phone': '9000000002',
+        'weight': 10.0,
+        'freight': Decimal('500.00'),
+        'sgst': Decimal('45.00'),
+        'cgst': Decimal('45.00'),
+    }
+    fields.update(kwargs)
+    booking_date = fields.pop('booking_date', None)
+    booking = Booking.objects.create(**fields)
+    if booking_date:
+        # booking_date is auto_now_add, so backdate with a plain UPDATE
+        Booking.objects.filter(pk=booking.pk).update(booking_date=booking_date)
+        booking.booking_date = booking_date
+        mark_weeks_dirty([booking_date])
+    return booking
+
+
+class RouteSummaryTests(TestCase):
+    def setUp(self):
+        self.monday = week_start(date(2025, 3, 12))
+
+    def test_refresh_only_recomputes_dirty_weeks(self):
+        make_booking(booking_date=self.monday)
+        make_booking(booking_date=self.monday + timedelta(days=2), weight=5.0)
+        make_booking(booking_date=self.monday + timedelta(days=7), to_location='Pune')
+        RouteSummaryDirtyWeek.objects.all().delete()
+        refresh_route_summary(full=True)
+
+        row = RouteWeeklySummary.objects.get(week_start=self.monday, to_location='Chennai')
+        self.assertEqual(row.bookings, 2)
+        self.assertEqual(row.total_weight, 15.0)
+        self.assertEqual(row.total_freight, Decimal('1000.00'))
+        self.assertEqual(row.total_gst, Decimal('180.00'))
+        self.assertFalse(RouteSummaryDirtyWeek.objects.exists())
+
+        untouched = RouteWeeklySummary.objects.get(to_location='Pune')
+        make_booking(booking_date=self.monday + timedelta(days=1))
+        # Only the backdated week (plus today's, from the create) is pending
+        dirty = set(RouteSummaryDirtyWeek.objects.values_list('week_start', flat=True))
+        self.assertEqual(dirty, {self.monday, week_start(date.today())})
+        self.assertEqual(refresh_route_summary(), 2)
+        self.assertEqual(RouteWeeklySummary.objects.get(week_start=self.monday).bookings, 3)
+        self.assertEqual(RouteWeeklySummary.objects.get(to_location='Pune').refreshed_at, untouched.refreshed_at)
+
+    def test_report_endpoint_ranks_top_routes(self):
+        make_booking(booking_date=self.monday)
+        make_booking(booking_date=self.monday, to_location='Pune', freight=Decimal('900.00'))
+        admin = get_user_model().objects.create_user(username='ops', password='x', user_type='admin')
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        response = client.get('/api/reports/routes/', {'top': 1, 'start_date': self.monday.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        routes = response.json()['routes']
+        self.assertEqual(len(routes), 1)
+        self.assertEqual(routes[0]['to_location'], 'Pune')
+        self.assertEqual(routes[0]['weeks'][0]['week_start'], self.monday.isoformat())
+
+        client.force_authenticate(None)
+        self.assertEqual(client.get('/api/reports/routes/').status_code, 401)
+
+    @override_settings(ROUTE_SUMMARY_REQUEST_WEEKS=2)
+    def test_report_request_refreshes_a_few_weeks(self):
+        admin = get_user_model().objects.create_user(username='ops', password='x', user_type='admin')
+        RouteSummaryDirtyWeek.objects.all().delete()
+        weeks = [self.monday - timedelta(days=7 * i) for i in range(5)]
+        mark_weeks_dirty(weeks)
+        client = APIClient()
+        client.force_authenticate(admin)
+        self.assertEqual(client.get('/api/reports/routes/').json()['pending_weeks'], 3)
+        self.assertEqual(set(RouteSummaryDirtyWeek.objects.values_list('week_start', flat=True)), set(weeks[2:]))
+        self.assertEqual(refresh_route_summary(), 3)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+
+    def test_middleware_records_view_latency_and_queries(self):
+        make_booking()
+        self.client.post('/api/track_shipment/', {'lr_no': '1'}, content_type='application/json')
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('http_requests_total{view="track_shipment",method="POST",status="200"} 1', body)
+        self.assertIn('http_request_duration_seconds_count{view="track_shipment"} 1', body)
+        self.assertIn('db_queries_total{view="track_shipment"} 1', body)
+
+    def test_worker_snapshots_are_summed(self):
+        registry.observe('track_shipment', 'POST', 200, 0.02, 100, 1, 0.001)
+        snap = registry.snapshot()
+        text = render_prometheus(merge_snapshots([snap, snap]))
+        self.assertIn('http_requests_total{view="track_shipment",method="POST",status="200"} 2', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="track_shipment",le="0.025"} 2', text)
+        self.assertIn('http_response_size_bytes_bucket{view="track_shipment",le="256"} 2', text)
+
+    @override_settings(METRICS_AUTH_TOKEN='s3cret')
+    def test_scrape_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+
+
+class SeedBookingsTests(TestCase):
+    def test_copy_load_is_deterministic(self):
+        call_command('seed_bookings', rows=300, users=5, seed=7, batch_size=128, verbosity=0)
+        first = list(Booking.objects.order_by('id').values_list('from_location', 'to_location', 'freight', 'status'))
+        self.assertEqual(len(first), 300)
+        self.assertEqual(Booking.objects.values('lr_no').distinct().count(), 300)
+        self.assertTrue(Booking.objects.filter(user__isnull=False).exists())
+        sample = Booking.objects.exclude(status='pending').first()
+        self.assertEqual(sample.pickup_address['city'], sample.from_location)
+        self.assertEqual(sample.updates[0]['status'], 'Order Placed')
+
+        Booking.objects.all().delete()
+        call_command('seed_bookings', rows=300, users=5, seed=7, batch_size=128, verbosity=0)
+        second = list(Booking.objects.order_by('id').values_list('from_location', 'to_location', 'freight', 'status'))
+        self.assertEqual(first, second)
+
+
+class ClaimsJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        clear_user_cache()
+        self.user = get_user_model().objects.create_user(username='asha', email='asha@example.com', password='x', user_type='client')
+        self.token = str(ClaimsRefreshToken.for_user(self.user).access_token)
+
+    def _request(self, token):
+        return APIRequestFactory().get('/api/user-bookings/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_claims_replace_the_user_lookup(self):
+        with self.assertNumQueries(1):
+            JWTAuthentication().authenticate(self._request(self.token))
+        with self.assertNumQueries(0):
+            user, _ = ClaimsJWTAuthentication().authenticate(self._request(self.token))
+            self.assertEqual((user.id, user.user_type, user.is_staff), (self.user.id, 'client', False))
+
+    def test_user_bookings_runs_a_single_query(self):
+        make_booking(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        with self.assertNumQueries(1):
+            response = client.get('/api/user-bookings/')
+        self.assertEqual(len(response.json()), 1)
+
+    def test_full_user_is_loaded_lazily_and_cached(self):
+        user, _ = ClaimsJWTAuthentication().authenticate(self._request(self.token))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'asha@example.com')
+        again, _ = ClaimsJWTAuthentication().authenticate(self._request(self.token))
+        with self.assertNumQueries(0):
+            self.assertEqual(again.email, 'asha@example.com')
+
+    def test_login_issues_claims(self):
+        response = self.client.post('/api/login', {'email': 'asha@example.com', 'password': 'x'}, content_type='application/json')
+        access = ClaimsJWTAuthentication().get_validated_token(response.json()['access'])
+        self.assertEqual(access['user_type'], 'client')
+        self.assertEqual(access['groups'], [])
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        revocations.reset()
+        self.user = get_user_model().objects.create_user(username='ravi', password='x')
+        self.refresh = str(ClaimsRefreshToken.for_user(self.user))
+
+    def _refresh(self, token):
+        return self.client.post('/api/token/refresh/', {'refresh': token}, content_type='application/json')
+
+    def test_rotation_revokes_the_old_refresh_token(self):
+        response = self._refresh(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('refresh', response.json())
+        self.assertEqual(self._refresh(self.refresh).status_code, 401)
+        self.assertEqual(self._refresh(response.json()['refresh']).status_code, 200)
+
+    def test_refresh_reloads_the_user(self):
+        self.user.user_type = 'agent'
+        self.user.save()
+        response = self._refresh(self.refresh)
+        access = ClaimsJWTAuthentication().get_validated_token(response.json()['access'])
+        self.assertEqual(access['user_type'], 'agent')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self._refresh(response.json()['refresh']).status_code, 401)
+
+    @override_settings(REVOCATION_SYNC_INTERVAL=3600)
+    def test_replay_is_rejected_even_with_a_stale_filter(self):
+        revocations.sync(force=True)
+        # Another worker rotated this token after our filter was built
+        jti = ClaimsRefreshToken(self.refresh)['jti']
+        RevokedToken.objects.create(jti=jti, expires_at=date.today() + timedelta(days=7))
+        self.assertEqual(self._refresh(self.refresh).status_code, 401)
+
+    def test_logout_and_prune(self):
+        self.assertEqual(self.client.post('/api/logout', {'refresh': self.refresh}, content_type='application/json').status_code, 200)
+        self.assertEqual(self._refresh(self.refresh).status_code, 401)
+        RevokedToken.objects.update(expires_at=date(2020, 1, 1))
+        call_command('prune_revoked_tokens', verbosity=0, stdout=None)
+        self.assertFalse(RevokedToken.objects.exists())
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        keys = [f'jti-{i}' for i in range(1000)]
+        bloom.add_many(keys[:500])
+        for key in keys[500:600]:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys[:600]))
+        false_positives = sum(key in bloom for key in keys[600:])
+        self.assertLess(false_positives, 40)
+
+
+THROTTLE_TEST = {
+    'ANON_RATE': 0.001,
+    'ANON_BURST': 3,
+    'USER_RATE': 0.001,
+    'USER_BURST': 5,
+    'TRUSTED_PROXIES': 1,
+    'COSTS': {'track_shipment': 1, 'export_shipments': 3},
+    'CONCURRENCY': {'export_shipments': 1},
+}
+
+
+@override_settings(THROTTLE=THROTTLE_TEST)
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _track(self, ip='10.0.0.1', **extra):
+        return self.client.post('/api/track_shipment/', {'lr_no': 'NOPE'}, content_type='application/json',
+                                HTTP_X_FORWARDED_FOR=ip, **extra)
+
+    def test_anonymous_clients_get_a_bucket_per_ip(self):
+        self.assertEqual([self._track().status_code for _ in range(3)], [200] * 3)
+        response = self._track()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(self._track(ip='10.0.0.2').status_code, 200)
+        # unthrottled views are left alone
+        self.assertNotEqual(self.client.get('/api/customer-shipments/', HTTP_X_FORWARDED_FOR='10.0.0.1').status_code, 429)
+
+    def test_signed_in_users_are_keyed_by_user(self):
+        user = get_user_model().objects.create_user(username='meena', password='x')
+        auth = f'Bearer {ClaimsRefreshToken.for_user(user).access_token}'
+        statuses = [self._track(ip=f'10.0.1.{i}', HTTP_AUTHORIZATION=auth).status_code for i in range(6)]
+        self.assertEqual(statuses, [200] * 5 + [429])
+
+    def test_expensive_views_cost_more(self):
+        self.assertNotEqual(self.client.get('/api/export-shipments/', HTTP_X_FORWARDED_FOR='10.0.0.3').status_code, 429)
+        self.assertEqual(self._track(ip='10.0.0.3').status_code, 429)
+
+    def test_concurrency_ceiling_sheds_load(self):
+        cache.set('inflight:export_shipments', 1)
+        response = self.client.get('/api/export-shipments/', HTTP_X_FORWARDED_FOR='10.0.0.4')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(cache.get('inflight:export_shipments'), 1)
+        cache.set('inflight:export_shipments', 0)
+        self.assertEqual(self.client.get('/api/export-shipments/', HTTP_X_FORWARDED_FOR='10.0.0.5').status_code, 200)
+        self.assertEqual(cache.get('inflight:export_shipments'), 0)
+
+    def test_local_buckets_refill(self):
+        buckets = LocalBuckets()
+        self.assertEqual(buckets.take('k', rate=1.0, burst=2, cost=2, now=100.0), 0.0)
+        self.assertAlmostEqual(buckets.take('k', rate=1.0, burst=2, cost=1, now=100.5), 0.5)
+        self.assertEqual(buckets.take('k', rate=1.0, burst=2, cost=1, now=101.0), 0.0)
+
+
+@override_settings(THROTTLE={'ENABLED': False})
+class BatchTrackingTests(TestCase):
+    def test_batch_matches_single_item_responses(self):
+        first = make_booking()
+        second = make_booking(to_location='Pune')
+        lr_nos = [first.lr_no, second.lr_no.lower(), 'NX404']
+        eta_table.sync(force=True)  # the ETA table reloads at most once per ETA_SYNC_INTERVAL
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/track_shipment/batch/', {'lr_nos': lr_nos}, content_type='application/json')
+        body = response.json()
+        self.assertEqual(body['found'], 2)
+        self.assertEqual(list(body['results']), lr_nos)
+        for lr_no in lr_nos:
+            single = self.client.post('/api/track_shipment/', {'lr_no': lr_no}, content_type='application/json').json()
+            self.assertEqual(body['results'][lr_no], single)
+        self.assertFalse(body['results']['NX404']['success'])
+
+    @override_settings(TRACKING_BATCH_LIMIT=2)
+    def test_rejects_oversized_or_malformed_batches(self):
+        post = lambda data: self.client.post('/api/track_shipment/batch/', data, content_type='application/json')
+        self.assertEqual(post({'lr_nos': ['1', '2', '3']}).status_code, 400)
+        self.assertEqual(post({'lr_nos': 'ABC'}).status_code, 400)
+        self.assertEqual(post({}).status_code, 400)
+
+
+@override_settings(THROTTLE={'ENABLED': False})
+class LoggingTests(TestCase):
+    def test_request_id_is_echoed_or_generated(self):
+        response = self.client.get('/api/customer-shipments/', HTTP_X_REQUEST_ID='edge-42.a')
+        self.assertEqual(response['X-Request-ID'], 'edge-42.a')
+        response = self.client.get('/api/customer-shipments/', HTTP_X_REQUEST_ID='bad id\n')
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+    def test_records_are_json_lines_with_request_context(self):
+        booking = make_booking()
+        stream = io.StringIO()
+        handler = QueueingHandler(stream=stream)
+        handler.addFilter(DebugSamplingFilter(rate=1.0))
+        handler.addFilter(RequestContextFilter())
+        logger = logging.getLogger('shipments.views')
+        old_level = logger.level
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(handler)
+        try:
+            self.client.post('/api/track_shipment/', {'lr_no': booking.lr_no}, content_type='application/json',
+                             HTTP_X_REQUEST_ID='trace-1')
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(old_level)
+            handler.close()  # drains the listener thread
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual([line['message'] for line in lines],
+                         [f'Received LR No: {booking.lr_no}', f'Booking Found: {booking}'])
+        self.assertTrue(all(line['request_id'] == 'trace-1' and line['view'] == 'track_shipment' for line in lines))
+
+    def test_debug_sampling_is_per_request_and_capped(self):
+        record = logging.LogRecord('shipments', logging.DEBUG, __file__, 1, 'x', None, None)
+        never = DebugSamplingFilter(rate=0.0)
+        self.assertFalse(never.filter(record))
+        self.assertTrue(never.filter(logging.LogRecord('shipments', logging.INFO, __file__, 1, 'x', None, None)))
+
+        capped = DebugSamplingFilter(rate=1.0, per_second=3)
+        token = request_context.set({'request_id': 'r', 'view': None, 'sampled': None})
+        try:
+            kept = sum(capped.filter(record) for _ in range(10))
+        finally:
+            request_context.reset(token)
+        self.assertLessEqual(kept, 3 * 2)  # may straddle a one-second window
+
+
+class BookingAdminTests(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(username='root', email='root@example.com', password='x')
+        self.client.force_login(self.admin)
+        self.bookings = [make_booking(booking_date=date(2024, month, 5)) for month in (1, 3)]
+        self.bookings.append(make_booking(booking_date=date(2025, 7, 1)))
+
+    def test_unfiltered_changelist_uses_the_table_estimate(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE shipments_booking')
+        with mock.patch.object(EstimatedCountPaginator, 'threshold', 1), CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/admin/shipments/booking/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertFalse([q for q in ctx.captured_queries if 'COUNT(' in q['sql'].upper()])
+
+    def test_filtered_changelist_counts_exactly_below_threshold(self):
+        response = self.client.get('/admin/shipments/booking/', {'booking_date__year': 2024})
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+    def test_date_hierarchy_probes_match_distinct_dates(self):
+        probing = DateProbeQuerySet(Booking)
+        for kind in ('year', 'month'):
+            self.assertEqual(probing.dates('booking_date', kind), list(Booking.objects.dates('booking_date', kind)))
+        self.assertEqual(probing.filter(booking_date__year=2024).dates('booking_date', 'month', order='DESC'),
+                         [date(2024, 3, 1), date(2024, 1, 1)])
+
+    def test_bulk_status_action_is_one_update(self):
+        ids = [str(b.pk) for b in self.bookings[:2]]
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post('/admin/shipments/booking/', {'action': 'mark_delivered', '_selected_action': ids})
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(Booking.objects.filter(status='delivered').count(), 2)
+
+
+BOOKING_PAYLOAD = {
+    'pickup_address': {'name': 'Asha', 'address': '1 Main Road', 'city': 'Hyderabad', 'zip': '500001',
+                       'country': 'India', 'phone': '9000000001'},
+    'delivery_address': {'name': 'Ravi', 'address': '2 Beach Road', 'city': 'Chennai', 'zip': '600001',
+                         'country': 'India', 'phone': '9000000002'},
+    'service_type': 'standard',
+    'package_type': 'box',
+    'weight': 12.5,
+    'dimensions': '40x30x20',
+    'pickup_date': '2026-01-15',
+    'pickup_time_window': '09:00-12:00',
+    'payment_method': 'upi',
+    'phone': '9000000003',
+}
+
+
+@override_settings(THROTTLE={'ENABLED': False})
+class IdempotencyTests(TransactionTestCase):
+    def _book(self, key, payload=BOOKING_PAYLOAD):
+        return APIClient().post('/api/bookings/', payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_concurrent_duplicates_create_one_booking(self):
+        responses = []
+        start = threading.Barrier(6)
+
+        def submit():
+            try:
+                start.wait()
+                responses.append(self._book('order-77'))
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=submit) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual({r.status_code for r in responses}, {201})
+        self.assertEqual({r.json()['lr_no'] for r in responses}, {Booking.objects.get().lr_no})
+        self.assertEqual(sum(r.has_header('Idempotent-Replayed') for r in responses), 5)
+
+    def test_key_reuse_with_a_different_body_is_rejected(self):
+        self.assertEqual(self._book('order-78').status_code, 201)
+        self.assertEqual(self._book('order-78', {**BOOKING_PAYLOAD, 'weight': 99}).status_code, 422)
+        self.assertEqual(self._book('order-79').status_code, 201)
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_status_update_replays_and_expired_keys_are_pruned(self):
+        booking = make_booking()
+        client = APIClient()
+        post = lambda status: client.post('/api/update-shipment-status/', {'lr_no': booking.lr_no, 'status': status},
+                                          format='json', HTTP_IDEMPOTENCY_KEY='status-1')
+        self.assertEqual(post('delivered').json(), {'success': True, 'lr_no': booking.lr_no, 'status': 'delivered', 'version': 2})
+        Booking.objects.filter(pk=booking.pk).update(status='delayed')
+        replay = post('delivered')
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, 'delayed')
+
+        IdempotencyKey.objects.update(expires_at=date(2020, 1, 1))
+        call_command('prune_idempotency_keys', verbosity=0, stdout=io.StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+@override_settings(THROTTLE={'ENABLED': False})
+class DispatchTests(TestCase):
+    def setUp(self):
+        # Four Hyderabad pincodes on a rough square plus one far to the east
+        rows = ['pincode,officename,latitude,longitude,district,statename',
+                '500001,GPO,17.40,78.40,HYDERABAD,TELANGANA',
+                '500001,Abids,17.40,78.42,HYDERABAD,TELANGANA',
+                '500002,A,17.45,78.45,HYDERABAD,TELANGANA',
+                '500003,B,17.35,78.50,HYDERABAD,TELANGANA',
+                '500004,C,17.30,78.40,HYDERABAD,TELANGANA',
+                '500099,Bad,NA,NA,HYDERABAD,TELANGANA']
+        path = self._tmp_csv('\n'.join(rows))
+        call_command('load_pincodes', path, stdout=io.StringIO())
+        self.admin = get_user_model().objects.create_user(username='dispatch', password='x', user_type='admin')
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def _tmp_csv(self, text):
+        handle = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        handle.write(text)
+        handle.close()
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+    def test_load_pincodes_averages_offices(self):
+        self.assertEqual(Pincode.objects.count(), 4)
+        gpo = Pincode.objects.get(pincode='500001')
+        self.assertAlmostEqual(gpo.longitude, 78.41)
+        self.assertEqual(gpo.district, 'Hyderabad')
+
+    def test_plan_assigns_every_known_pickup(self):
+        day = date(2026, 3, 2)
+        zips = ['500001', '500002', '500003', '500004', '500071', '999999'] * 3
+        windows = ['09:00-12:00', '15:00-18:00', '12:00-15:00']
+        for i, zip_code in enumerate(zips):
+            make_booking(pickup_date=day, pickup_time_window=windows[i % 3], weight=5,
+                         pickup_address={'city': 'Hyderabad', 'zip': zip_code})
+        make_booking(pickup_date=day + timedelta(days=1), pickup_address={'zip': '500001'})
+
+        response = self.api.post('/api/dispatch/plan/', {'date': day.isoformat(), 'vehicles': [
+            {'id': 'TS09-1', 'capacity_kg': 100, 'start_pincode': '500001'},
+            {'id': 'TS09-2', 'capacity_kg': 100, 'max_stops': 10},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        plan = response.json()
+        self.assertEqual(plan['pickups'], 18)
+        # 500071 falls back to the 500 prefix centroid; 999999 is unknown
+        self.assertEqual([u['reason'] for u in plan['unassigned']], ['unknown pincode'] * 3)
+        stops = [stop for route in plan['routes'] for stop in route['stops']]
+        self.assertEqual(len(stops), 15)
+        self.assertEqual(len({s['booking_id'] for s in stops}), 15)
+        for route in plan['routes']:
+            self.assertLessEqual(route['load_kg'], 100)
+            starts = [s['time_window'] for s in route['stops']]
+            self.assertEqual(starts, sorted(starts))
+
+    def test_plan_validates_input_and_requires_admin(self):
+        self.assertEqual(self.api.post('/api/dispatch/plan/', {'vehicles': [{'id': 'x'}]}, format='json').status_code, 400)
+        bad = {'date': '2026-03-02', 'vehicles': [{'id': 'x', 'start_pincode': '123456'}]}
+        self.assertEqual(self.api.post('/api/dispatch/plan/', bad, format='json').status_code, 400)
+        self.assertEqual(APIClient().post('/api/dispatch/plan/', bad, format='json').status_code, 401)
+
+    def test_two_opt_removes_a_crossing(self):
+        # Unit square visited corner to corner: 0 -> 2 -> 1 -> 3 crosses itself
+        dist = distance_matrix([0, 0, 0.01, 0.01], [0, 0.01, 0.01, 0])
+        path = two_opt(dist, [0, 2, 1, 3, 0])
+        self.assertLess(dist[path[:-1], path[1:]].sum(), dist[[0, 2, 1, 3], [2, 1, 3, 0]].sum())
+
+
+@override_settings(THROTTLE={'ENABLED': False})
+class LoadPlanTests(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_user(username='planner', password='x', user_type='admin')
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def test_parse_dimensions_units(self):
+        dims = parse_dimensions(['10x20x30', '1 x 2 x 0.5 m', '100*100*100mm', '12x12x12in', 'big box', None])
+        self.assertEqual(dims[0].tolist(), [10, 20, 30])
+        self.assertEqual(dims[1].tolist(), [100, 200, 50])
+        self.assertEqual(dims[2].tolist(), [10, 10, 10])
+        self.assertAlmostEqual(dims[3][0], 30.48)
+        self.assertTrue(np.isnan(dims[4:]).all())
+
+    def test_unreadable_dimensions_fall_back_to_chargeable_weight(self):
+        items = Consignments.from_rows([(1, 'A', '100x100x100', '2', 50, None), (2, 'B', '', None, 10, 20)])
+        self.assertEqual(items.volume_m3.tolist(), [2.0, 0.1])
+        self.assertEqual(items.dims_known.tolist(), [True, False])
+
+    def test_first_fit_decreasing_respects_both_capacities(self):
+        rng = np.random.default_rng(38)
+        weight, volume = rng.uniform(10, 400, 500), rng.uniform(0.1, 6, 500)
+        capacities = np.array([[1000.0, 20.0]] * 500)
+        assignment, bins, capacities = first_fit_decreasing(weight, volume, capacities)
+        self.assertTrue((assignment >= 0).all())
+        self.assertTrue((np.bincount(assignment, weights=weight) <= 1000 + 1e-9).all())
+        self.assertTrue((np.bincount(assignment, weights=volume) <= 20 + 1e-9).all())
+        # Within the classic FFD bound of the trivial lower bound
+        self.assertLessEqual(bins, 11 / 9 * max(weight.sum() / 1000, volume.sum() / 20) + 1)
+
+    def test_light_last_load_is_right_sized(self):
+        items = Consignments.from_rows([(i, f'L{i}', '100x100x100', '1', 600, None) for i in range(12)])
+        types = [VehicleType('32ft', 7000, 60), VehicleType('Tata Ace', 750, 5)]
+        assignment, names, _ = pack(items, types)
+        self.assertEqual(sorted(names.tolist()), ['32ft', 'Tata Ace'])
+        self.assertTrue((assignment >= 0).all())
+
+    def test_plan_groups_by_lane_and_reports_oversized(self):
+        day = date(2026, 4, 6)
+        for i in range(6):
+            make_booking(booking_date=day, dimensions='120x100x100', noofpkgs='2', weight=800)
+        make_booking(booking_date=day, to_location='Pune', dimensions='50x50x50', weight=20)
+        make_booking(booking_date=day, to_location='Pune', dimensions='10x10x10', weight=9000)
+        make_booking(booking_date=day, status='delivered', weight=100)
+
+        response = self.api.post('/api/loadplan/', {'date': day.isoformat(), 'vehicles': [
+            {'name': '20ft', 'max_weight_kg': 3000, 'volume_m3': 30, 'count': 5},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        lanes = {lane['to_location']: lane for lane in response.json()['lanes']}
+        self.assertEqual(lanes['Chennai']['bookings'], 6)
+        self.assertEqual(lanes['Chennai']['pieces'], 12)
+        self.assertEqual(len(lanes['Chennai']['vehicles']), 2)
+        for vehicle in lanes['Chennai']['vehicles']:
+            self.assertLessEqual(vehicle['weight_kg'], 3000)
+            self.assertLessEqual(vehicle['volume_m3'], 30)
+        self.assertEqual(len(lanes['Pune']['unassigned']), 1)
+
+    def test_local_search_flag_is_parsed_from_strings(self):
+        with mock.patch('shipments.views.plan_loads', return_value=[]) as plan:
+            for value, expected in (('false', False), ('0', False), ('true', True), (False, False)):
+                self.api.post('/api/loadplan/', {'date': '2026-04-06', 'local_search': value})
+                self.assertIs(plan.call_args.kwargs['local_search'], expected)
+            response = self.api.post('/api/loadplan/', {'date': '2026-04-06', 'local_search': 'maybe'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_plan_validates_input_and_requires_admin(self):
+        self.assertEqual(self.api.post('/api/loadplan/', {}, format='json').status_code, 400)
+        bad = {'date': '2026-04-06', 'vehicles': [{'name': 'x', 'max_weight_kg': 0, 'volume_m3': 1}]}
+        self.assertEqual(self.api.post('/api/loadplan/', bad, format='json').status_code, 400)
+        self.assertEqual(APIClient().post('/api/loadplan/', bad, format='json').status_code, 401)
+
+
+@override_settings(ETA_MIN_SAMPLES=3, ETA_SYNC_INTERVAL=0, ETA_DEFAULT_DAYS=3)
+class EtaTests(TestCase):
+    def setUp(self):
+        eta_table.reset()
+        self.addCleanup(eta_table.reset)
+        self.today = timezone.localdate()
+
+    def deliver(self, days, count=1, ago=timedelta(days=5), **kwargs):
+        delivered_at = timezone.now() - ago
+        booked = timezone.localdate(delivered_at) - timedelta(days=days)
+        for _ in range(count):
+            booking = make_booking(booking_date=booked, status='delivered', **kwargs)
+            Booking.objects.filter(pk=booking.pk).update(delivered_at=delivered_at)
+
+    def test_percentiles_from_histogram(self):
+        self.assertEqual(percentile_days([0, 2, 5, 2, 1], 0.5), 2)
+        self.assertEqual(percentile_days([0, 2, 5, 2, 1], 0.9), 3)
+        self.assertEqual(percentile_days([4], 0.9), 0)
+
+    def test_save_stamps_delivered_at(self):
+        booking = make_booking(status='pending')
+        self.assertIsNone(booking.delivered_at)
+        booking.status = 'delivered'
+        booking.save()
+        self.assertIsNotNone(booking.delivered_at)
+
+    def test_lane_origin_and_global_fallback(self):
+        self.deliver(2, count=4, service_type='express')
+        self.deliver(6, count=1, service_type='express')
+        self.deliver(4, count=2, from_location='Pune', to_location='Delhi')
+        self.assertEqual(eta_table.lookup('Hyderabad', 'Chennai', 'express'), (3, 3, 'default'))
+        self.assertEqual(refresh_transit_stats(), 2)
+
+        self.assertEqual(eta_table.lookup(' hyderabad', 'CHENNAI', 'Express'), (2, 6, 'lane'))
+        # Unknown service on a known origin uses the hub; Pune has too few deliveries for either
+        self.assertEqual(eta_table.lookup('Hyderabad', 'Chennai', 'economy')[2], 'origin')
+        self.assertEqual(eta_table.lookup('Pune', 'Delhi', None), (2, 6, 'global'))
+        self.assertEqual(TransitTimeStat.objects.get(from_location='', to_location='').samples, 7)
+
+    def test_incremental_refresh_only_touches_changed_lanes(self):
+        self.deliver(2, count=3)
+        self.deliver(4, count=3, to_location='Pune')
+        refresh_transit_stats()
+        self.assertEqual(refresh_transit_stats(), 0)
+        TransitTimeStat.objects.update(refreshed_at=timezone.now() - timedelta(days=1))
+        self.deliver(8, count=3, to_location='Pune', ago=timedelta(minutes=5))
+        self.assertEqual(refresh_transit_stats(), 1)
+        pune = TransitTimeStat.objects.get(to_location='pune')
+        self.assertEqual((pune.samples, pune.median_days), (6, 4))
+
+    def test_incremental_refresh_counts_every_spelling_of_the_lane(self):
+        self.deliver(2, count=2, from_location='hyderabad')
+        self.deliver(2, count=2, from_location='HYDERABAD ')
+        refresh_transit_stats()
+        TransitTimeStat.objects.update(refreshed_at=timezone.now() - timedelta(days=1))
+        self.deliver(6, count=1, ago=timedelta(minutes=5))
+        self.assertEqual(refresh_transit_stats(), 1)
+        lane = TransitTimeStat.objects.get(from_location='hyderabad', to_location='chennai')
+        self.assertEqual(lane.samples, 5)
+
+    def test_serializer_and_tracking_use_the_table(self):
+        self.deliver(5, count=3)
+        refresh_transit_stats()
+        booking = make_booking(booking_date=self.today, status='in-transit')
+        data = BookingSerializer(booking).data
+        self.assertEqual(data['estimated_delivery'], (self.today + timedelta(days=5)).isoformat())
+        self.assertEqual(data['estimated_delivery_latest'], (self.today + timedelta(days=5)).isoformat())
+        tracked = self.client.post('/api/track_shipment/', {'lr_no': booking.lr_no}, content_type='application/json')
+        self.assertEqual(tracked.json()['estimatedDelivery'], data['estimated_delivery'])
+
+    def test_backfill_reads_delivered_update(self):
+        booking = make_booking(status='pending', updates=[
+            {'status': 'Order Placed', 'timestamp': '2026-01-02T09:00:00'},
+            {'status': 'delivered', 'location': 'Chennai', 'timestamp': '2026-01-05T14:00:00'},
+        ])
+        Booking.objects.filter(pk=booking.pk).update(status='delivered')
+        make_booking(status='pending')
+        self.assertEqual(backfill_delivered_at(batch_size=1), 1)
+        booking.refresh_from_db()
+        self.assertEqual(booking.delivered_at.isoformat(), '2026-01-05T14:00:00+00:00')
+
+
+@override_settings(THROTTLE={'ENABLED': False}, ARCHIVE_BLOCK_ROWS=2)
+class ArchiveTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        override = override_settings(ARCHIVE_DIR=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+        archived_lookup.reset()
+        self.addCleanup(archived_lookup.reset)
+
+        self.old = [
+            make_booking(booking_date=date(2022, month, 10), status='delivered',
+                         delivered_at=timezone.now().replace(year=2022, month=month, day=12),
+                         updates=[{'status': 'delivered', 'timestamp': '2022-01-12T14:00:00'}])
+            for month in (1, 2) for i in range(3)
+        ]
+        self.pending = make_booking(booking_date=date(2022, 1, 10), status='pending')
+        self.recent = make_booking(status='delivered')
+
+    def test_archive_writes_parts_and_deletes_rows(self):
+        self.assertEqual(archive_bookings(date(2023, 1, 1), batch_size=4, dry_run=True), 6)
+        self.assertEqual(archive_bookings(date(2023, 1, 1), batch_size=4), 6)
+        self.assertEqual(set(Booking.objects.values_list('pk', flat=True)), {self.pending.pk, self.recent.pk})
+        manifest = read_manifest()
+        self.assertEqual(sorted((p['month'], p['rows']) for p in manifest['parts']), [('2022-01', 3), ('2022-02', 3)])
+        self.assertEqual(verify_archive(), [])
+        # Parts are ordinary gzip files despite being written in blocks
+        with gzip.open(os.path.join(self.root, manifest['parts'][0]['path']), 'rt') as handle:
+            self.assertEqual(len(handle.readlines()), 3)
+        self.assertEqual(archive_bookings(date(2023, 1, 1)), 0)
+
+    def test_archive_keeps_bookings_changed_before_the_delete(self):
+        from . import archive
+        reopened, edited = self.old[0], self.old[1]
+        write_manifest = archive._write_manifest
+
+        def change_bookings(root, manifest):
+            # Lands after the parts are written and before the rows are deleted
+            write_manifest(root, manifest)
+            Booking.objects.filter(pk=reopened.pk).update(status='in_transit', version=reopened.version + 1)
+            Booking.objects.filter(pk=edited.pk).update(remarks='edited', version=edited.version + 1)
+
+        with mock.patch.object(archive, '_write_manifest', side_effect=change_bookings, autospec=True):
+            self.assertEqual(archive_bookings(date(2023, 1, 1)), 4)
+        self.assertEqual(set(Booking.objects.values_list('pk', flat=True)),
+                         {reopened.pk, edited.pk, self.pending.pk, self.recent.pk})
+        self.assertEqual(sorted((p['month'], p['rows']) for p in read_manifest()['parts']), [('2022-01', 1), ('2022-02', 3)])
+        self.assertEqual(verify_archive(), [])
+        self.assertIsNone(archived_lookup.find(reopened.lr_no))
+        self.assertIsNone(archived_lookup.find(edited.lr_no))
+        self.assertIsNotNone(archived_lookup.find(self.old[2].lr_no))
+        self.assertEqual(restore_bookings(), (4, []))
+
+    def test_tracking_falls_back_to_archive(self):
+        archive_bookings(date(2023, 1, 1))
+        lr_no = self.old[4].lr_no
+        single = self.client.post('/api/track_shipment/', {'lr_no': lr_no}, content_type='application/json').json()
+        self.assertTrue(single['success'])
+        self.assertEqual(single['trackingNumber'], lr_no)
+        self.assertEqual(single['estimatedDelivery'], '2022-02-12')
+        batch = self.client.post('/api/track_shipment/batch/', {'lr_nos': [self.old[2].lr_no, self.recent.lr_no, 'NX404']},
+                                 content_type='application/json').json()
+        self.assertEqual(batch['found'], 2)
+        self.assertIsNone(archived_lookup.find('NX404'))
+
+    def test_restore_month_round_trips(self):
+        archive_bookings(date(2023, 1, 1))
+        self.assertEqual(restore_bookings(months={'2022-02'}), (3, []))
+        restored = Booking.objects.get(lr_no=self.old[3].lr_no)
+        self.assertEqual(restored.booking_date, date(2022, 2, 10))
+        self.assertEqual(restored.pk, self.old[3].pk)
+        self.assertEqual(restored.updates[0]['status'], 'delivered')
+        self.assertEqual([p['month'] for p in read_manifest()['parts']], ['2022-01'])
+        self.assertIsNone(archived_lookup.find(self.old[3].lr_no))
+        self.assertIsNotNone(archived_lookup.find(self.old[0].lr_no))
+
+    def test_restore_keeps_bookings_whose_lr_is_back_in_use(self):
+        archive_bookings(date(2023, 1, 1))
+        taken = self.old[4]
+        make_booking(lr_no=taken.lr_no)
+        self.assertEqual(restore_bookings(months={'2022-02'}, batch_size=2), (2, [taken.lr_no]))
+        self.assertFalse(Booking.objects.filter(pk=taken.pk).exists())
+        kept = [p for p in read_manifest()['parts'] if p['month'] == '2022-02']
+        self.assertEqual([p['rows'] for p in kept], [1])
+        self.assertEqual(verify_archive(), [])
+        self.assertEqual(archived_lookup.find(taken.lr_no)['id'], taken.pk)
+        self.assertIsNone(archived_lookup.find(self.old[3].lr_no))
+
+    def test_restore_refuses_corrupt_part(self):
+        archive_bookings(date(2023, 1, 1))
+        part = read_manifest()['parts'][0]
+        with open(os.path.join(self.root, part['path']), 'ab') as handle:
+            handle.write(b'x')
+        self.assertEqual(verify_archive(), [part['path']])
+        with self.assertRaises(ValueError):
+            restore_bookings()
+
+
+@override_settings(THROTTLE={'ENABLED': False})
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        response_cache.clear()
+        self.addCleanup(response_cache.clear)
+        registry.reset()
+        eta_table.sync(force=True)
+        User = get_user_model()
+        self.alice = User.objects.create_user(username='alice', password='x', user_type='client')
+        self.bob = User.objects.create_user(username='bob', password='x', user_type='client')
+        self.api = APIClient()
+        self.api.force_authenticate(self.alice)
+
+    def test_repeat_request_is_served_from_cache(self):
+        make_booking(user=self.alice)
+        first = self.api.get('/api/user-bookings/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.api.get('/api/user-bookings/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(registry.extra['response_cache_hits_total'], 1)
+        self.assertEqual(registry.extra['response_cache_misses_total'], 1)
+
+    def test_write_for_the_user_invalidates_only_their_lists(self):
+        make_booking(user=self.alice)
+        self.api.get('/api/user-bookings/')
+        with self.captureOnCommitCallbacks(execute=True):
+            make_booking(user=self.bob)
+        self.assertEqual(self.api.get('/api/user-bookings/')['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            make_booking(user=self.alice, to_location='Pune')
+        response = self.api.get('/api/user-bookings/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()), 2)
+
+    def test_bump_waits_for_commit(self):
+        make_booking(user=self.alice)
+        self.api.get('/api/user-bookings/')
+        with self.captureOnCommitCallbacks() as callbacks:
+            make_booking(user=self.alice, to_location='Pune')
+            # Not committed: a list read now must not be cached under the next version
+            self.assertEqual(self.api.get('/api/user-bookings/')['X-Cache'], 'HIT')
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.api.get('/api/user-bookings/')['X-Cache'], 'MISS')
+
+    def test_all_bookings_list_uses_global_version_and_normalised_query(self):
+        make_booking(user=self.alice)
+        self.assertEqual(self.api.get('/api/customer-shipments/?page=1&ordering=lr_no')['X-Cache'], 'MISS')
+        self.assertEqual(self.api.get('/api/customer-shipments/?ordering=lr_no&search=&page=1')['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            make_booking(user=self.bob)
+        response = self.api.get('/api/customer-shipments/?page=1&ordering=lr_no')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_admin_action_bumps_versions(self):
+        booking = make_booking(user=self.alice, status='pending')
+        self.api.get('/api/user-bookings/')
+        Booking.objects.filter(pk=booking.pk).update(status='delayed')
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_booking_version([self.alice.id])
+        self.assertEqual(self.api.get('/api/user-bookings/').json()[0]['status'], 'delayed')
+
+    @override_settings(RESPONSE_CACHE={'ENABLED': True, 'MAX_ENTRIES': 2, 'MAX_BYTES': 1000})
+    def test_lru_bounds(self):
+        lru = ResponseCache()
+        lru.put('a', b'1' * 10, 'application/json')
+        lru.put('b', b'2' * 10, 'application/json')
+        lru.get('a')
+        lru.put('c', b'3' * 10, 'application/json')
+        self.assertEqual(list(lru.entries), ['a', 'c'])
+        lru.put('d', b'4' * 130, 'application/json')  # over MAX_BYTES / 8: not cached
+        self.assertEqual((list(lru.entries), lru.size), (['a', 'c'], 20))
+        self.assertEqual(registry.extra['response_cache_evictions_total'], 1)
+
+
+class FastJSONTests(TestCase):
+    def test_renderer_matches_drf_for_serialized_bookings(self):
+        make_booking(updates=[{'status': 'pending', 'location': 'Hyderabad', 'timestamp': '2024-01-01T10:00'}])
+        data = BookingSerializer(Booking.objects.all(), many=True).data
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+    def test_native_types(self):
+        payload = {
+            'amount': Decimal('12.50'), 'day': date(2024, 1, 2),
+            'at': datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.get_fixed_timezone(0)),
+            'count': np.int64(3), 1: 'non-str key',
+        }
+        self.assertEqual(json.loads(FastJSONRenderer().render(payload)), {
+            'amount': '12.50', 'day': '2024-01-02', 'at': '2024-01-02T03:04:05Z', 'count': 3, '1': 'non-str key',
+        })
+        self.assertIn(b'\n  ', FastJSONRenderer().render({'a': 1}, 'application/json; indent=4'))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_parser(self):
+        self.assertEqual(FastJSONParser().parse(io.BytesIO('{"city": "Pune ₹"}'.encode())), {'city': 'Pune ₹'})
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"city": '))
+
+    def test_plain_views_handle_bad_json(self):
+        response = self.client.post('/api/track_shipment/', b'{not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'Invalid JSON format.')
+        with self.assertRaises(TypeError):
+            JSONResponse([1, 2])
+
+
+@override_settings(THROTTLE={'ENABLED': False}, RESPONSE_CACHE={'ENABLED': False},
+                   COMPRESSION={'ENABLED': True, 'MIN_SIZE': 1024, 'GZIP_LEVEL': 6, 'BROTLI_LEVEL': None,
+                                'CONTENT_TYPES': ('application/json', 'text/')})
+class CompressionTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model().objects.create_user(username='ops', password='x', user_type='admin'))
+
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding('gzip, deflate, br', ['br', 'gzip']), 'br')
+        self.assertEqual(choose_encoding('br;q=0.5, gzip', ['br', 'gzip']), 'gzip')
+        self.assertEqual(choose_encoding('*;q=0.1, gzip;q=0', ['gzip']), None)
+        self.assertEqual(choose_encoding('*', ['gzip']), 'gzip')
+        self.assertEqual(choose_encoding('', ['gzip']), None)
+        self.assertEqual(choose_encoding('gzip;q=abc', ['gzip']), None)
+
+    def test_large_json_is_gzipped(self):
+        for _ in range(10):
+            make_booking()
+        plain = self.api.get('/api/customer-shipments/')
+        compressed = self.api.get('/api/customer-shipments/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertLess(int(compressed['Content-Length']), len(plain.content))
+        self.assertEqual(registry.extra['response_compressed_total'], 1)
+
+    def test_small_and_refused_responses_are_left_alone(self):
+        make_booking()
+        small = self.api.get('/api/user-bookings/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', small)
+        self.assertIn('Accept-Encoding', small['Vary'])
+        for _ in range(10):
+            make_booking()
+        refused = self.api.get('/api/customer-shipments/', HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertNotIn('Content-Encoding', refused)
+
+    def test_streaming_response(self):
+        rows = [f'{i},LR{i},Hyderabad,Chennai\n'.encode() for i in range(500)]
+        middleware = CompressionMiddleware(lambda request: StreamingHttpResponse(iter(rows), content_type='text/csv'))
+        response = middleware(RequestFactory().get('/export/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(rows))
+
+
+@override_settings(THROTTLE={'ENABLED': False})
+class BulkStatusUpdateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.agent = get_user_model().objects.create_user(username='hub', password='x', user_type='agent')
+        self.api = APIClient()
+        self.api.force_authenticate(self.agent)
+
+    def post(self, updates, **extra):
+        return self.api.post('/api/update-shipment-status/bulk/', {'updates': updates}, format='json', **extra)
+
+    def test_applies_scans_in_one_update(self):
+        first = make_booking(updates=[{'status': 'pending', 'location': 'Hyderabad', 'timestamp': '2024-01-01T10:00'}])
+        second = make_booking()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post([
+                {'lr_no': first.lr_no, 'status': 'in-transit', 'location': 'Nagpur hub', 'timestamp': '2024-01-02T08:30:00'},
+                {'lr_no': second.lr_no.lower(), 'status': 'delivered', 'location': 'Chennai'},
+                {'lr_no': first.lr_no, 'status': 'delayed', 'location': 'Nagpur hub', 'timestamp': '2024-01-02T09:00:00Z'},
+                {'lr_no': '999999', 'status': 'delivered'},
+            ])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['results'], {first.lr_no: 'delayed', second.lr_no: 'delivered'})
+        self.assertEqual(body['unknown'], ['999999'])
+        self.assertEqual(sum('UPDATE shipments_booking' in q['sql'] for q in queries.captured_queries), 1)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, 'delayed')
+        self.assertEqual([u['status'] for u in first.updates], ['pending', 'in-transit', 'delayed'])
+        self.assertEqual(first.updates[1], {'status': 'in-transit', 'location': 'Nagpur hub', 'timestamp': '2024-01-02T08:30:00'})
+        self.assertEqual(first.updates[2]['timestamp'], timezone.localtime(
+            datetime(2024, 1, 2, 9, tzinfo=timezone.get_fixed_timezone(0))).strftime('%Y-%m-%dT%H:%M:%S'))
+        self.assertIsNone(first.delivered_at)
+        self.assertIsNotNone(second.delivered_at)
+        self.assertEqual(second.updates[0]['location'], 'Chennai')
+
+    def test_delivered_at_is_the_scan_time(self):
+        bulk, single, delivered = make_booking(), make_booking(), make_booking(status='delivered')
+        stamped = delivered.delivered_at
+        self.post([{'lr_no': bulk.lr_no, 'status': 'delivered', 'timestamp': '2024-01-02T08:30:00+00:00'},
+                   {'lr_no': delivered.lr_no, 'status': 'delivered', 'timestamp': '2024-01-02T08:30:00+00:00'}])
+        self.api.post('/api/update-shipment-status/', {'lr_no': single.lr_no, 'status': 'delivered',
+                                                       'timestamp': '2024-01-03T17:45:00+00:00'}, format='json')
+        utc = timezone.get_fixed_timezone(0)
+        self.assertEqual(Booking.objects.get(pk=bulk.pk).delivered_at, datetime(2024, 1, 2, 8, 30, tzinfo=utc))
+        self.assertEqual(Booking.objects.get(pk=single.pk).delivered_at, datetime(2024, 1, 3, 17, 45, tzinfo=utc))
+        # A booking already delivered keeps its first stamp
+        self.assertEqual(Booking.objects.get(pk=delivered.pk).delivered_at, stamped)
+
+    def test_invalidates_cached_lists(self):
+        booking = make_booking(user=self.agent, status='pending')
+        self.assertEqual(self.api.get('/api/user-bookings/').json()[0]['status'], 'pending')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post([{'lr_no': booking.lr_no, 'status': 'in-transit'}])
+        self.assertEqual(self.api.get('/api/user-bookings/').json()[0]['status'], 'in-transit')
+
+    def test_validation_and_permissions(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post([{'lr_no': '1'}]).status_code, 400)
+        self.assertEqual(self.post([{'lr_no': '1', 'status': 'x', 'timestamp': 'yesterday'}]).status_code, 400)
+        with override_settings(STATUS_BULK_LIMIT=1):
+            self.assertEqual(self.post([{'lr_no': '1', 'status': 'x'}] * 2).status_code, 400)
+        client = get_user_model().objects.create_user(username='shopper', password='x', user_type='client')
+        self.api.force_authenticate(client)
+        self.assertEqual(self.post([{'lr_no': '1', 'status': 'x'}]).status_code, 403)
+
+
+@override_settings(THROTTLE={'ENABLED': False}, CONSIGNMENT_NOTE_CHUNK_SIZE=2, CONSIGNMENT_NOTE_POOL_MIN=1000)
+class ConsignmentNoteTests(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model().objects.create_user(username='hub', password='x', user_type='agent'))
+        self.today = timezone.localdate()
+        self.bookings = [
+            make_booking(consignor=f'Sender {i}', pickup_address={'name': 'x', 'address': f'{i} MG Road', 'city': 'Hyderabad'})
+            for i in range(5)
+        ]
+
+    def test_streams_one_document_with_a_page_per_copy(self):
+        response = self.api.post('/api/consignment-notes/', {
+            'start_date': self.today.isoformat(), 'end_date': self.today.isoformat(), 'copies': 2,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['X-Notes-Count'], '5')
+        html = b''.join(response.streaming_content).decode()
+        self.assertEqual(html.count('<html'), 1)
+        self.assertEqual(html.count('<section class="note">'), 10)
+        self.assertEqual(html.count('Driver copy'), 0)
+        self.assertIn('3 MG Road', html)
+        self.assertIn('<strong>590.00</strong>', html)  # 500 freight + 45 SGST + 45 CGST
+        # Booking order survives chunking
+        positions = [html.index(f'LR No. {b.lr_no}<') for b in self.bookings]
+        self.assertEqual(positions, sorted(positions))
+
+    @override_settings(THROTTLE={'ENABLED': True, 'USER_RATE': 100, 'USER_BURST': 100, 'ANON_RATE': 100,
+                                 'ANON_BURST': 100, 'COSTS': {'consignment_notes': 1},
+                                 'CONCURRENCY': {'consignment_notes': 2}})
+    def test_streams_hold_their_concurrency_slot_until_closed(self):
+        cache.clear()
+        post = lambda: self.api.post('/api/consignment-notes/', {'lr_nos': [self.bookings[0].lr_no]}, format='json')
+        streams = [post(), post()]
+        self.assertEqual([r.status_code for r in streams], [200, 200])
+        self.assertEqual(post().status_code, 503)
+        b''.join(streams[0].streaming_content)  # sent to the end: the client closes it
+        third = post()
+        self.assertEqual(third.status_code, 200)
+        for response in (streams[1], third):
+            b''.join(response.streaming_content)
+        self.assertEqual(cache.get('inflight:consignment_notes'), 0)
+
+    def test_lr_selection_and_validation(self):
+        response = self.api.post('/api/consignment-notes/', {'lr_nos': [self.bookings[1].lr_no], 'copies': 1}, format='json')
+        self.assertEqual(b''.join(response.streaming_content).decode().count('<section class="note">'), 1)
+        self.assertEqual(self.api.post('/api/consignment-notes/', {}, format='json').status_code, 400)
+        self.assertEqual(self.api.post('/api/consignment-notes/', {'start_date': '01/02/2024'}, format='json').status_code, 400)
+        with override_settings(CONSIGNMENT_NOTE_MAX=4):
+            self.assertEqual(self.api.post('/api/consignment-notes/', {'start_date': self.today.isoformat()},
+                                           format='json').status_code, 400)
+
+    def test_command_renders_in_a_process_pool(self):
+        out = io.StringIO()
+        call_command('render_consignment_notes', '--from', self.today.isoformat(), '--copies', '1', '--workers', '2',
+                     stdout=out)
+        html = out.getvalue()
+        self.assertEqual(html.count('<section class="note">'), 5)
+        self.assertTrue(html.rstrip().endswith('</html>'))
+
+
+@override_settings(THROTTLE={'ENABLED': False}, RESPONSE_CACHE={'ENABLED': False})
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        User = get_user_model()
+        self.admin = User.objects.create_user(username='ops', password='x', user_type='admin')
+        self.client_user = User.objects.create_user(username='shopper', password='x', user_type='client')
+        make_booking()
+
+    def enable(self, **options):
+        override = override_settings(PROFILING={'ENABLED': True, 'DIR': self.root, 'KEEP': 50, **options})
+        override.enable()
+        self.addCleanup(override.disable)
+        registry.reset()
+        return APIClient()  # builds its middleware chain with the settings above
+
+    def login(self, api, user):
+        # A real bearer token: the middleware looks at the request before DRF authentication
+        api.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(user).access_token}')
+
+    def test_disabled_middleware_drops_out(self):
+        with override_settings(PROFILING={'ENABLED': False}), self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+
+    def test_staff_request_is_profiled_with_sql(self):
+        api = self.enable()
+        self.login(api, self.admin)
+        response = api.get('/api/customer-shipments/', HTTP_X_PROFILE='1')
+        name = response['X-Profile-Name']
+        listing = api.get('/api/profiles/').json()['profiles']
+        self.assertEqual([p['name'] for p in listing], [name])
+        self.assertEqual(listing[0]['view'], 'customer_shipments')
+
+        report = api.get(f'/api/profiles/{name}/').json()
+        self.assertGreater(report['queries'], 0)
+        self.assertIn('shipments_booking', report['sql'][0]['sql'])
+        self.assertTrue(any('views.py' in f['function'] for f in report['functions']))
+        download = api.get(f'/api/profiles/{name}/', {'download': 1})
+        stats = pstats.Stats(os.path.join(self.root, f'{name}.prof'))
+        self.assertTrue(stats.total_calls)
+        self.assertEqual(download['Content-Disposition'], f'attachment; filename="{name}.prof"')
+        self.assertEqual(api.get('/api/profiles/../secrets/').status_code, 404)
+
+    def test_header_is_ignored_for_non_staff(self):
+        api = self.enable()
+        self.login(api, self.client_user)
+        response = api.get('/api/user-bookings/', HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Name', response)
+        self.assertEqual(os.listdir(self.root), [])
+        self.assertEqual(api.get('/api/profiles/').status_code, 403)
+
+    def test_sampling_mode_and_ring(self):
+        api = self.enable(SAMPLE_RATE=1.0, MODE='sample', SAMPLE_INTERVAL=0.001, KEEP=2)
+        self.login(api, self.admin)
+        for _ in range(4):
+            api.get('/api/customer-shipments/')
+        self.assertEqual(len([n for n in os.listdir(self.root) if n.endswith('.json')]), 2)
+        self.assertFalse([n for n in os.listdir(self.root) if n.endswith('.prof')])
+        self.assertGreaterEqual(registry.extra['profiles_captured_total'], 4)
+
+    def test_streamed_response_is_saved_after_the_body(self):
+        api = self.enable()
+        self.login(api, self.admin)
+        response = api.post('/api/consignment-notes/', {'lr_nos': [Booking.objects.get().lr_no]}, format='json',
+                            HTTP_X_PROFILE='1')
+        self.assertEqual(os.listdir(self.root), [])
+        b''.join(response.streaming_content)
+        self.assertEqual(len([n for n in os.listdir(self.root) if n.endswith('.json')]), 1)
+
+
+def wal_bytes(write):
+    """WAL generated by ``write()``, from the WAL insert position around it."""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_current_wal_insert_lsn()')
+        start = cursor.fetchone()[0]
+        write()
+        cursor.execute('SELECT pg_wal_lsn_diff(pg_current_wal_insert_lsn(), %s)', [start])
+        return int(cursor.fetchone()[0])
+
+
+@override_settings(THROTTLE={'ENABLED': False})
+class BookingVersionTests(TestCase):
+    def setUp(self):
+        # Big and incompressible enough to be stored out of line (TOAST), like a long-haul history
+        rng = np.random.default_rng(46)
+        self.history = [{'status': 'in-transit', 'location': rng.bytes(12).hex(), 'timestamp': '2024-01-01T10:00:00'}
+                        for i in range(300)]
+
+    def test_compare_and_swap(self):
+        booking = make_booking()
+        stale = Booking.objects.get(pk=booking.pk)
+        booking.update_if_current(status='delivered')
+        self.assertEqual(booking.version, 2)
+        self.assertIsNotNone(booking.delivered_at)
+        with self.assertRaises(BookingConflict):
+            stale.update_if_current(status='delayed')
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, 'delivered')
+
+    def test_narrow_save_writes_less_wal_than_a_full_save(self):
+        booking = make_booking(updates=self.history)
+        booking.status = 'delayed'
+        full = wal_bytes(lambda: booking.save())
+        booking.status = 'in-transit'
+        narrow = wal_bytes(lambda: booking.save(update_fields=['status']))
+        cas = wal_bytes(lambda: booking.update_if_current(status='delivered'))
+        self.assertLess(narrow * 3, full)
+        self.assertLess(cas * 3, full)
+        self.assertEqual(Booking.objects.get(pk=booking.pk).version, 4)
+
+    def test_api_reports_conflicts(self):
+        booking = make_booking()
+        api = APIClient()
+        post = lambda **data: api.post('/api/update-shipment-status/', {'lr_no': booking.lr_no, **data}, format='json')
+        first = post(status='in-transit', location='Nagpur hub', version=1)
+        self.assertEqual(first.json(), {'success': True, 'lr_no': booking.lr_no, 'status': 'in-transit', 'version': 2})
+        conflict = post(status='delayed', version=1)
+        self.assertEqual(conflict.status_code, 409)
+        self.assertEqual((conflict.json()['status'], conflict.json()['version']), ('in-transit', 2))
+        self.assertEqual(post(status='delivered').json()['version'], 3)  # no version: last writer appends
+        booking.refresh_from_db()
+        self.assertEqual([u['status'] for u in booking.updates], ['in-transit', 'delivered'])
+        self.assertEqual(booking.updates[0]['location'], 'Nagpur hub')
+
+
+@override_settings(THROTTLE={'ENABLED': False}, BOOKING_UPDATE_RETRIES=50)
+class BookingConcurrencyTests(TransactionTestCase):
+    def test_concurrent_status_updates_lose_nothing(self):
+        booking = make_booking()
+        start = threading.Barrier(4)
+        responses = []
+
+        def hub(name):
+            try:
+                client = APIClient()
+                start.wait()
+                for i in range(10):
+                    responses.append(client.post('/api/update-shipment-status/', {
+                        'lr_no': booking.lr_no, 'status': 'in-transit', 'location': f'{name}-{i}',
+                    }, format='json'))
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=hub, args=(f'hub{n}',)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        booking.refresh_from_db()
+        self.assertEqual({r.status_code for r in responses}, {200})
+        # Every acknowledged scan is in the history exactly once
+        self.assertEqual(sorted(u['location'] for u in booking.updates),
+                         sorted(f'hub{n}-{i}' for n in range(4) for i in range(10)))
+        self.assertEqual(booking.version, 41)
+
+
+@override_settings(THROTTLE={'ENABLED': False}, AUTOCOMPLETE_SYNC_INTERVAL=3600)
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        autocomplete_index.reset()
+        self.addCleanup(autocomplete_index.reset)
+
+    def test_prefix_index_ranks_by_count_and_matches_word_starts(self):
+        spellings = {
+            'hyderabad': {'Hyderabad': 5, 'HYDERABAD': 1},
+            'hydel colony': {'Hydel Colony': 2},
+            'old hyde park': {'Old Hyde Park': 9},
+            'chennai': {'Chennai': 7},
+        }
+        index = PrefixIndex(spellings, top_k=10, cutoff=2)
+        self.assertEqual(index.search(' HYD', 10), [
+            {'value': 'Old Hyde Park', 'count': 9}, {'value': 'Hyderabad', 'count': 6},
+            {'value': 'Hydel Colony', 'count': 2},
+        ])
+        self.assertEqual([r['value'] for r in index.search('hyde', 1)], ['Old Hyde Park'])
+        self.assertEqual(index.search('pune', 10), [])
+        self.assertEqual(index.search('  ', 10), [])
+        # 'h' and 'hy' match more than cutoff entries, so their answers are precomputed
+        self.assertIn('hy', index.top)
+        self.assertEqual([r['value'] for r in index.search('h', 2)], ['Old Hyde Park', 'Hyderabad'])
+
+    def test_endpoint_picks_up_new_bookings(self):
+        make_booking(from_location='Hyderabad', to_location='Chennai', consignor='Rahul Sharma')
+        make_booking(from_location='hyderabad ', to_location='Chanda', consignor='Rahul Sharma')
+        Pincode.objects.create(pincode='500001', latitude=17.4, longitude=78.5, district='HYDERABAD NORTH')
+        api = APIClient()
+        response = api.get('/api/autocomplete/', {'q': 'hy'})
+        self.assertEqual(response.json()['results'], [
+            {'value': 'Hyderabad', 'count': 2}, {'value': 'Hyderabad North', 'count': 0},
+        ])
+        self.assertEqual([r['value'] for r in api.get('/api/autocomplete/', {'q': 'ch'}).json()['results']],
+                         ['Chanda', 'Chennai'])
+
+        make_booking(from_location='Chennai', to_location='Chennai')
+        autocomplete_index.refresh()  # what the background thread does once AUTOCOMPLETE_SYNC_INTERVAL passes
+        self.assertEqual(api.get('/api/autocomplete/', {'q': 'ch', 'limit': 1}).json()['results'],
+                         [{'value': 'Chennai', 'count': 3}])
+
+    def test_full_reload_after_a_value_is_replaced(self):
+        booking = make_booking(from_location='Hyderabad', to_location='Pune')
+        autocomplete_index.refresh(full=True)
+        Booking.objects.filter(pk=booking.pk).update(to_location='Chennai')
+        # Same number of distinct values as before, but not the same values
+        autocomplete_index.refresh(full=True)
+        self.assertEqual([r['value'] for r in autocomplete_index.search('location', 'c')], ['Chennai'])
+        self.assertEqual(autocomplete_index.search('location', 'pu'), [])
+
+    def test_party_names_are_for_hub_staff(self):
+        make_booking(consignor='Rahul Sharma', consignee='Sharma Traders')
+        api = APIClient()
+        self.assertEqual(api.get('/api/autocomplete/', {'field': 'consignor', 'q': 'sh'}).status_code, 403)
+        self.assertEqual(api.get('/api/autocomplete/', {'field': 'pincode', 'q': '5'}).status_code, 400)
+        agent = get_user_model().objects.create_user(username='hub', password='x', user_type='agent')
+        api.force_authenticate(agent)
+        response = api.get('/api/autocomplete/', {'field': 'consignor', 'q': 'sh'})
+        self.assertEqual(response.json()['results'], [{'value': 'Rahul Sharma', 'count': 1}])
+
+
+@override_settings(THROTTLE={'ENABLED': False}, SLA_BUCKET_HOURS=[6, 12], SLA_BREACH_LOOKBACK_HOURS=72)
+class SlaTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        due = lambda hours, **kwargs: make_booking(delivery_deadline=self.now + timedelta(hours=hours), **kwargs)
+        self.late = due(-5, service_type='economy', status='delayed')
+        self.soon_economy = due(3, service_type='economy')
+        self.soon_express = due(5, service_type='Express ')
+        self.later = due(20, service_type='standard', status='pending')
+        due(-200, status='in-transit')      # breached long ago: alerted back then
+        due(2, status='delivered')
+        due(30, service_type='express')     # beyond the horizon
+
+    def test_deadline_follows_service_type(self):
+        booking = make_booking(service_type='Express')
+        self.assertAlmostEqual((booking.delivery_deadline - timezone.now()).total_seconds(), 2 * 86400, delta=60)
+
+    def test_buckets_rank_by_priority(self):
+        names, shipments = at_risk_shipments(24, self.now)
+        self.assertEqual(names, ['breached', 'due_6h', 'due_12h', 'due_24h'])
+        self.assertEqual([(s['lr_no'], s['bucket']) for s in shipments], [
+            (self.late.lr_no, 'breached'), (self.soon_express.lr_no, 'due_6h'),
+            (self.soon_economy.lr_no, 'due_6h'), (self.later.lr_no, 'due_24h'),
+        ])
+        self.assertEqual(shipments[0]['hours_left'], -5.0)
+
+    def test_repeat_alerts_are_suppressed(self):
+        first = detect_sla_breaches(24, self.now)
+        self.assertEqual(first['new_alerts'], 4)
+        self.assertTrue(all(s['new_alert'] for b in first['buckets'] for s in b['shipments']))
+        self.assertEqual(detect_sla_breaches(24, self.now)['new_alerts'], 0)
+
+        # Missing the deadline is a new alert, and so is a new deadline
+        self.assertEqual(detect_sla_breaches(24, self.now + timedelta(hours=4))['new_alerts'], 1)
+        self.soon_economy.update_if_current(delivery_deadline=self.now + timedelta(hours=10))
+        self.assertEqual(detect_sla_breaches(24, self.now + timedelta(hours=4))['new_alerts'], 1)
+        self.assertEqual(SlaAlert.objects.filter(booking=self.soon_economy).count(), 3)
+
+    def test_detector_reads_only_the_at_risk_range(self):
+        with connection.cursor() as cursor, CaptureQueriesContext(connection) as queries:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            at_risk_shipments(24, self.now)
+            cursor.execute(f'EXPLAIN {queries[-1]["sql"]}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('booking_status_deadline_idx', plan)
+
+    def test_endpoint_and_backfill(self):
+        api = APIClient()
+        api.force_authenticate(get_user_model().objects.create_user(username='hub', password='x', user_type='agent'))
+        detect_sla_breaches(24, self.now)
+        Booking.objects.filter(pk=self.later.pk).update(delivery_deadline=None, booking_date=self.now.date())
+        report = api.get('/api/sla/at-risk/', {'hours': 12}).json()
+        self.assertEqual([(b['bucket'], b['count']) for b in report['buckets']],
+                         [('breached', 1), ('due_6h', 2), ('due_12h', 0)])
+        self.assertTrue(report['buckets'][1]['shipments'][0]['alerted'])
+        self.assertEqual(api.get('/api/sla/at-risk/', {'hours': 'soon'}).status_code, 400)
+
+        self.assertEqual(backfill_delivery_deadlines(), 1)
+        self.later.refresh_from_db()
+        self.assertEqual(self.later.delivery_deadline.date(), self.now.date() + timedelta(days=4))
+
+
+class ColumnarExtractTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(COLUMNAR_DIR=directory.name, COLUMNAR_KEEP_VERSIONS=1)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.first = make_booking(booking_date=date(2024, 3, 1), service_type='express', freight=Decimal('1234.56'),
+                                  status='delivered', delivered_at=datetime(2024, 3, 3, 10, 30, tzinfo=timezone.get_fixed_timezone(0)))
+        self.second = make_booking(to_location='Pune', freight=None, weight=None, updates=[{'status': 'in-transit'}])
+
+    def test_columns_are_typed_and_memory_mapped(self):
+        _, written = extract_columnar()
+        self.assertEqual(written, 2)
+        extract = ColumnarExtract()
+        freight = extract.column('freight_paise')
+        self.assertIsInstance(freight, np.memmap)
+        self.assertEqual(freight.tolist(), [123456, 0])
+        self.assertEqual(extract.column('booking_date')[0], np.datetime64('2024-03-01'))
+        self.assertEqual(extract.column('delivered_at')[0], np.datetime64('2024-03-03T10:30:00'))
+        self.assertTrue(np.isnat(extract.column('delivered_at')[1]))
+        self.assertTrue(np.isnan(extract.column('weight')[1]))
+        self.assertEqual(extract.column('scans').tolist(), [0, 1])
+        self.assertEqual(extract.decode('to_location', extract.column('to_location')), ['Chennai', 'Pune'])
+        self.assertEqual(extract.decode('service_type', extract.column('service_type')), ['express', None])
+        # from and to share one dictionary, so lanes compare codes directly
+        self.assertEqual(extract.dictionary('from_location'), ['Hyderabad', 'Chennai', 'Pune'])
+        self.assertEqual(extract.column('lr_no').tolist(), [self.first.lr_no.encode(), self.second.lr_no.encode()])
+
+    def test_appends_only_new_rows_and_full_starts_a_version(self):
+        first_version, _ = extract_columnar()
+        third = make_booking(from_location='Pune', to_location='Nagpur', status='pending')
+        version, written = extract_columnar()
+        self.assertEqual((version, written), (first_version, 1))
+        self.assertEqual(extract_columnar()[1], 0)
+        extract = ColumnarExtract()
+        self.assertEqual([p['rows'] for p in extract.manifest['parts']], [2, 1])
+        self.assertEqual(extract.column('id').tolist(), [self.first.id, self.second.id, third.id])
+        self.assertEqual(extract.decode('from_location', extract.parts('from_location')[1]), ['Pune'])
+        self.assertEqual(extract.dictionary('status'), ['delivered', 'in-transit', 'pending'])
+
+        # A run that died between renaming its part into place and writing the manifest
+        stale = version / 'part-00003'
+        stale.mkdir()
+        (stale / 'id.npy').write_bytes(b'partial')
+        make_booking()
+        self.assertEqual(extract_columnar()[1], 1)
+        self.assertEqual([p['rows'] for p in ColumnarExtract().manifest['parts']], [2, 1, 1])
+
+        Booking.objects.filter(pk=self.second.pk).update(status='delivered')
+        version, written = extract_columnar(full=True)
+        self.assertEqual((version.name, written), ('v0002', 4))
+        self.assertFalse(first_version.exists())
+        extract = ColumnarExtract()
+        self.assertEqual(extract.decode('status', extract.column('status'))[:3], ['delivered', 'delivered', 'pending'])
+
+
+class TariffTests(TestCase):
+    def setUp(self):
+        self.tariff = TariffVersion.objects.create(name='April', effective_from=date(2024, 4, 1), sgst_bp=900, cgst_bp=900)
+        TariffRate.objects.create(tariff=self.tariff, base_paise=0, per_kg_paise=2000, min_paise=15000)
+        TariffRate.objects.create(tariff=self.tariff, from_location='hyderabad', to_location='Chennai',
+                                  service_type='express', base_paise=5000, per_kg_paise=3000)
+        self.lane = make_booking(payment_method='cash_on_delivery', service_type='Express', chargeable_weight=Decimal('12.35'))
+        self.light = make_booking(payment_method='TBB', to_location='Pune', status='pending', chargeable_weight=Decimal('5'))
+        self.correct = make_booking(payment_method='tbb', chargeable_weight=Decimal('25'), freight=Decimal('500.00'))
+        self.delivered = make_booking(payment_method='cash_on_delivery', status='delivered', chargeable_weight=Decimal('1'))
+        self.prepaid = make_booking(payment_method='credit', chargeable_weight=Decimal('1'))
+
+    def charges(self, booking):
+        booking.refresh_from_db()
+        return booking.freight, booking.sgst, booking.cgst
+
+    def test_rates_fall_back_and_round_half_up(self):
+        card = RateCard(self.tariff)
+        freight, sgst, cgst, rated = card.charges(
+            [('Hyderabad ', 'chennai', 'EXPRESS'), ('Pune', 'Delhi', 'economy')], np.array([1235, 500]),
+        )
+        # 50 + 30 x 12.35 = 420.50, GST 9% = 37.845 -> 37.85; the second hits the 150 minimum
+        self.assertEqual((freight.tolist(), sgst.tolist(), cgst.tolist()), ([42050, 15000], [3785, 1350], [3785, 1350]))
+        self.assertTrue(rated.all())
+        self.assertEqual(current_tariff(date(2024, 3, 31)), None)
+        self.assertEqual(current_tariff(), self.tariff)
+
+    def test_dry_run_reports_without_writing(self):
+        diffs = []
+        run = rerate_bookings(self.tariff, dry_run=True, on_batch=diffs.extend)
+        self.assertEqual((run.scanned, run.changed, run.unrated, run.status), (3, 2, 0, 'done'))
+        self.assertEqual([d['lr_no'] for d in diffs], [self.lane.lr_no, self.light.lr_no])
+        self.assertEqual((diffs[0]['old_freight'], diffs[0]['new_freight'], diffs[0]['new_sgst']),
+                         (Decimal('500.00'), Decimal('420.50'), Decimal('37.85')))
+        self.assertEqual(self.charges(self.lane), (Decimal('500.00'), Decimal('45.00'), Decimal('45.00')))
+        self.assertEqual(run.freight_delta_paise, (42050 - 50000) + (15000 - 50000))
+
+    def test_rerate_writes_changed_open_unbilled_bookings(self):
+        run = rerate_bookings(self.tariff)
+        self.assertEqual((run.scanned, run.changed), (3, 2))
+        self.assertEqual(self.charges(self.lane), (Decimal('420.50'), Decimal('37.85'), Decimal('37.85')))
+        self.assertEqual(self.charges(self.light), (Decimal('150.00'), Decimal('13.50'), Decimal('13.50')))
+        self.assertEqual(self.lane.version, 2)
+        for untouched in (self.correct, self.delivered, self.prepaid):
+            self.assertEqual(self.charges(untouched), (Decimal('500.00'), Decimal('45.00'), Decimal('45.00')))
+            self.assertEqual(untouched.version, 1)
+
+    def test_interrupted_run_resumes(self):
+        def interrupt(rows):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            rerate_bookings(self.tariff, batch_size=1, on_batch=interrupt)
+        stopped = RerateRun.objects.get()
+        self.assertEqual((stopped.status, stopped.last_id, stopped.changed), ('running', self.lane.id, 1))
+        self.assertEqual(self.charges(self.lane)[0], Decimal('420.50'))
+
+        run = rerate_bookings(self.tariff, batch_size=1)
+        self.assertEqual((run.pk, run.status, run.scanned, run.changed), (stopped.pk, 'done', 3, 2))
+        self.assertEqual(self.charges(self.light)[0], Decimal('150.00'))
+        self.assertEqual(rerate_bookings(self.tariff, restart=True).changed, 0)
@@ -0,0 +1,206 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'CACHE': 'default',
+    'ANON_RATE': 5.0,     # tokens per second per IP
+    'ANON_BURST': 40,
+    'USER_RATE': 10.0,    # tokens per second per authenticated user
+    'USER_BURST': 80,
+    'TRUSTED_PROXIES': 0,  # how many X-Forwarded-For hops to trust (nginx in front = 1)
+    'COSTS': {},          # url name -> tokens per request; unlisted views are not throttled
+    'CONCURRENCY': {},    # url name -> max in-flight requests across all workers
+    'CONCURRENCY_TTL': 120,
+}
+
+
+def throttle_settings():
+    return {**DEFAULTS, **getattr(settings, 'THROTTLE', {})}
+
+
+class LocalBuckets:
+    """Per-process token buckets.
+
+    Deliberately lock-free: each bucket is a two-item list mutated in place, and
+    a lost update between threads only lets through a fraction of one request.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.buckets = {}
+        self.max_keys = max_keys
+
+    def take(self, key, rate, burst, cost, now):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_keys:
+                self.buckets.clear()
+            bucket = self.buckets[key] = [float(burst), now]
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= cost:
+            bucket[0] = tokens - cost
+            return 0.0
+        bucket[0] = tokens
+        return (cost - tokens) / rate
+
+
+class CacheBuckets:
+    """Token buckets in the shared Django cache so every worker sees the same budget."""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def take(self, key, rate, burst, cost, now):
+        cache = caches[self.alias]
+        tokens, updated = cache.get(key) or (float(burst), now)
+        tokens = min(burst, tokens + (now - updated) * rate)
+        retry_after = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            retry_after = (cost - tokens) / rate
+        # get/set is not atomic; concurrent workers can over-admit by a request or two
+        cache.set(key, (tokens, now), timeout=int(burst / rate) + 1)
+        return retry_after
+
+
+class ConcurrencyLimiter:
+    """In-flight counters per view, shared through the cache, local if the cache is down."""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.local = {}
+
+    def acquire(self, name, limit, ttl):
+        key = f'inflight:{name}'
+        try:
+            cache = caches[self.alias]
+            # the TTL clears counts leaked by a worker that died mid-request
+            cache.add(key, 0, timeout=ttl)
+            current = cache.incr(key)
+            if current > limit:
+                cache.decr(key)
+                return None
+            return ('cache', key)
+        except Exception:
+            current = self.local.get(key, 0) + 1
+            if current > limit:
+                return None
+            self.local[key] = current
+            return ('local', key)
+
+    def release(self, slot):
+        where, key = slot
+        if where == 'local':
+            self.local[key] = max(0, self.local.get(key, 1) - 1)
+            return
+        try:
+            caches[self.alias].decr(key)
+        except Exception:  # key expired or cache went away; TTL handles the rest
+            pass
+
+
+def client_ip(request, trusted_proxies):
+    if trusted_proxies:
+        forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+        if len(forwarded) >= trusted_proxies:
+            return forwarded[-trusted_proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def token_user_id(request):
+    # Throttling runs before DRF authentication, so peek at the bearer token here
+    from .authentication import ClaimsJWTAuthentication
+
+    auth = ClaimsJWTAuthentication()
+    header = auth.get_header(request)
+    if header is None:
+        return None
+    raw = auth.get_raw_token(header)
+    if raw is None:
+        return None
+    try:
+        return auth.get_validated_token(raw).get('user_id')
+    except Exception:
+        return None
+
+
+class Throttle:
+    def __init__(self):
+        conf = throttle_settings()
+        self.local = LocalBuckets()
+        self.shared = CacheBuckets(conf['CACHE']) if conf['CACHE'] else None
+        self.concurrency = ConcurrencyLimiter(conf['CACHE'])
+
+    def take(self, key, rate, burst, cost):
+        now = time.time()
+        if self.shared is not None:
+            try:
+                return self.shared.take(key, rate, burst, cost, now)
+            except Exception:
+                logger.warning('Throttle cache unavailable, using per-process buckets', exc_info=True)
+        return self.local.take(key, rate, burst, cost, now)
+
+
+class ThrottleMiddleware:
+    """Token-bucket rate limiting plus load shedding for the public endpoints.
+
+    Each throttled URL name has a cost in tokens (exports cost far more than a
+    tracking lookup). Clients are keyed by user id when they send a valid JWT,
+    by IP otherwise. Views with a CONCURRENCY ceiling fail fast with 503 when
+    that many are already running instead of queueing behind the workers.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.throttle = Throttle()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        slot = getattr(request, '_throttle_slot', None)
+        if slot is not None:
+            if response.streaming:
+                # The work happens as the body is sent; hold the slot until the server closes the response
+                response._resource_closers.append(lambda: self.throttle.concurrency.release(slot))
+            else:
+                self.throttle.concurrency.release(slot)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        conf = throttle_settings()
+        name = request.resolver_match.url_name if request.resolver_match else None
+        cost = conf['COSTS'].get(name)
+        if not conf['ENABLED'] or not cost:
+            return None
+
+        user_id = token_user_id(request)
+        if user_id is not None:
+            key, rate, burst = f'tb:user:{user_id}', conf['USER_RATE'], conf['USER_BURST']
+        else:
+            key, rate, burst = f'tb:ip:{client_ip(request, conf["TRUSTED_PROXIES"])}', conf['ANON_RATE'], conf['ANON_BURST']
+        retry_after = self.throttle.take(key, rate, burst, min(cost, burst))
+        if retry_after:
+            registry.inc('throttle_rejected_total')
+            response = JsonResponse({'success': False, 'message': 'Too many requests. Please slow down.'}, status=429)
+            response['Retry-After'] = str(max(1, round(retry_after)))
+            return response
+
+        limit = conf['CONCURRENCY'].get(name)
+        if limit:
+            slot = self.throttle.concurrency.acquire(name, limit, conf['CONCURRENCY_TTL'])
+            if slot is None:
+                registry.inc('throttle_shed_total')
+                response = JsonResponse({'success': False, 'message': 'Server is busy. Please retry shortly.'}, status=503)
+                response['Retry-After'] = '1'
+                return response
+            request._throttle_slot = slot
+        return None
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from shipments.views import ShipmentViewSet, register_user, create_booking, track_shipment, api_login, export_shipments, export_customer_shipments_csv, export_all_customer_shipments_csv, update_shipment_status, CustomerShipmentsListView, user_bookings, contact_us_api
+from shipments.views import ShipmentViewSet, register_user, create_booking, track_shipment, track_shipment_batch, api_login, export_shipments, export_customer_shipments_csv, export_all_customer_shipments_csv, update_shipment_status, update_shipment_status_bulk, CustomerShipmentsListView, user_bookings, contact_us_api, route_summary_report, metrics, token_refresh, api_logout, dispatch_plan, load_plan, consignment_notes, profiles, profile_detail, autocomplete, sla_at_risk
 
 router = DefaultRouter()
 router.register(r'shipments', ShipmentViewSet)
@@ -10,14 +10,27 @@ urlpatterns = [
     path('api/register', register_user, name='register_user'),
     path('api/bookings/', create_booking, name='create_booking'),
     path('api/track_shipment/', track_shipment, name='track_shipment'),
+    path('api/track_shipment/batch/', track_shipment_batch, name='track_shipment_batch'),
     path('api/login', api_login, name='api_login'),
+    path('api/token/refresh/', token_refresh, name='token_refresh'),
+    path('api/logout', api_logout, name='api_logout'),
     path('api/customer-shipments/', CustomerShipmentsListView.as_view(), name='customer_shipments'),
     path('api/export-shipments/', export_shipments, name='export_shipments'),
     path('api/export-customer-shipments-csv/', export_customer_shipments_csv, name='export_customer_shipments_csv'),
     path('api/export-all-customer-shipments-csv/', export_all_customer_shipments_csv, name='export_all_customer_shipments_csv'),
     path('api/update-shipment-status/', update_shipment_status, name='update_shipment_status'),
+    path('api/update-shipment-status/bulk/', update_shipment_status_bulk, name='update_shipment_status_bulk'),
     path('api/user-bookings/', user_bookings, name='user_bookings'),
     path('api/contact/', contact_us_api, name='contact_us_api'),
+    path('api/reports/routes/', route_summary_report, name='route_summary_report'),
+    path('api/dispatch/plan/', dispatch_plan, name='dispatch_plan'),
+    path('api/loadplan/', load_plan, name='load_plan'),
+    path('api/consignment-notes/', consignment_notes, name='consignment_notes'),
+    path('api/profiles/', profiles, name='profiles'),
+    path('api/profiles/<str:name>/', profile_detail, name='profile_detail'),
+    path('api/autocomplete/', autocomplete, name='autocomplete'),
+    path('api/sla/at-risk/', sla_at_risk, name='sla_at_risk'),
+    path('metrics', metrics, name='metrics'),
     # Router LAST
     path('api/', include(router.urls)),
 ]
\ No newline at end of file
@@ -2,29 +2,35 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.urls import reverse
-from .models import Shipment, Booking
+from .models import Shipment, Booking, BookingConflict, RouteSummaryDirtyWeek
 from .forms import AgentRegistrationForm
 from decimal import Decimal
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import serializers, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from datetime import datetime
+from datetime import datetime, timezone as dt_timezone
+from django.utils import timezone
 from django.db.models import Q, Max
+from django.db.models.functions import Upper
 from django.db import transaction, IntegrityError
 import uuid
 import openpyxl
 import csv
-from .serializers import ShipmentSerializer, BookingSerializer
+from .serializers import ShipmentSerializer, BookingSerializer, TokenRefreshSerializer
 from rest_framework.viewsets import ModelViewSet
 from django.contrib.auth.models import User, Group
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from django.views.decorators.csrf import csrf_exempt
-import json
-from rest_framework_simplejwt.tokens import RefreshToken
+from . import fastjson
+from .fastjson import JSONResponse
+from .authentication import ClaimsRefreshToken
+from .revocation import revocations
+from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 from django.utils.encoding import smart_str
 from django.views.decorators.http import require_POST
 from rest_framework.generics import ListAPIView
@@ -35,6 +41,23 @@ from rest_framework.pagination import PageNumberPagination
 from django.contrib.auth import get_user_model
 from django.core.mail import send_mail
 from django.conf import settings
+from .permissions import IsAdminUserType, IsHubStaff
+from .autocomplete import FIELDS as AUTOCOMPLETE_FIELDS, autocomplete_index
+from .sla import at_risk_shipments, sla_report
+from .idempotency import idempotent
+from .dispatch import Vehicle, pincode_coordinates, plan_day
+from .loadplan import VehicleType, plan_loads
+from .eta import eta_table
+from .archive import archived_lookup
+from .response_cache import cache_booking_list
+from .scans import apply_status_updates, scan_datetime, scan_timestamp
+from .consignment_notes import note_queryset, stream_consignment_notes
+from .profiling import list_profiles, profile_dir, profile_report
+import logging
+from .reports import refresh_route_summary, route_report
+from .metrics import collect_snapshots, merge_snapshots, render_prometheus
+
+logger = logging.getLogger(__name__)
 
 class ShipmentViewSet(ModelViewSet):
     queryset = Shipment.objects.all()
@@ -197,52 +220,88 @@ def export_bookings_csv(request):
 
     return response
 
+def build_tracking_response(booking):
+    # Shared by track_shipment and track_shipment_batch so both return the same shape
+    expected, latest, _ = eta_table.estimate(booking)
+    return {
+        "success": True,
+        "trackingNumber": booking.lr_no,
+        "status": "in-transit",  # Placeholder status
+        "estimatedDelivery": expected.isoformat() if expected else None,
+        "estimatedDeliveryLatest": latest.isoformat() if latest else None,
+        "origin": booking.from_location,
+        "destination": booking.to_location,
+        "service": "Standard Delivery",  # Placeholder service type
+        "weight": f"{booking.actual_weight} kg" if booking.actual_weight else "Unknown",
+        "updates": [
+            {
+                "status": "Order Placed",
+                "location": booking.from_location,
+                "timestamp": booking.booking_date.strftime('%Y-%m-%dT%H:%M:%S') if booking.booking_date else None,
+                "description": "Order has been placed and confirmed."
+            },
+            {
+                "status": "In Transit",
+                "location": booking.from_location,
+                "timestamp": booking.booking_date.strftime('%Y-%m-%dT%H:%M:%S') if booking.booking_date else None,
+                "description": "Package is in transit to the next facility."
+            }
+        ]
+    }
+
+TRACKING_NOT_FOUND = {"success": False, "message": "No shipment found with this tracking number. Please check and try again."}
+
 @csrf_exempt
 def track_shipment(request):
     if request.method == 'POST':
         try:
             # Parse JSON body to extract lr_no
-            body = json.loads(request.body)
+            body = fastjson.loads(request.body)
             lr_no = body.get('lr_no')
-            print("Received LR No:", lr_no)  # Debug log for received LR No
+            logger.debug("Received LR No: %s", lr_no)
 
             if not lr_no:
-                return JsonResponse({"success": False, "message": "Tracking number is required."}, status=400)
+                return JSONResponse({"success": False, "message": "Tracking number is required."}, status=400)
 
-            booking = Booking.objects.filter(lr_no__iexact=lr_no).first()
+            # Old delivered bookings may have been moved to the archive
+            booking = Booking.objects.filter(lr_no__iexact=lr_no).first() or archived_lookup.find_booking(lr_no)
             if booking:
-                print("Booking Found:", booking)  # Debug log for booking details
-                data = {
-                    "success": True,
-                    "trackingNumber": booking.lr_no,
-                    "status": "in-transit",  # Placeholder status
-                    "estimatedDelivery": booking.dod.strftime('%Y-%m-%d') if booking.dod else None,
-                    "origin": booking.from_location,
-                    "destination": booking.to_location,
-                    "service": "Standard Delivery",  # Placeholder service type
-                    "weight": f"{booking.actual_weight} kg" if booking.actual_weight else "Unknown",
-                    "updates": [
-                        {
-                            "status": "Order Placed",
-                            "location": booking.from_location,
-                            "timestamp": booking.booking_date.strftime('%Y-%m-%dT%H:%M:%S') if booking.booking_date else None,
-                            "description": "Order has been placed and confirmed."
-                        },
-                        {
-                            "status": "In Transit",
-                            "location": booking.from_location,
-                            "timestamp": booking.booking_date.strftime('%Y-%m-%dT%H:%M:%S') if booking.booking_date else None,
-                            "description": "Package is in transit to the next facility."
-                        }
-                    ]
-                }
+                logger.debug("Booking Found: %s", booking)
+                data = build_tracking_response(booking)
             else:
-                print("No booking found for LR No:", lr_no)  # Debug log for missing booking
-                data = {"success": False, "message": "No shipment found with this tracking number. Please check and try again."}
-            return JsonResponse(data)
-        except json.JSONDecodeError:
-            return JsonResponse({"success": False, "message": "Invalid JSON format."}, status=400)
-    return JsonResponse({'success': False, 'message': 'Shipment not found.'})
+                logger.debug("No booking found for LR No: %s", lr_no)
+                data = TRACKING_NOT_FOUND
+            return JSONResponse(data)
+        except fastjson.DECODE_ERRORS:
+            return JSONResponse({"success": False, "message": "Invalid JSON format."}, status=400)
+    return JSONResponse({'success': False, 'message': 'Shipment not found.'})
+
+@csrf_exempt
+@require_POST
+def track_shipment_batch(request):
+    try:
+        body = fastjson.loads(request.body)
+    except fastjson.DECODE_ERRORS:
+        return JSONResponse({"success": False, "message": "Invalid JSON format."}, status=400)
+    lr_nos = body.get('lr_nos') if isinstance(body, dict) else None
+    if not isinstance(lr_nos, list) or not lr_nos:
+        return JSONResponse({"success": False, "message": "lr_nos must be a non-empty list."}, status=400)
+    limit = settings.TRACKING_BATCH_LIMIT
+    if len(lr_nos) > limit:
+        return JSONResponse({"success": False, "message": f"At most {limit} tracking numbers per request."}, status=400)
+
+    # Results are keyed by the LR as sent; matching is case-insensitive like track_shipment
+    requested = {str(lr_no).strip(): str(lr_no).strip().upper() for lr_no in lr_nos if str(lr_no).strip()}
+    # One query on the UPPER(lr_no) index; tracking history lives on the row (updates JSON)
+    bookings = {
+        booking.lr_upper: booking
+        for booking in Booking.objects.annotate(lr_upper=Upper('lr_no')).filter(lr_upper__in=set(requested.values()))
+    }
+    results = {}
+    for lr_no, key in requested.items():
+        booking = bookings.get(key) or archived_lookup.find_booking(key)
+        results[lr_no] = build_tracking_response(booking) if booking else TRACKING_NOT_FOUND
+    return JSONResponse({"success": True, "found": sum(1 for r in results.values() if r["success"]), "results": results})
 
 # Customer shipments view
 class BookingPagination(PageNumberPagination):
@@ -259,6 +318,10 @@ class CustomerShipmentsListView(ListAPIView):
     search_fields = ['lr_no', 'from_location', 'to_location', 'status']
     permission_classes = [AllowAny]
 
+    @cache_booking_list(global_data=True)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def get_queryset(self):
         queryset = super().get_queryset()
         start_date = self.request.query_params.get('start_date')
@@ -322,9 +385,6 @@ def submit_booking(request):
                     remarks=remarks
                 )
 
-                # Save the booking with the generated LR number
-                booking.save()
-
             # Prepare receipt data
             receipt_data = {
                 "lr_no": lr_no,
@@ -350,8 +410,7 @@ def submit_booking(request):
 @csrf_exempt
 def register_user(request):
     if request.method == 'POST':
-        import json
-        data = json.loads(request.body)
+        data = fastjson.loads(request.body)
         username = data.get('name')
         password = data.get('password')
         email = data.get('email')
@@ -361,18 +420,19 @@ def register_user(request):
         user.save()
         customer_group, created = Group.objects.get_or_create(name='customer')
         user.groups.add(customer_group)
-        return JsonResponse({'message': 'User registered successfully'})
-    return JsonResponse({'error': 'Invalid request method'}, status=400)
+        return JSONResponse({'message': 'User registered successfully'})
+    return JSONResponse({'error': 'Invalid request method'}, status=400)
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@idempotent
 def create_booking(request):
     serializer = BookingSerializer(data=request.data)
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     try:
         # Save the booking and set the user if authenticated
-        booking = serializer.save(user=request.user if request.user.is_authenticated else None)
+        booking = serializer.save(user_id=request.user.id if request.user.is_authenticated else None)
         return Response({
             "message": "Booking created successfully",
             "booking_id": booking.id,
@@ -385,11 +445,11 @@ def create_booking(request):
 def api_login(request):
     if request.method == 'POST':
         try:
-            body = json.loads(request.body)
+            body = fastjson.loads(request.body)
             email = body.get('email')
             password = body.get('password')
             if not email or not password:
-                return JsonResponse({"success": False, "message": "Email and password are required."}, status=400)
+                return JSONResponse({"success": False, "message": "Email and password are required."}, status=400)
             User = get_user_model()
             user_obj = User.objects.filter(email=email).first()
             if user_obj:
@@ -398,8 +458,8 @@ def api_login(request):
                 user = None
             if user is not None:
                 # Generate JWT tokens
-                refresh = RefreshToken.for_user(user)
-                return JsonResponse({
+                refresh = ClaimsRefreshToken.for_user(user)
+                return JSONResponse({
                     "success": True,
                     "message": "Login successful",
                     "user": {
@@ -412,12 +472,37 @@ def api_login(request):
                     "refresh": str(refresh)
                 })
             else:
-                return JsonResponse({"success": False, "message": "Invalid email or password."}, status=401)
-        except json.JSONDecodeError:
-            return JsonResponse({"success": False, "message": "Invalid JSON format."}, status=400)
+                return JSONResponse({"success": False, "message": "Invalid email or password."}, status=401)
+        except fastjson.DECODE_ERRORS:
+            return JSONResponse({"success": False, "message": "Invalid JSON format."}, status=400)
     if request.method == 'GET':
-        return JsonResponse({"success": False, "message": "This endpoint is for login via POST requests."}, status=405)
-    return JsonResponse({"success": False, "message": "Invalid request method."}, status=405)
+        return JSONResponse({"success": False, "message": "This endpoint is for login via POST requests."}, status=405)
+    return JSONResponse({"success": False, "message": "Invalid request method."}, status=405)
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def token_refresh(request):
+    serializer = TokenRefreshSerializer(data=request.data)
+    try:
+        serializer.is_valid(raise_exception=True)
+    except TokenError as e:
+        return Response(InvalidToken(e.args[0]).detail, status=status.HTTP_401_UNAUTHORIZED)
+    except InvalidToken as e:
+        return Response(e.detail, status=status.HTTP_401_UNAUTHORIZED)
+    return Response(serializer.validated_data)
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def api_logout(request):
+    # Revoke the refresh token so it can't mint new access tokens
+    try:
+        refresh = ClaimsRefreshToken(request.data.get('refresh', ''))
+    except TokenError as e:
+        return Response({'success': False, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    revocations.revoke(refresh['jti'], datetime.fromtimestamp(refresh['exp'], tz=dt_timezone.utc))
+    return Response({'success': True})
 
 @api_view(['GET'])
 def export_shipments(request):
@@ -430,7 +515,7 @@ def export_shipments(request):
             end_date_obj = datetime.strptime(end_date, "%Y-%m-%d").date()
             shipments = shipments.filter(booking_date__gte=start_date_obj, booking_date__lte=end_date_obj)
         except Exception as e:
-            print(f"Date filter error: {e}")
+            logger.warning("Date filter error: %s", e)
 
     wb = openpyxl.Workbook()
     ws = wb.active
@@ -465,7 +550,7 @@ def export_customer_shipments_csv(request):
             end_date_obj = datetime.strptime(end_date, "%Y-%m-%d").date()
             shipments = shipments.filter(booking_date__gte=start_date_obj, booking_date__lte=end_date_obj)
         except Exception as e:
-            print(f"Date filter error: {e}")
+            logger.warning("Date filter error: %s", e)
 
     response = HttpResponse(content_type='text/csv; charset=utf-8')
     response['Content-Disposition'] = 'attachment; filename="shipments.csv"'
@@ -548,41 +633,269 @@ def insert_booking_from_block(request):
             'weight', 'status', 'updates', 'phone'
         ]
         if len(lines) != len(field_names):
-            return JsonResponse({'error': 'Block text does not match required number of fields.'}, status=400)
+            return JSONResponse({'error': 'Block text does not match required number of fields.'}, status=400)
         data = dict(zip(field_names, lines))
         # Optionally parse/convert fields as needed (dates, decimals, etc.)
         try:
             booking = Booking.objects.create(**data)
-            return JsonResponse({'success': True, 'booking_id': booking.id})
+            return JSONResponse({'success': True, 'booking_id': booking.id})
         except Exception as e:
-            return JsonResponse({'error': str(e)}, status=400)
-    return JsonResponse({'error': 'Invalid request method'}, status=405)
+            return JSONResponse({'error': str(e)}, status=400)
+    return JSONResponse({'error': 'Invalid request method'}, status=405)
 
 @csrf_exempt
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@idempotent
 def update_shipment_status(request):
     try:
         lr_no = request.data.get('lr_no')
         new_status = request.data.get('status')
         if not lr_no or not new_status:
-            return JsonResponse({'error': 'LR No and status are required.'}, status=400)
-        booking = Booking.objects.filter(lr_no=lr_no).first()
-        if not booking:
-            return JsonResponse({'error': 'Booking not found.'}, status=404)
-        booking.status = new_status
-        booking.save()
-        return JsonResponse({'success': True, 'lr_no': lr_no, 'status': new_status})
+            return JSONResponse({'error': 'LR No and status are required.'}, status=400)
+        # Optional: the version the client last saw; a newer row is reported as a conflict
+        expected = request.data.get('version')
+        if expected is not None:
+            expected = int(expected)
+        scan = {'status': new_status, 'location': str(request.data.get('location') or ''),
+                'timestamp': scan_timestamp(request.data.get('timestamp'))}
+        for _ in range(settings.BOOKING_UPDATE_RETRIES):
+            booking = Booking.objects.filter(lr_no=lr_no).only(
+                'id', 'lr_no', 'status', 'updates', 'delivered_at', 'version', 'booking_date', 'user_id').first()
+            if not booking:
+                return JSONResponse({'error': 'Booking not found.'}, status=404)
+            if expected is not None and booking.version != expected:
+                break
+            history = booking.updates if isinstance(booking.updates, list) else []
+            changes = {'status': new_status, 'updates': history + [scan]}
+            if new_status == 'delivered' and booking.delivered_at is None:
+                # Delivered when scanned, not when the scan reached us
+                changes['delivered_at'] = scan_datetime(scan['timestamp'])
+            try:
+                booking.update_if_current(**changes)
+            except BookingConflict:
+                if expected is not None:
+                    booking.refresh_from_db(fields=['status', 'version'])
+                    break
+                continue  # nothing to reconcile: re-read and append to the newer history
+            return JSONResponse({'success': True, 'lr_no': lr_no, 'status': new_status, 'version': booking.version})
+        return JSONResponse({'error': 'Booking was changed by another update.', 'lr_no': lr_no,
+                             'status': booking.status, 'version': booking.version}, status=409)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=400)
+        return JSONResponse({'error': str(e)}, status=400)
+
+@api_view(['POST'])
+@permission_classes([IsHubStaff])
+@idempotent
+def update_shipment_status_bulk(request):
+    items = request.data.get('updates') if isinstance(request.data, dict) else None
+    if not isinstance(items, list) or not items:
+        return Response({'error': 'updates must be a non-empty list.'}, status=400)
+    limit = settings.STATUS_BULK_LIMIT
+    if len(items) > limit:
+        return Response({'error': f'At most {limit} updates per request.'}, status=400)
+    scans = []
+    for index, item in enumerate(items):
+        try:
+            lr_no, new_status = str(item['lr_no']).strip(), str(item['status']).strip()
+            scan = {'lr_no': lr_no, 'status': new_status, 'location': str(item.get('location') or '').strip(),
+                    'timestamp': scan_timestamp(item.get('timestamp'))}
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return Response({'error': f'updates[{index}] needs lr_no, status, an optional location and an '
+                                      f'optional ISO 8601 timestamp.'}, status=400)
+        if not lr_no or not new_status or len(new_status) > Booking._meta.get_field('status').max_length:
+            return Response({'error': f'updates[{index}] has an empty lr_no or an invalid status.'}, status=400)
+        scans.append(scan)
+    updated, unknown = apply_status_updates(scans)
+    return Response({'success': True, 'updated': len(updated), 'results': updated, 'unknown': unknown})
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cache_booking_list()
 def user_bookings(request):
-    bookings = Booking.objects.filter(user=request.user).order_by('-booking_date')
+    bookings = Booking.objects.filter(user_id=request.user.id).order_by('-booking_date')
     serializer = BookingSerializer(bookings, many=True)
     return Response(serializer.data)
 
+@api_view(['GET'])
+@permission_classes([IsAdminUserType])
+def route_summary_report(request):
+    try:
+        start_date = datetime.strptime(request.GET['start_date'], "%Y-%m-%d").date() if request.GET.get('start_date') else None
+        end_date = datetime.strptime(request.GET['end_date'], "%Y-%m-%d").date() if request.GET.get('end_date') else None
+        top = min(max(int(request.GET.get('top', 20)), 1), 500)
+    except ValueError:
+        return Response({'error': "Use 'YYYY-MM-DD' dates and an integer top."}, status=400)
+    # Fold in a few of the weeks touched since the last refresh (latest first) and leave the rest to
+    # the refresh_route_summary command, so a bulk load never turns into one very slow GET.
+    # Skipped if another worker is already refreshing.
+    refresh_route_summary(max_weeks=settings.ROUTE_SUMMARY_REQUEST_WEEKS)
+    routes = route_report(start_date, end_date, top=top, order_by=request.GET.get('order_by', 'freight'))
+    return Response({
+        'start_date': start_date.isoformat() if start_date else None,
+        'end_date': end_date.isoformat() if end_date else None,
+        'pending_weeks': RouteSummaryDirtyWeek.objects.count(),
+        'routes': routes,
+    })
+
+@api_view(['POST'])
+@permission_classes([IsAdminUserType])
+def dispatch_plan(request):
+    try:
+        day = datetime.strptime(request.data.get('date') or '', "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return Response({'error': "date is required as 'YYYY-MM-DD'."}, status=400)
+    raw_vehicles = request.data.get('vehicles')
+    if not isinstance(raw_vehicles, list) or not raw_vehicles:
+        return Response({'error': 'vehicles must be a non-empty list.'}, status=400)
+    if len(raw_vehicles) > settings.DISPATCH_MAX_VEHICLES:
+        return Response({'error': f'At most {settings.DISPATCH_MAX_VEHICLES} vehicles per plan.'}, status=400)
+
+    start_pincodes = {str(v.get('start_pincode')) for v in raw_vehicles if isinstance(v, dict) and v.get('start_pincode')}
+    depots = pincode_coordinates(start_pincodes)
+    vehicles = []
+    for index, raw in enumerate(raw_vehicles):
+        try:
+            vehicle = Vehicle(
+                id=str(raw['id']),
+                capacity_kg=float(raw['capacity_kg']) if raw.get('capacity_kg') is not None else float('inf'),
+                max_stops=int(raw['max_stops']) if raw.get('max_stops') is not None else None,
+            )
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return Response({'error': f'vehicles[{index}] needs an id and numeric capacity_kg/max_stops.'}, status=400)
+        if vehicle.capacity_kg <= 0 or (vehicle.max_stops is not None and vehicle.max_stops <= 0):
+            return Response({'error': f'vehicles[{index}] capacity_kg and max_stops must be positive.'}, status=400)
+        if raw.get('start_pincode'):
+            vehicle.start = depots.get(str(raw['start_pincode']))
+            if vehicle.start is None:
+                return Response({'error': f"Unknown start_pincode {raw['start_pincode']} for vehicles[{index}]."}, status=400)
+        vehicles.append(vehicle)
+    return Response(plan_day(day, vehicles))
+
+@api_view(['POST'])
+@permission_classes([IsAdminUserType])
+def load_plan(request):
+    try:
+        day = datetime.strptime(request.data.get('date') or '', "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return Response({'error': "date is required as 'YYYY-MM-DD'."}, status=400)
+    raw_types = request.data.get('vehicles') or settings.LOADPLAN_VEHICLE_TYPES
+    try:
+        vehicle_types = [
+            VehicleType(str(v['name']), float(v['max_weight_kg']), float(v['volume_m3']),
+                        int(v['count']) if v.get('count') is not None else None)
+            for v in raw_types
+        ]
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return Response({'error': 'vehicles need name, max_weight_kg, volume_m3 and an optional count.'}, status=400)
+    if not vehicle_types or any(v.max_weight_kg <= 0 or v.volume_m3 <= 0 or (v.count or 0) < 0 for v in vehicle_types):
+        return Response({'error': 'Vehicle capacities must be positive.'}, status=400)
+    try:
+        # Form and query input arrive as strings, where bool('false') would be True
+        local_search = serializers.BooleanField().to_internal_value(request.data.get('local_search', True))
+    except ValidationError:
+        return Response({'error': 'local_search must be true or false.'}, status=400)
+    lanes = plan_loads(
+        day, vehicle_types,
+        from_location=request.data.get('from_location'),
+        to_location=request.data.get('to_location'),
+        local_search=local_search,
+    )
+    return Response({'date': day.isoformat(), 'lanes': lanes})
+
+@api_view(['POST'])
+@permission_classes([IsHubStaff])
+def consignment_notes(request):
+    # Printable LR copies for a booking date range and/or a list of LR numbers, as one HTML document
+    try:
+        start = datetime.strptime(request.data['start_date'], "%Y-%m-%d").date() if request.data.get('start_date') else None
+        end = datetime.strptime(request.data['end_date'], "%Y-%m-%d").date() if request.data.get('end_date') else None
+    except (TypeError, ValueError):
+        return Response({'error': "Use 'YYYY-MM-DD' dates."}, status=400)
+    lr_nos = request.data.get('lr_nos')
+    if lr_nos is not None and (not isinstance(lr_nos, list) or not all(isinstance(lr, str) for lr in lr_nos)):
+        return Response({'error': 'lr_nos must be a list of LR numbers.'}, status=400)
+    if not (start or end or lr_nos):
+        return Response({'error': 'Give start_date/end_date or lr_nos.'}, status=400)
+    labels = settings.CONSIGNMENT_NOTE_COPIES
+    try:
+        copies = labels[:min(max(int(request.data.get('copies', len(labels))), 1), len(labels))]
+    except (TypeError, ValueError):
+        return Response({'error': f'copies must be a number from 1 to {len(labels)}.'}, status=400)
+
+    queryset = note_queryset(start, end, lr_nos)
+    total = queryset.count()
+    if total > settings.CONSIGNMENT_NOTE_MAX:
+        return Response({'error': f'{total} notes requested; at most {settings.CONSIGNMENT_NOTE_MAX} per request.'},
+                        status=400)
+    name = 'consignment-notes' + (f'-{start}' if start else '') + (f'-{end}' if end else '')
+    response = StreamingHttpResponse(
+        stream_consignment_notes(queryset, copies, title=name, total=total), content_type='text/html; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'inline; filename="{name}.html"'
+    response['X-Notes-Count'] = str(total)
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAdminUserType])
+def profiles(request):
+    return Response({'enabled': settings.PROFILING.get('ENABLED', False), 'profiles': list_profiles()})
+
+@api_view(['GET'])
+@permission_classes([IsAdminUserType])
+def profile_detail(request, name):
+    try:
+        limit = min(max(int(request.GET.get('limit', 40)), 1), 500)
+    except ValueError:
+        return Response({'error': 'limit must be an integer.'}, status=400)
+    report = profile_report(name, limit=limit)
+    if report is None:
+        return Response({'error': 'Profile not found.'}, status=404)
+    if request.GET.get('download') and report['mode'] == 'cprofile':
+        # Raw pstats file for snakeviz / python -m pstats
+        return FileResponse(open(profile_dir() / f'{name}.prof', 'rb'), as_attachment=True, filename=f'{name}.prof')
+    return Response(report)
+
+@api_view(['GET'])
+@permission_classes([IsHubStaff])
+def sla_at_risk(request):
+    # Open consignments past or close to their delivery deadline, by time bucket then priority
+    try:
+        hours = float(request.GET.get('hours', settings.SLA_HORIZON_HOURS))
+    except ValueError:
+        return Response({'error': 'hours must be a number.'}, status=400)
+    if not 0 < hours <= 24 * 30:
+        return Response({'error': 'hours must be between 0 and 720.'}, status=400)
+    now = timezone.now()
+    names, shipments = at_risk_shipments(hours, now)
+    return Response(sla_report(names, shipments, hours, now))
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def autocomplete(request):
+    # Suggestions for booking form fields, most booked first; party names are for hub staff only
+    field = request.GET.get('field', 'location')
+    if field not in AUTOCOMPLETE_FIELDS:
+        return Response({'error': f"field must be one of {', '.join(AUTOCOMPLETE_FIELDS)}."}, status=400)
+    if field != 'location' and not IsHubStaff().has_permission(request, None):
+        return Response({'error': 'Only hub staff can look up parties.'}, status=403)
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), settings.AUTOCOMPLETE_MAX_RESULTS)
+    except ValueError:
+        return Response({'error': 'limit must be an integer.'}, status=400)
+    q = request.GET.get('q', '')
+    response = Response({'field': field, 'q': q, 'results': autocomplete_index.search(field, q, limit)})
+    response['Cache-Control'] = f'private, max-age={int(settings.AUTOCOMPLETE_SYNC_INTERVAL)}'
+    return response
+
+def metrics(request):
+    # Prometheus scrape endpoint; guarded by a bearer token when METRICS_AUTH_TOKEN is set
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', '')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=401)
+    body = render_prometheus(merge_snapshots(collect_snapshots()))
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @api_view(['POST'])
 def contact_us_api(request):
     name = request.data.get('name')